@@ -1,6 +1,10 @@
 from fastapi import FastAPI, HTTPException # Make sure HTTPException is added
 from typing import List, Optional # Add this
 from fastapi import FastAPI, HTTPException, Query # Add Query here
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+import asyncio
+import threading
 import requests                     # Needed to call the external API
 import datetime                     # Needed for time calculations
 import time                         # Needed to get the current time easily
@@ -9,46 +13,90 @@ import sys
 import os
 from dotenv import load_dotenv
 load_dotenv()
+import mongo_monitoring
+# Latency stats and slow-query logging for every MongoClient this process creates
+mongo_monitoring.install()
 from pymongo import MongoClient
 from pymongo.collection import Collection
+from leaderboard_broadcaster import LeaderboardBroadcaster
+from leaderboard_diff import SnapshotHistory, snapshot_key
+from api_responses import FastJSONResponse
+from result_cache import TickResultCache
+import tracing
+from shared_cache import shared_cache
+from clan_icons import icon_image_id
+import battle_trajectories
+import clan_history
+import leaderboard_events
+from bson import ObjectId
+from bson.errors import InvalidId
 
 # --- MongoDB Atlas Connection ---
 MONGO_CONNECTION_STRING = os.environ.get("MONGO_URI")
 DB_NAME = "clan_dashboard_db" # Use the same database name as in the fetcher
-
-# Create a global MongoDB client with connection pooling
-mongo_client = MongoClient(
-    MONGO_CONNECTION_STRING,
-    serverSelectionTimeoutMS=5000,
-    maxPoolSize=50,  # Maximum number of connections in the pool
-    minPoolSize=10,  # Minimum number of connections in the pool
-    maxIdleTimeMS=30000,  # Close idle connections after 30 seconds
-    connectTimeoutMS=5000,  # Timeout for initial connection
-    socketTimeoutMS=5000,  # Timeout for operations
-    retryWrites=True,
-    retryReads=True
-)
+# Upstream game API, configurable like the fetchers' (see benchmarks.upstream_simulator)
+WAR_API_URL = f"{os.environ.get('PS99_API_URL', 'https://ps99.biggamesapi.io')}/api/activeClanBattle"
+
+# Global MongoDB client with connection pooling, created on first use rather than at
+# import so cold starts don't wait on DNS/TLS and the minPoolSize connections
+_mongo_client = None
+_mongo_client_lock = threading.Lock()
+
+def get_mongo_client():
+    global _mongo_client
+    if _mongo_client is None:
+        with _mongo_client_lock:
+            if _mongo_client is None:
+                _mongo_client = MongoClient(
+                    MONGO_CONNECTION_STRING,
+                    serverSelectionTimeoutMS=5000,
+                    maxPoolSize=50,  # Maximum number of connections in the pool
+                    minPoolSize=10,  # Minimum number of connections in the pool
+                    maxIdleTimeMS=30000,  # Close idle connections after 30 seconds
+                    connectTimeoutMS=5000,  # Timeout for initial connection
+                    socketTimeoutMS=5000,  # Timeout for operations
+                    retryWrites=True,
+                    retryReads=True
+                )
+    return _mongo_client
+
+def close_mongo_client():
+    global _mongo_client
+    with _mongo_client_lock:
+        if _mongo_client is not None:
+            _mongo_client.close()
+            _mongo_client = None
 
 # Create the FastAPI app instance
 app = FastAPI(
     title="Clan Dashboard API",
     version="0.1.0",
     docs_url=None,
-    redoc_url=None
+    redoc_url=None,
+    default_response_class=FastJSONResponse
 )
 
 # --- Create Indexes ---
-try:
-    db = mongo_client[DB_NAME]
+def ensure_indexes():
+    """
+    Creates the indexes the endpoints rely on (run once at startup by combined_api_server's
+    warm-up). Errors propagate, so the warm-up profile and /readyz report a failure.
+    """
+    db = get_mongo_client()[DB_NAME]
     clans_collection = db["clans"]
     # Create compound index on battle_id and timestamp
     clans_collection.create_index([("battle_id", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)])
     print("Created compound index on battle_id and timestamp")
-except Exception as e:
-    print(f"Error creating indexes: {e}")
+    # Newest snapshot of a battle: every /dashboard change check and broadcaster poll
+    db["leaderboard_snapshots"].create_index([("battle_id", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)])
+    clan_history.ensure_indexes(get_mongo_client())
+    battle_trajectories.ensure_indexes(get_mongo_client())
+    leaderboard_events.ensure_indexes(get_mongo_client())
 
 # --- Global icon cache ---
-ICON_CACHE = {}
+# Shared across workers (see shared_cache); icons change rarely, so an hour is plenty
+ICON_CACHE_NAMESPACE = "clan_icon"
+ICON_CACHE_TTL = 60 * 60
 
 # Define a basic 'root' endpoint
 @app.get("/")
@@ -85,7 +133,7 @@ def format_timedelta(delta):
 @app.get("/countdown")
 async def get_countdown():
     """Fetches the war end time and returns the formatted countdown."""
-    countdown_url = "https://ps99.biggamesapi.io/api/activeClanBattle"
+    countdown_url = WAR_API_URL
     try:
         response = requests.get(countdown_url, timeout=5, verify=False)
         response.raise_for_status()
@@ -113,36 +161,209 @@ async def get_countdown():
         print(f"Unexpected error in countdown: {e}")
         return {"countdown": "Unknown"}
 
-# Dashboard endpoint (OPTIMIZED)
-@app.get("/dashboard")
-async def get_dashboard_data(battle_id: str):
+# --- Dashboard snapshot helpers ---
+def attach_icons(top_clans):
     """
-    Returns the latest leaderboard snapshot for the given battle_id.
+    Returns copies of the snapshot's clans with icon and icon_id. Snapshots carry them since
+    the fetcher started embedding icons; older ones are joined through the shared icon cache
+    (top 25 only are looked up).
     """
-    db = mongo_client[DB_NAME]
-    snapshots_collection = db["leaderboard_snapshots"]
-    snapshot = snapshots_collection.find_one(
+    top_clans = [dict(clan) for clan in top_clans]
+    if all("icon_id" in clan for clan in top_clans):
+        return top_clans
+    db = get_mongo_client()[DB_NAME]
+    top_25_clan_names = [clan['clan_name'] for clan in top_clans[:25]]
+
+    # --- Lazy-load icon cache for top 25 clans ---
+    icons = shared_cache.get_many(ICON_CACHE_NAMESPACE, top_25_clan_names)
+    icons_to_fetch = [name for name in top_25_clan_names if name not in icons]
+    if icons_to_fetch:
+        clan_details_collection = db["clan_details"]
+        fetched = {
+            doc['clan_name']: doc.get('icon')
+            for doc in clan_details_collection.find({"clan_name": {"$in": icons_to_fetch}}, {"clan_name": 1, "icon": 1, "_id": 0})
+        }
+        shared_cache.set_many(ICON_CACHE_NAMESPACE, fetched, ttl=ICON_CACHE_TTL)
+        icons.update(fetched)
+
+    for clan in top_clans:
+        clan['icon'] = icons.get(clan['clan_name'])
+        clan['icon_id'] = icon_image_id(clan['icon'])
+    return top_clans
+
+def get_latest_snapshot(battle_id):
+    """Returns the newest leaderboard snapshot document for a battle, or None."""
+    db = get_mongo_client()[DB_NAME]
+    return db["leaderboard_snapshots"].find_one(
         {"battle_id": battle_id},
         sort=[("timestamp", -1)]
     )
+
+def get_latest_snapshot_timestamp(battle_id):
+    """Returns only the timestamp of the newest snapshot, so change checks stay cheap."""
+    db = get_mongo_client()[DB_NAME]
+    doc = db["leaderboard_snapshots"].find_one(
+        {"battle_id": battle_id},
+        {"timestamp": 1, "_id": 0},
+        sort=[("timestamp", -1)]
+    )
+    return doc.get("timestamp") if doc else None
+
+# Newest dashboard payload per battle. Only used while combined_api_server's change watcher
+# is live (dashboard_cache_enabled), because then invalidate_dashboard is called on every
+# snapshot write; otherwise each request reads the newest snapshot from MongoDB.
+dashboard_cache = {}
+dashboard_cache_enabled = False
+dashboard_generation = 0
+
+def invalidate_dashboard(battle_id=None):
+    """Drops the cached dashboard payload for a battle (all battles without one)."""
+    global dashboard_generation
+    dashboard_generation += 1
+    if battle_id is None:
+        dashboard_cache.clear()
+    else:
+        dashboard_cache.pop(battle_id, None)
+
+def invalidate_battle_ids():
+    shared_cache.delete_many(BATTLE_IDS_CACHE_NAMESPACE, ["all"])
+
+def invalidate_icons(clan_name=None):
+    """Drops cached clan_details icons; the legacy join in attach_icons refills them."""
+    if clan_name is not None:
+        shared_cache.delete_many(ICON_CACHE_NAMESPACE, [clan_name])
+
+def get_dashboard_payload(battle_id):
+    """Builds the streamed dashboard payload: snapshot timestamp plus top clans with icons."""
+    if dashboard_cache_enabled and battle_id in dashboard_cache:
+        return dashboard_cache[battle_id]
+    generation = dashboard_generation
+    snapshot = get_latest_snapshot(battle_id)
     if not snapshot or "top_clans" not in snapshot:
-        return []
-    
-    # Get top 25 clan names
-    top_25_clan_names = [clan['clan_name'] for clan in snapshot["top_clans"][:25]]
-    
-    # --- Lazy-load icon cache for top 25 clans ---
-    clan_details_collection = db["clan_details"]
-    icons_to_fetch = [name for name in top_25_clan_names if name not in ICON_CACHE]
-    if icons_to_fetch:
-        for doc in clan_details_collection.find({"clan_name": {"$in": icons_to_fetch}}, {"clan_name": 1, "icon": 1, "_id": 0}):
-            ICON_CACHE[doc['clan_name']] = doc.get('icon')
-    
-    # Add icons to the response
-    for clan in snapshot["top_clans"]:
-        clan['icon'] = ICON_CACHE.get(clan['clan_name'])
-    
-    return snapshot["top_clans"]
+        return None
+    top_clans = attach_icons(snapshot["top_clans"])
+    snapshot_history.add(battle_id, snapshot.get("timestamp"), top_clans)
+    payload = {
+        "battle_id": battle_id,
+        "timestamp": snapshot.get("timestamp"),
+        "top_clans": top_clans,
+        # Trace of the fetch cycle that produced the snapshot (see tracing)
+        "ingest_trace_id": snapshot.get("trace_id")
+    }
+    # A write observed while this payload was built may have made it stale already
+    if dashboard_cache_enabled and generation == dashboard_generation:
+        dashboard_cache[battle_id] = payload
+    return payload
+
+# Recent snapshots kept in memory so /dashboard?since=... can answer with a diff
+snapshot_history = SnapshotHistory()
+
+# Shared in-process fan-out for /dashboard/stream subscribers
+SSE_KEEPALIVE_SECONDS = 25
+SSE_RETRY_MS = 5000  # Browser reconnect delay after a dropped stream
+broadcaster = LeaderboardBroadcaster(get_latest_snapshot_timestamp, get_dashboard_payload)
+
+# Dashboard endpoint (OPTIMIZED)
+@app.get("/dashboard")
+async def get_dashboard_data(battle_id: str, response: Response, since: Optional[str] = None):
+    """
+    Returns the latest leaderboard snapshot for the given battle_id.
+    With `since=<snapshot timestamp>` returns a patch against that snapshot instead
+    (changed fields, rank moves, clans entering/leaving), or the full payload with
+    type "full" if that snapshot is no longer held in memory.
+    """
+    payload = get_dashboard_payload(battle_id)
+    if not payload:
+        return {"type": "full", "timestamp": None, "top_clans": []} if since else []
+
+    response.headers["X-Snapshot-Timestamp"] = snapshot_key(payload["timestamp"]) or ""
+    if payload.get("ingest_trace_id"):
+        # Ties this request's span (and the client's report) to the fetch behind the data
+        response.headers["X-Ingest-Trace-Id"] = payload["ingest_trace_id"]
+        tracing.add_link(payload["ingest_trace_id"], relation="ingest")
+        tracing.set_attribute("ingest.trace_id", payload["ingest_trace_id"])
+    if since:
+        return snapshot_history.build_response(battle_id, payload["timestamp"], payload["top_clans"], since)
+    return payload["top_clans"]
+
+# Live dashboard stream (Server-Sent Events)
+@app.get("/dashboard/stream")
+async def stream_dashboard_data(battle_id: str, request: Request):
+    """
+    Streams each new leaderboard snapshot for the given battle_id as a `snapshot` event.
+    The latest snapshot is sent on connect; afterwards an event is pushed only when the
+    fetcher writes a new snapshot, instead of every client polling /dashboard.
+    """
+    queue = await broadcaster.subscribe(battle_id)
+
+    async def event_stream():
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while True:
+                if await request.is_disconnected():
+                    break
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield message
+        finally:
+            broadcaster.unsubscribe(battle_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- Tick-aligned result cache ---
+# /clan_reach_target and /clan_comparison can only change when the fetcher writes a new
+# batch of clans documents (or, for /clan_reach_target, when the war ends), so results are
+# cached per (params, latest ingest tick[, war finish time])
+result_cache = TickResultCache()
+# Ranks the clan fetcher collects (its CLAN_FETCH_DEPTH)
+REACH_TARGET_MAX_RANK = int(os.environ.get("CLAN_FETCH_DEPTH", "250"))
+
+def get_latest_ingest_tick(battle_id):
+    """Timestamp of the battle's newest clans batch, or None."""
+    db = get_mongo_client()[DB_NAME]
+    doc = db["clans"].find_one({"battle_id": battle_id}, {"timestamp": 1, "_id": 0}, sort=[("timestamp", -1)])
+    return doc.get("timestamp") if doc else None
+
+# The active battle changes a few times a week; workers share the war API's answer briefly
+WAR_STATE_CACHE_NAMESPACE = "war_state"
+WAR_STATE_CACHE_TTL = 30
+
+def load_active_war():
+    """{"config_name", "finish_time" (unix seconds)} of the active battle (cached), or None if unavailable."""
+    cached = shared_cache.get_many(WAR_STATE_CACHE_NAMESPACE, ["active"])
+    if "active" in cached:
+        return cached["active"]
+    try:
+        response = requests.get(WAR_API_URL, timeout=5, verify=False)
+        response.raise_for_status()
+        data = response.json().get("data") or {}
+        active = {"config_name": data.get("configName"), "finish_time": (data.get("configData") or {}).get("FinishTime")}
+    except Exception as e:
+        print(f"Error fetching war end time: {e}")
+        return None
+    shared_cache.set_many(WAR_STATE_CACHE_NAMESPACE, {"active": active}, ttl=WAR_STATE_CACHE_TTL)
+    return active
+
+def get_war_finish_time(battle_id):
+    """
+    The battle's finish time as naive UTC (the clock of the clans timestamps) while it is the
+    active battle and has not finished, else None: the war is over or its end is unknown.
+    """
+    active = load_active_war()
+    if not active or active["config_name"] != battle_id or active["finish_time"] is None:
+        print(f"Active battle ({active and active['config_name']}) != requested ({battle_id}) or unknown; treating as over")
+        return None
+    finish_time = datetime.datetime.utcfromtimestamp(active["finish_time"])
+    if finish_time <= datetime.datetime.utcnow():
+        return None
+    return finish_time
 
 # Endpoint to calculate needs for a specific clan to reach a target rank (OPTIMIZED & CORRECTED)
 @app.get("/clan_reach_target")
@@ -151,52 +372,39 @@ async def get_clan_reach_target(clan_name: str, target_rank: int, battle_id: str
     print(f"/clan_reach_target called for {clan_name}, target_rank={target_rank}, forecast_period={forecast_period}, battle_id={battle_id}")
 
     # --- Input Validation ---
-    if target_rank <= 0 or target_rank > 250: raise HTTPException(status_code=400, detail="Invalid target_rank.")
+    if target_rank <= 0 or target_rank > REACH_TARGET_MAX_RANK: raise HTTPException(status_code=400, detail="Invalid target_rank.")
     if forecast_period <= 0: raise HTTPException(status_code=400, detail="Invalid forecast_period.")
 
-    client = None; minutes_remaining = 0; war_finish_time_dt = None; extra_points_per_hour = None
+    tick = await asyncio.to_thread(get_latest_ingest_tick, battle_id)
+    if tick is None:
+        raise HTTPException(status_code=503, detail="No current data.")
+    # The result depends on the tick and the war's end (None once it is over), nothing else
+    war_finish_time = await asyncio.to_thread(get_war_finish_time, battle_id)
+    key = ("clan_reach_target", battle_id, clan_name, target_rank, forecast_period, tick, war_finish_time)
+    return await result_cache.get_or_compute(
+        key, lambda: asyncio.to_thread(
+            compute_clan_reach_target, clan_name, target_rank, battle_id, forecast_period, tick, war_finish_time
+        )
+    )
+
+def compute_clan_reach_target(clan_name, target_rank, battle_id, forecast_period, latest_tick, war_finish_time):
+    """
+    Extra points per hour clan_name needs to reach target_rank by the war's end, as of the
+    latest_tick clans batch, or its final rank when war_finish_time is None (war over).
+    """
+    client = None; minutes_remaining = 0; extra_points_per_hour = None
 
     try:
-        # --- Fetch War End Time ---
-        try:
-            countdown_url = "https://ps99.biggamesapi.io/api/activeClanBattle"
-            response = requests.get(countdown_url, timeout=5, verify=False)
-            response.raise_for_status()
-            raw_data = response.json()
-            # Determine live battle ID from returned configName
-            live_battle_id = raw_data.get("data", {}).get("configName")
-            if live_battle_id != battle_id:
-                # Not the requested battle, treat as ended
-                print(f"Active battle ({live_battle_id}) != requested ({battle_id}); treating as over")
-                minutes_remaining = 0
-            else:
-                # Existing logic: use FinishTime for current war
-                finish_time_unix = raw_data["data"]["configData"]["FinishTime"]
-                war_finish_time_dt = datetime.datetime.fromtimestamp(finish_time_unix)
-                remaining_delta = war_finish_time_dt - datetime.datetime.now()
-                if remaining_delta.total_seconds() > 0:
-                    minutes_remaining = remaining_delta.total_seconds() / 60
-                else:
-                    minutes_remaining = 0  # War ended between fetch and now
-                print(f"War ends at: {war_finish_time_dt}, Minutes remaining: {minutes_remaining:.2f}")
-        except requests.exceptions.SSLError as e:
-            print(f"SSL Error fetching war end time: {e}")
-            minutes_remaining = 0
-        except Exception as cd_err:
-            print(f"Error fetching war end time: {cd_err}")
-            minutes_remaining = 0
+        # --- Time remaining, measured from the tick rather than now so the result is fixed per key ---
+        if war_finish_time is not None:
+            minutes_remaining = max((war_finish_time - latest_tick).total_seconds() / 60, 0)
+            print(f"War ends at: {war_finish_time} UTC, Minutes remaining: {minutes_remaining:.2f}")
 
         # --- Connect to MongoDB ---
         client = MongoClient(MONGO_CONNECTION_STRING, serverSelectionTimeoutMS=5000); db = client[DB_NAME]; clans_collection = db["clans"]; client.admin.command('ping'); print("MongoDB connection successful.")
 
         # === Query 1: Get Latest Data ===
-        latest_doc_fetch = clans_collection.find_one(
-            {"battle_id": battle_id},
-            sort=[("timestamp", pymongo.DESCENDING)]
-        );
-        if not latest_doc_fetch or not latest_doc_fetch.get('timestamp'): 
-            raise HTTPException(status_code=503, detail="No current data.")
-        latest_ts_dt = latest_doc_fetch['timestamp']
+        latest_ts_dt = latest_tick
         query_latest = {
             "timestamp": latest_ts_dt,
             "battle_id": battle_id
@@ -204,7 +412,7 @@ async def get_clan_reach_target(clan_name: str, target_rank: int, battle_id: str
         latest_docs_cursor = clans_collection.find(
             query_latest, 
             {"_id":0, "clan_name":1, "current_points":1, "timestamp":1}
-        ).sort("current_points", pymongo.DESCENDING).limit(250);
+        ).sort("current_points", pymongo.DESCENDING).limit(REACH_TARGET_MAX_RANK);
         ranked_latest_map = {doc['clan_name']: doc for doc in latest_docs_cursor} # Store as map keyed by name
         if not ranked_latest_map: raise HTTPException(status_code=503, detail="No current clan data available.")
         top_clan_names = list(ranked_latest_map.keys()) # Get names
@@ -226,42 +434,31 @@ async def get_clan_reach_target(clan_name: str, target_rank: int, battle_id: str
         if not user_clan_current_info: raise HTTPException(status_code=404, detail=f"Clan '{clan_name}' not found.")
 
         # === OPTIMIZATION: Bulk Queries for History ===
-        # --- Bulk Query for First Seen Timestamps ---
-        print("Executing bulk query for first_seen (using timestamp) data...")
-        pipeline_first_seen = [
-            {'$match': {'clan_name': {'$in': top_clan_names}, 'battle_id': battle_id}},
-            {'$sort': {'timestamp': pymongo.ASCENDING}},
-            {'$group': {'_id': '$clan_name', 'first_seen_ts': {'$first': '$timestamp'}}}
-        ]
-        print(f"First seen pipeline (by timestamp): {pipeline_first_seen}")
-        first_seen_map = {row['_id']: row['first_seen_ts'] for row in clans_collection.aggregate(pipeline_first_seen)}
-        print(f"Found first_seen data for {len(first_seen_map)} clans.")
+        # Both read one tick for every clan (see clan_history) rather than aggregating over
+        # the battle's whole history, which grows with the leaderboard depth
+        six_hours_ago = latest_ts_dt - datetime.timedelta(hours=6)
+        print("Executing bulk query for clans seen 6h ago...")
+        seen_6h_ago = clan_history.points_at_or_before(clans_collection, battle_id, top_clan_names, six_hours_ago)
+        print(f"Found 6h-old data for {len(seen_6h_ago)} clans.")
 
         # --- Bulk Query for Past Forecast Data ---
         print(f"Executing bulk query for past forecast data (period={forecast_period} min)...")
         target_forecast_past_dt = latest_ts_dt - datetime.timedelta(minutes=forecast_period)
-        pipeline_past_forecast = [ {'$match': { 'clan_name': {'$in': top_clan_names}, 'timestamp': {'$lte': target_forecast_past_dt}, 'battle_id': battle_id }}, {'$sort': {'timestamp': pymongo.DESCENDING}}, {'$group': { '_id': '$clan_name', 'past_points_forecast': {'$first': '$current_points'} }} ]
-        past_data_map_forecast = {row['_id']: row['past_points_forecast'] for row in clans_collection.aggregate(pipeline_past_forecast)}
+        past_data_map_forecast = clan_history.points_at_or_before(clans_collection, battle_id, top_clan_names, target_forecast_past_dt)
         print(f"Found past forecast data for {len(past_data_map_forecast)} clans.")
 
         # === Calculate Projections In Python ===
         print("Calculating projections...")
         projections = {} # clan_name -> projected_score
         projection_eligibility = {} # clan_name -> bool (has_6h_data)
-        six_hours_ago = latest_ts_dt - datetime.timedelta(hours=6)
 
         for c_name in top_clan_names:
             current_info = ranked_latest_map[c_name]
             current_points = current_info['current_points']
             projected_points = None # Default
-            has_6h_data = False
-
-            # Check 6h rule using pre-fetched first_seen data
-            first_seen_dt = first_seen_map.get(c_name)
-            if first_seen_dt and isinstance(first_seen_dt, datetime.datetime):
-                # Compare naively, assuming latest_ts_dt is also naive or compatible
-                if first_seen_dt.replace(tzinfo=None) <= six_hours_ago.replace(tzinfo=None):
-                    has_6h_data = True
+
+            # 6h rule: the clan was first seen at least 6 hours before the latest data
+            has_6h_data = c_name in seen_6h_ago
             projection_eligibility[c_name] = has_6h_data
 
             # Calculate projection if eligible and past data exists
@@ -329,6 +526,16 @@ async def get_clan_comparison(
     """ Fetches historical point data from MongoDB for clan comparison. """
     print(f"/clan_comparison called for clans: {clan_names}, time_period: {time_period}, battle_id: {battle_id}")
 
+    tick = await asyncio.to_thread(get_latest_ingest_tick, battle_id)
+    if tick is None:
+        return []
+    # Result order does not depend on the order or repetition of clan_names
+    key = ("clan_comparison", battle_id, tuple(sorted(set(clan_names))), time_period, tick)
+    return await result_cache.get_or_compute(
+        key, lambda: asyncio.to_thread(compute_clan_comparison, battle_id, clan_names, time_period, tick)
+    )
+
+def compute_clan_comparison(battle_id, clan_names, time_period, latest_tick):
     client = None # Initialize client variable
     comparison_data = []
 
@@ -338,9 +545,9 @@ async def get_clan_comparison(
         db = client[DB_NAME]
         clans_collection = db["clans"] # Use the time-series collection
 
-        # Calculate start timestamp (use timezone-aware UTC)
-        now_dt_utc = datetime.datetime.now(datetime.timezone.utc)
-        start_dt_utc = now_dt_utc - datetime.timedelta(minutes=time_period)
+        # Window ends at the latest ingest tick rather than now, so identical requests within
+        # a fetch cycle ask for the same window (and share one cached result)
+        start_dt_utc = latest_tick - datetime.timedelta(minutes=time_period)
         print(f"Fetching comparison data from: {start_dt_utc}")
 
         # Construct MongoDB query
@@ -388,33 +595,93 @@ async def get_clan_comparison(
 
     return comparison_data
 
+# Battle list rarely changes; cache it for one fetch cycle
+BATTLE_IDS_CACHE_NAMESPACE = "battle_ids"
+BATTLE_IDS_CACHE_TTL = 120
+
+def load_battle_ids():
+    """All battle IDs from battle_id_history, newest first, with ISO timestamps (cached)."""
+    cached = shared_cache.get_many(BATTLE_IDS_CACHE_NAMESPACE, ["all"])
+    if "all" in cached:
+        return cached["all"]
+
+    db = get_mongo_client()[DB_NAME]
+    battle_id_collection = db["battle_id_history"]
+
+    # Fetch all battle IDs, sorted by timestamp in descending order
+    battle_ids = list(battle_id_collection.find(
+        {},
+        {"_id": 0, "battle_id": 1, "timestamp": 1}
+    ).sort("timestamp", pymongo.DESCENDING))
+
+    # Convert timestamps to ISO format strings
+    for record in battle_ids:
+        if "timestamp" in record and isinstance(record["timestamp"], datetime.datetime):
+            record["timestamp"] = record["timestamp"].isoformat()
+
+    shared_cache.set_many(BATTLE_IDS_CACHE_NAMESPACE, {"all": battle_ids}, ttl=BATTLE_IDS_CACHE_TTL)
+    return battle_ids
+
+# War-over-war comparison from the precomputed trajectory index (see battle_trajectories)
+TRAJECTORY_MAX_BATTLES = 10
+
+def load_aligned_trajectories(clan_names, battle_ids):
+    """Curves per battle in the requested order; battles without indexed curves are omitted."""
+    db = get_mongo_client()[DB_NAME]
+    indexed = battle_trajectories.load_trajectories(db, clan_names, battle_ids)
+    return [
+        {"battle_id": battle_id, **indexed[battle_id]}
+        for battle_id in battle_ids if battle_id in indexed
+    ]
+
+@app.get("/trajectories")
+async def get_trajectories(
+    clan_names: List[str] = Query(..., min_length=1, max_length=3, description="List of 1 to 3 clan names."),
+    battle_ids: Optional[List[str]] = Query(None, max_length=TRAJECTORY_MAX_BATTLES, description="Battles to overlay (default: the most recent `battles`)."),
+    battles: int = Query(5, gt=0, le=TRAJECTORY_MAX_BATTLES, description="Number of most recent battles when battle_ids is not given.")
+):
+    """
+    Point curves of the given clans in several battles, aligned on minutes since each
+    battle's start: points[k] is at k * step_minutes, None where the clan was not ranked.
+    """
+    try:
+        if not battle_ids:
+            battle_ids = [battle["battle_id"] for battle in load_battle_ids()[:battles]]
+        return await asyncio.to_thread(load_aligned_trajectories, clan_names, battle_ids)
+    except pymongo.errors.ConnectionFailure as e:
+        print(f"MongoDB connection error in /trajectories: {e}")
+        raise HTTPException(status_code=503, detail="Database connection error.")
+
+# Rank-change and overtake events recorded after each snapshot (see leaderboard_events)
+@app.get("/events")
+async def get_leaderboard_events(
+    battle_id: str,
+    clan_name: Optional[str] = Query(None, description="Only events involving this clan"),
+    types: Optional[List[str]] = Query(None, description=f"Event types: {', '.join(leaderboard_events.EVENT_TYPES)}"),
+    before: Optional[str] = Query(None, description="`next` cursor from the previous page"),
+    limit: int = Query(50, gt=0, le=500)
+):
+    """A page of a battle's rank-change, overtake and projected-overtake events, newest first."""
+    if types and not set(types) <= set(leaderboard_events.EVENT_TYPES):
+        raise HTTPException(status_code=400, detail=f"Unknown event type in {types}")
+    try:
+        before_id = ObjectId(before) if before else None
+    except InvalidId:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {before}")
+    try:
+        db = get_mongo_client()[DB_NAME]
+        events, next_cursor = await asyncio.to_thread(leaderboard_events.load_events, db, battle_id, clan_name, types, before_id, limit)
+    except pymongo.errors.ConnectionFailure as e:
+        print(f"MongoDB connection error in /events: {e}")
+        raise HTTPException(status_code=503, detail="Database connection error.")
+    return {"events": events, "next": next_cursor}
+
 # New endpoint to fetch battle IDs
 @app.get("/api/battle_ids")
 async def get_battle_ids():
     """Fetches all battle IDs from the battle_id_history collection, sorted by timestamp."""
     try:
-        # Connect to MongoDB
-        client = MongoClient(MONGO_CONNECTION_STRING)
-        db = client[DB_NAME]
-        battle_id_collection = db["battle_id_history"]
-
-        # Fetch all battle IDs, sorted by timestamp in descending order
-        battle_ids = list(battle_id_collection.find(
-            {},
-            {"_id": 0, "battle_id": 1, "timestamp": 1}
-        ).sort("timestamp", pymongo.DESCENDING))
-
-        # Convert timestamps to ISO format strings
-        for record in battle_ids:
-            if "timestamp" in record and isinstance(record["timestamp"], datetime.datetime):
-                record["timestamp"] = record["timestamp"].isoformat()
-
-        return battle_ids
-
+        return load_battle_ids()
     except Exception as e:
         print(f"Error fetching battle IDs: {e}")
-        raise HTTPException(status_code=500, detail=f"Error fetching battle IDs: {str(e)}")
-    finally:
-        if client:
-            client.close()
-            print("MongoDB connection closed for /battle_ids")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error fetching battle IDs: {str(e)}")
\ No newline at end of file
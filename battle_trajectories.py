@@ -0,0 +1,199 @@
+"""
+Per-clan point curves for every battle, aligned on minutes since the battle started.
+
+Each battle_trajectories document holds one clan's points in one battle, linearly
+interpolated from the raw clans rows onto a fixed grid: points[k] is the clan's points
+k * step_minutes after the battle's StartTime, or None where the clan was not on the
+leaderboard. The grid starts at battle_id_history.start_time_unix as naive UTC, the clock of
+the clans timestamps (battle_id_history.timestamp is the fetcher host's local time). Curves of different battles line up index by index,
+so a war can be overlaid on earlier wars at the same elapsed time with one indexed read.
+
+The clan fetcher extends the current battle's curves as grid points pass
+(update_battle_trajectories); past battles are indexed once:
+    python battle_trajectories.py [--battle-id <battle_id>] [--rebuild]
+"""
+import argparse
+import datetime
+import logging
+import os
+
+import numpy as np
+import pymongo
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+DB_NAME = "clan_dashboard_db"
+TRAJECTORY_STEP_MINUTES = int(os.environ.get("TRAJECTORY_STEP_MINUTES", "10"))
+
+
+def ensure_indexes(client):
+    db = client[DB_NAME]
+    db["battle_trajectories"].create_index(
+        [("clan_name", pymongo.ASCENDING), ("battle_id", pymongo.ASCENDING)], unique=True
+    )
+    db["battle_trajectory_index"].create_index("battle_id", unique=True)
+
+
+def grid_slots(start_time, until, step_minutes):
+    """Number of grid points at or before `until`."""
+    if until < start_time:
+        return 0
+    return int((until - start_time).total_seconds() // (step_minutes * 60)) + 1
+
+
+def resample(minutes, points, grid_minutes):
+    """
+    Points interpolated at grid_minutes from observations at `minutes` (ascending); None
+    outside the observed range, so a clan is never extrapolated before or after its rows.
+    """
+    values = np.interp(grid_minutes, minutes, points, left=np.nan, right=np.nan)
+    return [None if np.isnan(value) else int(round(value)) for value in values]
+
+
+def load_observations(db, battle_id, start_time, since=None):
+    """clan_name -> (minutes since start, points) arrays from the battle's clans rows."""
+    query = {"battle_id": battle_id}
+    if since is not None:
+        query["timestamp"] = {"$gte": since}
+    series = {}
+    cursor = db["clans"].find(query, {"_id": 0, "clan_name": 1, "current_points": 1, "timestamp": 1}).sort("timestamp", pymongo.ASCENDING)
+    for doc in cursor:
+        minutes, points = series.setdefault(doc["clan_name"], ([], []))
+        minutes.append((doc["timestamp"] - start_time).total_seconds() / 60)
+        points.append(doc["current_points"])
+    return {name: (np.array(minutes), np.array(points, dtype=float)) for name, (minutes, points) in series.items()}
+
+
+def battle_start_time(battle):
+    """A battle_id_history document's StartTime as naive UTC, or None when it has none."""
+    if battle.get("start_time_unix") is not None:
+        return datetime.datetime.utcfromtimestamp(battle["start_time_unix"])
+    if battle.get("timestamp"):
+        # Older documents only have the local-time timestamp; assume this host's timezone
+        return battle["timestamp"].astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return None
+
+
+def update_battle_trajectories(client, battle_id, rebuild=False, complete=False):
+    """
+    Extends a battle's curves up to its newest clans row, re-reading only rows since the
+    last indexed grid point (all of them with `rebuild`). Returns the number of clans updated.
+    `complete` marks a finished battle so index_battles skips it from then on.
+    """
+    db = client[DB_NAME]
+    meta = db["battle_trajectory_index"].find_one({"battle_id": battle_id})
+    # Indexes without start_time_utc were laid out on the local-time start: re-grid them
+    if meta is not None and not meta.get("start_time_utc"):
+        rebuild = True
+    if rebuild or meta is None:
+        battle = db["battle_id_history"].find_one({"battle_id": battle_id}, {"timestamp": 1, "start_time_unix": 1})
+        start_time = battle_start_time(battle) if battle else None
+        if start_time is None:
+            logger.warning(f"No start time in battle_id_history for {battle_id}")
+            return 0
+        step, from_slot = TRAJECTORY_STEP_MINUTES, 0
+        db["battle_trajectories"].delete_many({"battle_id": battle_id})
+    else:
+        start_time, step, from_slot = meta["start_time"], meta["step_minutes"], meta["slots"]
+
+    latest = db["clans"].find_one({"battle_id": battle_id}, {"timestamp": 1}, sort=[("timestamp", pymongo.DESCENDING)])
+    slots = grid_slots(start_time, latest["timestamp"], step) if latest else 0
+    if meta is not None and not rebuild and slots <= from_slot and meta.get("complete") == complete:
+        return 0
+    updates = []
+    if slots > from_slot:
+        # One step of look-back so the first new grid point has a row on either side
+        since = start_time + datetime.timedelta(minutes=(from_slot - 1) * step) if from_slot else None
+        grid_minutes = np.arange(from_slot, slots) * step
+        for clan_name, (minutes, points) in load_observations(db, battle_id, start_time, since).items():
+            values = resample(minutes, points, grid_minutes)
+            if all(value is None for value in values):
+                continue
+            # Keep the first from_slot points, padding clans new to the index with None
+            kept = {"$slice": [{"$concatArrays": [{"$ifNull": ["$points", []]}, [None] * from_slot]}, from_slot]} if from_slot else []
+            updates.append(UpdateOne(
+                {"clan_name": clan_name, "battle_id": battle_id},
+                [{"$set": {
+                    "start_time": start_time,
+                    "step_minutes": step,
+                    "points": {"$concatArrays": [kept, {"$literal": values}]}
+                }}],
+                upsert=True
+            ))
+        if updates:
+            db["battle_trajectories"].bulk_write(updates, ordered=False)
+
+    db["battle_trajectory_index"].update_one(
+        {"battle_id": battle_id},
+        {"$set": {
+            "start_time": start_time,
+            "start_time_utc": True,
+            "step_minutes": step,
+            "slots": max(slots, from_slot),
+            "complete": complete,
+            "updated_at": datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        }},
+        upsert=True
+    )
+    if updates:
+        logger.info(f"Indexed {battle_id} trajectories to grid point {slots} for {len(updates)} clans")
+    return len(updates)
+
+
+def index_battles(client, battle_ids=None, rebuild=False):
+    """Indexes every battle in battle_id_history (or `battle_ids`) not yet marked complete."""
+    db = client[DB_NAME]
+    query = {"battle_id": {"$in": battle_ids}} if battle_ids else {}
+    complete = {doc["battle_id"] for doc in db["battle_trajectory_index"].find({"complete": True, "start_time_utc": True}, {"battle_id": 1})}
+    counts = {}
+    for battle in db["battle_id_history"].find(query, {"battle_id": 1, "is_current": 1}):
+        if battle["battle_id"] in complete and not rebuild:
+            continue
+        counts[battle["battle_id"]] = update_battle_trajectories(
+            client, battle["battle_id"], rebuild=rebuild, complete=not battle.get("is_current")
+        )
+    return counts
+
+
+def load_trajectories(db, clan_names, battle_ids):
+    """
+    Aligned curves of the given clans in the given battles, in one read:
+    {battle_id: {"start_time", "step_minutes", "clans": {clan_name: points}}}.
+    """
+    battles = {}
+    cursor = db["battle_trajectories"].find(
+        {"clan_name": {"$in": clan_names}, "battle_id": {"$in": battle_ids}},
+        {"_id": 0}
+    )
+    for doc in cursor:
+        battle = battles.setdefault(doc["battle_id"], {
+            "start_time": doc["start_time"], "step_minutes": doc["step_minutes"], "clans": {}
+        })
+        battle["clans"][doc["clan_name"]] = doc["points"]
+    return battles
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--battle-id", action="append", help="battle to index (repeatable; default: all)")
+    parser.add_argument("--rebuild", action="store_true", help="re-read every clans row instead of extending")
+    parser.add_argument("--mongo-uri", default=os.environ.get("MONGO_URI"))
+    args = parser.parse_args()
+    if not args.mongo_uri:
+        raise SystemExit("Set --mongo-uri or MONGO_URI")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    client = pymongo.MongoClient(args.mongo_uri)
+    try:
+        ensure_indexes(client)
+        for battle_id, count in index_battles(client, args.battle_id, args.rebuild).items():
+            print(f"  {battle_id:32s} {count:>6,} clans")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Times full fetcher cycles against benchmarks.upstream_simulator and a real MongoDB.
+
+For each tracked-clan count, runs member_data_fetcher.run_fetch_cycle (member snapshots,
+ranks and activity state), clan_data_fetcher.run_fetch_cycle (leaderboard, snapshot) and
+a roblox_api username lookup for the tracked members, and reports per cycle:
+  duration of each phase, Mongo write commands and documents written (counted with a
+  pymongo CommandListener), upstream requests, and tracked clans fetched per second.
+
+The fetchers write to the clan_dashboard_db database, so point --mongo-uri at a scratch
+mongod:
+    python -m benchmarks.fetch_cycle_benchmark --mongo-uri mongodb://localhost:27017 --drop \\
+        [--tracked 2,5,10,25,50] [--cycles 3] [--latency 80] [--rate-limit 0.02] [--error-rate 0.01]
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+from pymongo import MongoClient, monitoring
+
+from benchmarks.synthetic_data import COLLECTIONS, DB_NAME
+from benchmarks.upstream_simulator import FaultProfile, SimulatedUpstream, start_simulator
+
+WRITE_COMMANDS = {"insert": "documents", "update": "updates", "delete": "deletes", "findAndModify": None}
+
+
+class WriteCounter(monitoring.CommandListener):
+    """Counts write commands and the documents they carry."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.commands = 0
+        self.documents = 0
+
+    def started(self, event):
+        if event.command_name not in WRITE_COMMANDS:
+            return
+        field = WRITE_COMMANDS[event.command_name]
+        documents = len(event.command.get(field, ())) if field else 1
+        with self._lock:
+            self.commands += 1
+            self.documents += documents
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def take(self):
+        with self._lock:
+            counts = (self.commands, self.documents)
+            self.commands = self.documents = 0
+        return counts
+
+
+def timed(func, quiet):
+    """Runs func, optionally swallowing the fetchers' print output; returns (seconds, result)."""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        result = func()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.environ.get("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--tracked", default="2,5,10,25,50", help="comma separated tracked-clan counts")
+    parser.add_argument("--cycles", type=int, default=3, help="cycles per tracked-clan count")
+    parser.add_argument("--clans", type=int, default=250, help="clans served by the simulator")
+    parser.add_argument("--members", type=int, default=75, help="members in the leading clans")
+    parser.add_argument("--latency", type=float, default=0, help="simulated upstream latency, ms")
+    parser.add_argument("--jitter", type=float, default=0, help="uniform +/- jitter on the latency, ms")
+    parser.add_argument("--rate-limit", type=float, default=0, help="fraction of upstream requests answered 429")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of upstream requests answered 500")
+    parser.add_argument("--drop", action="store_true", help="drop the fetcher collections first")
+    parser.add_argument("--verbose", action="store_true", help="keep the fetchers' output")
+    args = parser.parse_args()
+
+    upstream = SimulatedUpstream(args.clans, args.members)
+    faults = FaultProfile(args.latency, args.jitter, args.rate_limit, args.error_rate)
+    server, base_url = start_simulator(upstream=upstream, faults=faults)
+
+    # The fetchers read their configuration at import time
+    os.environ["MONGO_URI"] = args.mongo_uri
+    os.environ["BIGGAMES_API_URL"] = base_url
+    os.environ["PS99_API_URL"] = base_url
+    os.environ["ROBLOX_USERS_API_URL"] = base_url
+    import clan_data_fetcher
+    import member_data_fetcher
+    import roblox_api
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    writes = WriteCounter()
+    client = MongoClient(args.mongo_uri, event_listeners=[writes])
+    if args.drop:
+        for name in COLLECTIONS:
+            client[DB_NAME].drop_collection(name)
+    member_data_fetcher.ensure_indexes(client)
+
+    clan_names = list(upstream.clans)
+    counts = [min(int(count), len(clan_names)) for count in args.tracked.split(",") if count.strip()]
+    print(f"Simulator {base_url}: {len(clan_names)} clans, latency {args.latency}ms, "
+          f"429 rate {args.rate_limit}, error rate {args.error_rate}")
+    print(f"{'tracked':>7s} {'member s':>9s} {'clan s':>7s} {'users s':>8s} {'cycle s':>8s} "
+          f"{'writes':>7s} {'docs':>7s} {'requests':>9s} {'clans/s':>8s}")
+
+    try:
+        for count in counts:
+            member_data_fetcher.TRACKED_CLANS = clan_names[:count]
+            rows = []
+            for _ in range(args.cycles):
+                writes.take()
+                requests_before = sum(value for key, value in server.counts.items() if isinstance(key, str))
+                member_s, stored = timed(lambda: member_data_fetcher.run_fetch_cycle(client), not args.verbose)
+                # The clan fetcher only collects once the member fetcher has recorded the battle
+                clan_s, _ = timed(lambda: clan_data_fetcher.run_fetch_cycle(client), not args.verbose)
+                user_ids = [str(user_id) for name in clan_names[:count] for user_id, _ in upstream.clans[name]["members"]]
+                users_s, _ = timed(lambda: roblox_api.get_user_data_batch(user_ids, client), not args.verbose)
+                commands, documents = writes.take()
+                requests_made = sum(value for key, value in server.counts.items() if isinstance(key, str)) - requests_before
+                rows.append((member_s, clan_s, users_s, commands, documents, requests_made, stored or 0))
+
+            member_s = statistics.median(row[0] for row in rows)
+            clan_s = statistics.median(row[1] for row in rows)
+            users_s = statistics.median(row[2] for row in rows)
+            stored = statistics.median(row[6] for row in rows)
+            print(
+                f"{count:7d} {member_s:9.2f} {clan_s:7.2f} {users_s:8.2f} {member_s + clan_s + users_s:8.2f} "
+                f"{statistics.median(row[3] for row in rows):7.0f} {statistics.median(row[4] for row in rows):7.0f} "
+                f"{statistics.median(row[5] for row in rows):9.0f} {stored / member_s if member_s else 0:8.1f}"
+            )
+            if stored < count:
+                print(f"        only {stored:.0f} of {count} clans stored per cycle; rerun with --verbose", file=sys.stderr)
+    finally:
+        client.close()
+        server.shutdown()
+
+    injected = {status: server.counts.get(status, 0) for status in (429, 500)}
+    print(f"Injected failures: {injected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Replays the frontend's request mix against a running combined_api_server.
+
+Each virtual user opens one page and then follows that page's refresh timers:
+  dashboard       script.js: battle ids, countdown, dashboard, comparison and reach-target
+                  on load; dashboard (with since=) every 120s, countdown every 60s
+  members         member_script.js: battle ids, member tracking and the compact battle
+                  history on load; recent history (with since=), member stats and
+                  inactivity every 120s
+  member_details  member_details.js: member tracking and the member's history on load,
+                  rank history; both every 120s
+Timers are divided by --speedup so a run covers many refresh cycles. SSE streams are not
+opened; the dashboard users exercise the polling fallback.
+
+Reports p50/p95/p99 latency, throughput and errors per endpoint. Start the server with a
+rate limit that will not throttle the test, e.g. against a synthetic_data database:
+    RATE_LIMIT=1000000/minute python combined_api_server.py
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 [--users 50] [--duration 60]
+"""
+import argparse
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import quote
+
+import requests
+
+PAGE_MIX = {"dashboard": 0.6, "members": 0.3, "member_details": 0.1}
+DASHBOARD_INTERVAL = 120
+COUNTDOWN_INTERVAL = 60
+MEMBER_REFRESH_INTERVAL = 120
+
+
+class Recorder:
+    """Latencies and outcomes per endpoint name, shared by all virtual users."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.throttled = defaultdict(int)
+
+    def request(self, session, name, url):
+        started = time.perf_counter()
+        try:
+            response = session.get(url, timeout=60)
+            elapsed = time.perf_counter() - started
+            status = response.status_code
+        except requests.RequestException:
+            elapsed, status, response = time.perf_counter() - started, None, None
+        with self._lock:
+            self.latencies[name].append(elapsed)
+            if status == 429:
+                self.throttled[name] += 1
+            elif status is None or status >= 400:
+                self.errors[name] += 1
+        return response if status == 200 else None
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def discover(base_url):
+    """Battle, leaderboard clans and tracked clans with their members, read through the API."""
+    session = requests.Session()
+    battle_ids = session.get(f"{base_url}/api/clan/api/battle_ids", timeout=30).json()
+    if not battle_ids:
+        raise SystemExit("No battles in the database; run benchmarks.synthetic_data first")
+    battle_id = battle_ids[0]["battle_id"]
+    top_clans = session.get(f"{base_url}/api/clan/dashboard", params={"battle_id": battle_id}, timeout=30).json()
+    clan_names = [clan["clan_name"] for clan in top_clans]
+
+    tracked = {}
+    for clan_name in clan_names:
+        response = session.get(f"{base_url}/api/member/member-tracking/{quote(clan_name)}", params={"battle_id": battle_id}, timeout=30)
+        if response.status_code == 200:
+            tracked[clan_name] = [member["UserID"] for member in response.json().get("members", [])]
+    if not tracked:
+        raise SystemExit("No clan has member data for the latest battle")
+    return battle_id, clan_names, tracked
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, base_url, recorder, page, battle_id, clan_names, tracked, speedup, deadline, seed):
+        super().__init__(daemon=True)
+        self.base = base_url
+        self.recorder = recorder
+        self.page = page
+        self.battle = quote(battle_id)
+        self.clan_names = clan_names
+        self.tracked = tracked
+        self.speedup = speedup
+        self.deadline = deadline
+        self.random = random.Random(seed)
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = "br, gzip"
+
+    def get(self, name, path):
+        return self.recorder.request(self.session, name, f"{self.base}{path}")
+
+    def run(self):
+        # Stagger page loads so users don't refresh in lockstep
+        time.sleep(self.random.random() * DASHBOARD_INTERVAL / self.speedup)
+        getattr(self, f"run_{self.page}")()
+
+    def timers(self, intervals):
+        """Yields the name of each timer as it fires, until the deadline."""
+        due = {name: time.monotonic() + interval / self.speedup for name, interval in intervals.items()}
+        while True:
+            name = min(due, key=due.get)
+            wait = due[name] - time.monotonic()
+            if due[name] > self.deadline:
+                return
+            if wait > 0:
+                time.sleep(wait)
+            due[name] += intervals[name] / self.speedup
+            yield name
+
+    def run_dashboard(self):
+        self.get("battle_ids", "/api/clan/api/battle_ids")
+        self.get("countdown", "/api/clan/countdown")
+        response = self.get("dashboard", f"/api/clan/dashboard?battle_id={self.battle}")
+        since = response.headers.get("X-Snapshot-Timestamp") if response is not None else None
+        compared = self.random.sample(self.clan_names, min(3, len(self.clan_names)))
+        clan_params = "".join(f"&clan_names={quote(name)}" for name in compared)
+        self.get("clan_comparison", f"/api/clan/clan_comparison?time_period=60&battle_id={self.battle}{clan_params}")
+        target = quote(self.random.choice(self.clan_names))
+        self.get("clan_reach_target", f"/api/clan/clan_reach_target?clan_name={target}&target_rank=1&forecast_period=360&battle_id={self.battle}")
+
+        for timer in self.timers({"dashboard": DASHBOARD_INTERVAL, "countdown": COUNTDOWN_INTERVAL}):
+            if timer == "countdown":
+                self.get("countdown", "/api/clan/countdown")
+                continue
+            path = f"/api/clan/dashboard?battle_id={self.battle}"
+            name = "dashboard"
+            if since:
+                path += f"&since={quote(since)}"
+                name = "dashboard?since"
+            response = self.get(name, path)
+            if response is not None:
+                since = response.headers.get("X-Snapshot-Timestamp") or since
+
+    def run_members(self):
+        clan = quote(self.random.choice(list(self.tracked)))
+        self.get("battle_ids", "/api/clan/api/battle_ids")
+        self.get("member_tracking", f"/api/member/member-tracking/{clan}?battle_id={self.battle}")
+        response = self.get("member_history", f"/api/member/member-history/{clan}?battle_id={self.battle}&format=compact")
+        timestamps = response.json().get("timestamps") if response is not None else None
+        since = timestamps[0] if timestamps else None
+
+        for _ in self.timers({"refresh": MEMBER_REFRESH_INTERVAL}):
+            path = f"/api/member/member-history/{clan}/recent?hours=24&battle_id={self.battle}&format=compact"
+            if since:
+                path += f"&since={quote(since)}"
+            response = self.get("member_history_recent", path)
+            if response is not None:
+                timestamps = response.json().get("timestamps")
+                since = timestamps[0] if timestamps else since
+            self.get("member_stats", f"/api/member/member-stats/{clan}?battle_id={self.battle}&period=60&hours=24")
+            self.get("member_inactivity", f"/api/member/member-inactivity/{clan}?battle_id={self.battle}&window=2")
+
+    def run_member_details(self):
+        clan_name = self.random.choice(list(self.tracked))
+        clan = quote(clan_name)
+        user_id = quote(str(self.random.choice(self.tracked[clan_name])))
+        self.get("member_tracking", f"/api/member/member-tracking/{clan}?battle_id={self.battle}")
+        self.get("member_history_user", f"/api/member/member-history/{clan}?battle_id={self.battle}&userId={user_id}&format=compact")
+        self.get("member_rank_history", f"/api/member/member-rank-history/{clan}/{user_id}?battle_id={self.battle}")
+
+        for _ in self.timers({"refresh": MEMBER_REFRESH_INTERVAL}):
+            self.get("member_tracking", f"/api/member/member-tracking/{clan}?battle_id={self.battle}")
+            self.get("member_history_user", f"/api/member/member-history/{clan}?battle_id={self.battle}&userId={user_id}&format=compact")
+
+
+def print_report(recorder, elapsed):
+    print(f"{'endpoint':24s} {'count':>7s} {'req/s':>7s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'errors':>7s} {'429':>5s}")
+    total = 0
+    for name in sorted(recorder.latencies):
+        values = sorted(recorder.latencies[name])
+        total += len(values)
+        print(
+            f"{name:24s} {len(values):7d} {len(values) / elapsed:7.2f} "
+            f"{percentile(values, 0.50) * 1000:8.1f} {percentile(values, 0.95) * 1000:8.1f} {percentile(values, 0.99) * 1000:8.1f} "
+            f"{recorder.errors[name]:7d} {recorder.throttled[name]:5d}"
+        )
+    print(f"{'total':24s} {total:7d} {total / elapsed:7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="seconds")
+    parser.add_argument("--speedup", type=float, default=60, help="divide the frontend refresh intervals by this")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    battle_id, clan_names, tracked = discover(args.base_url)
+    print(f"Battle {battle_id}: {len(clan_names)} leaderboard clans, {len(tracked)} tracked clans")
+
+    rng = random.Random(args.seed)
+    pages = rng.choices(list(PAGE_MIX), weights=list(PAGE_MIX.values()), k=args.users)
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + args.duration
+    users = [
+        VirtualUser(args.base_url, recorder, page, battle_id, clan_names, tracked, args.speedup, deadline, args.seed + i)
+        for i, page in enumerate(pages)
+    ]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join(max(deadline - time.monotonic(), 0) + 60)
+    print_report(recorder, time.monotonic() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Compares the full and dictionary-encoded (format=compact) member history responses.
+
+Measures server-side processing (raw clan_members documents -> response body, including
+orjson encoding) and body size raw/gzip for the same records.
+
+Run from the repository root:
+    python -m benchmarks.member_history_format_benchmark [--snapshots 720] [--members 75]
+"""
+import argparse
+import datetime
+import gzip
+import random
+import time
+
+from api_responses import GZIP_LEVEL, FastJSONResponse
+from member_api_server import build_compact_history, build_full_history
+
+
+def build_raw_records(snapshots, members, clan_name="NONG", battle_id="Battle1"):
+    """clan_members documents as stored by member_data_fetcher, newest first."""
+    start = datetime.datetime(2024, 1, 1)
+    member_ids = [1000000000 + random.randrange(10 ** 9) for _ in range(members)]
+    points = {user_id: 0 for user_id in member_ids}
+    records = []
+    for i in range(snapshots):
+        for user_id in member_ids:
+            if random.random() < 0.6:
+                points[user_id] += random.randint(1, 500)
+        records.append({
+            "clan_name": clan_name,
+            "battle_id": battle_id,
+            "is_active": True,
+            "total_points": sum(points.values()),
+            "members": [{"UserID": user_id, "Points": points[user_id]} for user_id in member_ids],
+            "timestamp": start + datetime.timedelta(minutes=2 * i)
+        })
+    records.reverse()
+    usernames = {
+        str(user_id): {"name": f"player_{user_id % 10 ** 6}", "display_name": f"Player {user_id % 10 ** 6}"}
+        for user_id in member_ids
+    }
+    return records, usernames
+
+
+def render_full(records, usernames):
+    return FastJSONResponse({"clan_name": "NONG", "history": build_full_history(records, usernames)}).body
+
+
+def render_compact(records, usernames):
+    data = build_compact_history(records, usernames)
+    data["clan_name"] = "NONG"
+    return FastJSONResponse(data).body
+
+
+def best_time(func, repeat, *args):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--snapshots", type=int, default=720, help="snapshots (720 = 24h at 2 minutes)")
+    parser.add_argument("--members", type=int, default=75)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(42)
+    records, usernames = build_raw_records(args.snapshots, args.members)
+    print(f"{args.snapshots} snapshots x {args.members} members")
+    results = {}
+    for name, render in (("full", render_full), ("compact", render_compact)):
+        body = render(records, usernames)
+        elapsed = best_time(render, args.repeat, records, usernames)
+        gzipped = len(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        results[name] = (elapsed, len(body), gzipped)
+        print(f"  {name:8s} process+encode {elapsed * 1000:8.2f} ms   raw {len(body):>11,} B   gzip {gzipped:>9,} B")
+
+    full, compact = results["full"], results["compact"]
+    print(
+        f"  compact is {full[0] / compact[0]:.1f}x faster, "
+        f"{full[1] / compact[1]:.1f}x smaller raw, {full[2] / compact[2]:.1f}x smaller gzipped"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Compares ways of getting the active battle out of a clan details (/api/clan/{name}) response.
+
+  json      response.json(): the stdlib parse the member fetcher used to do
+  orjson    full orjson parse, what fetch_member_data does
+  ijson     push parse (ijson) fed in download-sized chunks, as a streaming fetch would,
+            keeping only the newest battle of data.Battles
+
+For each payload reports mean parse time and peak memory allocated while parsing
+(tracemalloc), and checks every method yields the same parse_member_data members.
+
+Payloads are recorded clan responses from a raw archive (RAW_ARCHIVE_DIR, stream
+member_fetcher), or simulated ones with a growing battle history:
+    python -m benchmarks.member_parse_benchmark [--past-battles 8,50,200] [--members 75]
+    python -m benchmarks.member_parse_benchmark --archive-dir $RAW_ARCHIVE_DIR [--payloads 20]
+"""
+import argparse
+import json
+import logging
+import time
+import tracemalloc
+
+import orjson
+
+from benchmarks.upstream_simulator import BATTLE_ID, LEADING_CLANS, SimulatedUpstream
+from raw_archive import RawArchiveReader
+
+try:
+    import ijson
+except ImportError:  # Optional: the ijson row is skipped without it
+    ijson = None
+
+
+# requests' iter_content chunk size a streaming download would be parsed in
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def parse_ijson(raw, battle_id):
+    # Older battles are decoded one at a time and dropped, so only the newest stays in memory
+    entries = ijson.sendable_list()
+    parser = ijson.kvitems_coro(entries, "data.Battles")
+    newest = {}
+    for offset in range(0, len(raw), STREAM_CHUNK_BYTES):
+        parser.send(raw[offset:offset + STREAM_CHUNK_BYTES])
+        for key, battle in entries:
+            if isinstance(battle, dict) and "PointContributions" in battle:
+                newest = {key: battle}
+        del entries[:]
+    parser.close()
+    return {"status": "ok", "data": {"Battles": newest}}
+
+
+METHODS = {
+    "json": lambda raw, battle_id: json.loads(raw),
+    "orjson": lambda raw, battle_id: orjson.loads(raw),
+    "ijson": parse_ijson
+}
+
+
+def newest_battle_id(payload):
+    battles = ((payload.get("data") or {}).get("Battles")) or {}
+    valid = [battle_id for battle_id, battle in battles.items() if isinstance(battle, dict) and "PointContributions" in battle]
+    return valid[-1] if valid else None
+
+
+def simulated_payloads(past_battles, members):
+    for count in past_battles:
+        upstream = SimulatedUpstream(clans=len(LEADING_CLANS), members=members, past_battles=count)
+        yield f"{count} past battles", orjson.dumps(upstream.clan_details(LEADING_CLANS[0])), BATTLE_ID
+
+
+def archived_payloads(archive_dir, limit):
+    for record in RawArchiveReader(archive_dir, "member_fetcher").records(sources={"clan"}):
+        if limit <= 0:
+            return
+        payload = record["payload"]
+        battle_id = newest_battle_id(payload or {})
+        if battle_id is None:
+            continue
+        limit -= 1
+        yield f"{record['key']} @ {record['fetched_at']:.0f}", orjson.dumps(payload), battle_id
+
+
+def measure(method, raw, battle_id, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        method(raw, battle_id)
+    elapsed = (time.perf_counter() - started) / repeat
+    tracemalloc.start()
+    result = method(raw, battle_id)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--past-battles", default="8,50,200", help="simulated history lengths (comma separated)")
+    parser.add_argument("--members", type=int, default=75)
+    parser.add_argument("--archive-dir", help="use recorded clan responses from this raw archive")
+    parser.add_argument("--payloads", type=int, default=10, help="recorded payloads to use")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    # parse_member_data logs every call
+    logging.disable(logging.INFO)
+    from member_data_fetcher import parse_member_data
+
+    if args.archive_dir:
+        payloads = archived_payloads(args.archive_dir, args.payloads)
+    else:
+        payloads = simulated_payloads([int(n) for n in args.past_battles.split(",")], args.members)
+
+    methods = {name: method for name, method in METHODS.items() if name != "ijson" or ijson is not None}
+    print(f"{'payload':28s} {'size':>9s}  " + "  ".join(f"{name:>18s}" for name in methods))
+    for label, raw, battle_id in payloads:
+        cells = []
+        expected = None
+        for name, method in methods.items():
+            elapsed, peak, result = measure(method, raw, battle_id, args.repeat)
+            members = parse_member_data("NONG", result, None)["members"]
+            if expected is None:
+                expected = members
+            elif members != expected:
+                raise SystemExit(f"{name} disagrees with json on {label}")
+            cells.append(f"{elapsed * 1000:7.2f}ms {peak / 1024:6.0f}KB")
+        print(f"{label[:28]:28s} {len(raw) / 1024:7.0f}KB  " + "  ".join(f"{cell:>18s}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmarks response encoding on the API's real response shapes.
+
+Compares the default FastAPI path (jsonable_encoder + stdlib json, as used by
+JSONResponse) with FastJSONResponse (orjson), and reports body size raw, gzip and brotli.
+
+Run from the repository root:
+    python -m benchmarks.serialization_benchmark [--snapshots 720] [--members 75]
+"""
+import argparse
+import datetime
+import gzip
+import json
+import random
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from api_responses import BROTLI_QUALITY, GZIP_LEVEL, FastJSONResponse, brotli
+
+
+def build_member_history(snapshots, members, battle_id="Battle1"):
+    """Shape of /member-history/{clan_name}: one entry per 2-minute snapshot."""
+    start = datetime.datetime(2024, 1, 1)
+    member_ids = [str(1000000000 + random.randrange(10 ** 9)) for _ in range(members)]
+    points = {user_id: 0 for user_id in member_ids}
+    history = []
+    for i in range(snapshots):
+        for user_id in member_ids:
+            if random.random() < 0.6:
+                points[user_id] += random.randint(1, 500)
+        history.append({
+            "timestamp": start + datetime.timedelta(minutes=2 * i),
+            "total_points": sum(points.values()),
+            "is_active": True,
+            "battle_id": battle_id,
+            "members": [
+                {
+                    "UserID": user_id,
+                    "username": f"player_{user_id[-6:]}",
+                    "display_name": f"Player {user_id[-6:]}",
+                    "points": points[user_id]
+                }
+                for user_id in member_ids
+            ]
+        })
+    history.reverse()  # Newest first, like the endpoint
+    return {"status": "ok", "clan_name": "NONG", "battle_id": battle_id, "history": history}
+
+
+def build_dashboard(clans=25):
+    """Shape of /dashboard: top clans with precomputed gains."""
+    top_clans = []
+    for rank in range(1, clans + 1):
+        clan = {
+            "clan_name": f"CLAN{rank}",
+            "current_points": 10 ** 7 - rank * 12345,
+            "current_rank": rank,
+            "members": 75,
+            "projected_points": 1.2e7 - rank * 15000.5,
+            "forecast_rank": rank,
+            "icon": f"rbxassetid://{14000000000 + rank}"
+        }
+        for period in (30, 60, 180, 360, 720, 1080, 1440):
+            clan[f"gain_{period}m"] = random.randint(0, 10 ** 6)
+        top_clans.append(clan)
+    return top_clans
+
+
+def build_clan_comparison(clans=3, points=720):
+    """Shape of /clan_comparison: rows of clan_name/timestamp/current_points."""
+    start = datetime.datetime(2024, 1, 1)
+    return [
+        {
+            "clan_name": f"CLAN{c}",
+            "timestamp": (start + datetime.timedelta(minutes=2 * i)).isoformat(),
+            "current_points": i * 1000 + c
+        }
+        for c in range(clans) for i in range(points)
+    ]
+
+
+def encode_stdlib(content):
+    # What starlette.responses.JSONResponse does after FastAPI's jsonable_encoder
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def encode_orjson(content):
+    return FastJSONResponse(content).body
+
+
+def time_call(func, content, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def report(name, content, repeat):
+    body = encode_orjson(content)
+    stdlib_time = time_call(encode_stdlib, content, repeat)
+    orjson_time = time_call(encode_orjson, content, repeat)
+    gzip_start = time.perf_counter()
+    gzipped = gzip.compress(body, compresslevel=GZIP_LEVEL)
+    gzip_time = time.perf_counter() - gzip_start
+    print(f"\n== {name} ==")
+    print(f"  encode  stdlib+jsonable_encoder: {stdlib_time * 1000:9.2f} ms")
+    print(f"  encode  orjson:                  {orjson_time * 1000:9.2f} ms  ({stdlib_time / orjson_time:.1f}x faster)")
+    print(f"  bytes   raw:                     {len(body):>12,}")
+    print(f"  bytes   gzip-{GZIP_LEVEL}:                  {len(gzipped):>12,}  ({gzip_time * 1000:.2f} ms)")
+    if brotli is not None:
+        br_start = time.perf_counter()
+        brotlied = brotli.compress(body, quality=BROTLI_QUALITY)
+        br_time = time.perf_counter() - br_start
+        print(f"  bytes   brotli-{BROTLI_QUALITY}:                {len(brotlied):>12,}  ({br_time * 1000:.2f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--snapshots", type=int, default=720, help="member-history snapshots (720 = 24h)")
+    parser.add_argument("--members", type=int, default=75)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(42)
+    report("/dashboard (25 clans)", build_dashboard(), args.repeat)
+    report("/clan_comparison (3 clans x 24h)", build_clan_comparison(), args.repeat)
+    report(
+        f"/member-history ({args.snapshots} snapshots x {args.members} members)",
+        build_member_history(args.snapshots, args.members),
+        args.repeat
+    )
+
+
+if __name__ == "__main__":
+    main()
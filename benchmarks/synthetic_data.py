@@ -0,0 +1,295 @@
+"""
+Fills a MongoDB database with a synthetic clan battle for load testing.
+
+Writes the collections the fetchers maintain, in their real document shapes:
+clans, clan_details, leaderboard_snapshots, battle_id_history, clan_members and
+username_cache, plus the ingest-time member_rank_history and member_activity_state.
+Point series are generated with NumPy, ending at the current time, so the "recent"
+endpoints have data. A 7-day battle at the 2-minute cadence (~1.3M clan documents) builds
+in well under a minute against a local mongod.
+
+Run from the repository root (the API reads the clan_dashboard_db database):
+    python -m benchmarks.synthetic_data --mongo-uri mongodb://localhost:27017 --drop \\
+        [--days 7] [--clans 250] [--tracked-clans 5] [--members 75] [--cadence 2]
+
+--dry-run builds every document without a database, to time the generator alone.
+"""
+import argparse
+import datetime
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pymongo
+from pymongo import MongoClient
+
+DB_NAME = "clan_dashboard_db"
+# Same periods and forecast window as clan_data_fetcher.create_leaderboard_snapshot
+GAIN_PERIODS = [30, 60, 180, 360, 720, 1080, 1440]
+FORECAST_PERIOD = 360
+TOP_CLANS = 25
+INSERT_BATCH_SIZE = 10000
+INSERT_THREADS = 4
+
+COLLECTIONS = (
+    "clans", "clan_details", "leaderboard_snapshots", "battle_id_history", "clan_members",
+    "username_cache", "member_rank_history", "member_activity_state"
+)
+
+
+def tick_timestamps(days, cadence_minutes, end=None):
+    """Naive UTC fetch-cycle timestamps, oldest first, ending at `end` (default: now)."""
+    end = (end or datetime.datetime.utcnow()).replace(second=0, microsecond=0)
+    ticks = int(days * 24 * 60 // cadence_minutes)
+    start = end - datetime.timedelta(minutes=cadence_minutes * (ticks - 1))
+    return [start + datetime.timedelta(minutes=cadence_minutes * i) for i in range(ticks)]
+
+
+def clan_points(rng, ticks, clans):
+    """ticks x clans cumulative points; clan 0 is the fastest, with noisy per-tick gains."""
+    rates = np.sort(rng.lognormal(mean=8.0, sigma=0.6, size=clans))[::-1]
+    gains = rng.random((ticks, clans)) * 2 * rates
+    return np.cumsum(gains, axis=0).astype(np.int64)
+
+
+def member_points(rng, ticks, members):
+    """ticks x members cumulative points; each member has their own activity rate and streaks."""
+    activity = rng.beta(4, 1.5, size=members)
+    # Sessions: a member is online for runs of ticks rather than independently per tick
+    online = rng.random((ticks // 30 + 1, members)) < activity
+    online = np.repeat(online, 30, axis=0)[:ticks]
+    gains = online * rng.integers(1, 500, size=(ticks, members))
+    return np.cumsum(gains, axis=0)
+
+
+def build_clans(names, member_counts, points, timestamps, battle_id):
+    """One clans document per clan per fetch cycle."""
+    rows = points.tolist()
+    return [
+        {
+            "clan_name": name,
+            "current_points": row[col],
+            "members": member_counts[col],
+            "timestamp": timestamp,
+            "battle_id": battle_id
+        }
+        for timestamp, row in zip(timestamps, rows)
+        for col, name in enumerate(names)
+    ]
+
+
+def build_clan_details(names, timestamp, rng):
+    codes = ["US", "GB", "DE", "BR", "PH", "CA", "FR", "NL"]
+    return [
+        {
+            "clan_name": name,
+            "icon": f"rbxassetid://{1000000 + i}",
+            "country_code": codes[int(rng.integers(len(codes)))],
+            "member_capacity": 75,
+            "created_timestamp_api": int(timestamp.timestamp()) - 86400 * 365,
+            "last_checked": timestamp
+        }
+        for i, name in enumerate(names)
+    ]
+
+
+def build_snapshots(names, member_counts, points, timestamps, cadence_minutes, battle_id, finish_time):
+    """leaderboard_snapshots with the gains, projection and forecast rank the fetcher computes."""
+    snapshots = []
+    for tick, timestamp in enumerate(timestamps):
+        row = points[tick]
+        top = np.argsort(-row, kind="stable")[:TOP_CLANS]
+        minutes_remaining = max((finish_time - timestamp).total_seconds() / 60, 0)
+        top_clans = []
+        for rank, col in enumerate(top, 1):
+            clan = {
+                "clan_name": names[col],
+                "current_points": int(row[col]),
+                "current_rank": rank,
+                "members": member_counts[col]
+            }
+            for period in GAIN_PERIODS:
+                back = period // cadence_minutes
+                clan[f"gain_{period}m"] = int(row[col] - points[tick - back, col]) if tick >= back else None
+            gain = clan[f"gain_{FORECAST_PERIOD}m"]
+            clan["projected_points"] = (
+                clan["current_points"] + gain / FORECAST_PERIOD * minutes_remaining
+                if gain is not None and minutes_remaining > 0 else clan["current_points"]
+            )
+            top_clans.append(clan)
+        for forecast_rank, clan in enumerate(sorted(top_clans, key=lambda c: c["projected_points"], reverse=True), 1):
+            clan["forecast_rank"] = forecast_rank
+        snapshots.append({"battle_id": battle_id, "timestamp": timestamp, "top_clans": top_clans})
+    return snapshots
+
+
+def build_member_collections(clan_name, user_ids, points, timestamps, battle_id):
+    """clan_members snapshots plus the rank history and activity state derived at ingest."""
+    rows = points.tolist()
+    totals = points.sum(axis=1).tolist()
+    clan_members = [
+        {
+            "clan_name": clan_name,
+            "battle_id": battle_id,
+            "is_active": True,
+            "total_points": totals[tick],
+            "members": [{"UserID": user_id, "Points": value} for user_id, value in zip(user_ids, row)],
+            "timestamp": timestamp
+        }
+        for tick, (timestamp, row) in enumerate(zip(timestamps, rows))
+    ]
+
+    # Rank 1 = most points; stable order for ties, like member_stats.rank_members
+    order = np.argsort(-points, axis=1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, points.shape[1] + 1)[None, :], axis=1)
+    rank_history = [
+        {
+            "clan_name": clan_name,
+            "battle_id": battle_id,
+            "user_id": str(user_id),
+            "timestamps": timestamps,
+            "ranks": ranks[:, col].tolist()
+        }
+        for col, user_id in enumerate(user_ids)
+    ]
+
+    changed = np.vstack([np.ones((1, points.shape[1]), dtype=bool), points[1:] != points[:-1]])
+    last_change = changed.shape[0] - 1 - np.argmax(changed[::-1], axis=0)
+    activity_members = {
+        str(user_id): {
+            "points": rows[-1][col],
+            "last_change": timestamps[last_change[col]],
+            "streak": int(len(timestamps) - 1 - last_change[col]),
+            "seen": len(timestamps),
+            "last_seen": timestamps[-1]
+        }
+        for col, user_id in enumerate(user_ids)
+    }
+    activity_state = {
+        "clan_name": clan_name,
+        "battle_id": battle_id,
+        "updated_at": timestamps[-1],
+        "members": activity_members
+    }
+    return clan_members, rank_history, activity_state
+
+
+def build_dataset(days=7, clans=250, tracked_clans=5, members=75, cadence_minutes=2, battle_id="SyntheticBattle", seed=42):
+    """Returns {collection name: [documents]} for a whole synthetic battle."""
+    rng = np.random.default_rng(seed)
+    timestamps = tick_timestamps(days, cadence_minutes)
+    start, now = timestamps[0], timestamps[-1]
+    finish_time = now + datetime.timedelta(days=1)
+    # NONG is the clan the fetchers track by default
+    names = ["NONG"] + [f"CLAN{i:03d}" for i in range(1, clans)]
+
+    points = clan_points(rng, len(timestamps), clans)
+    member_counts = rng.integers(40, 76, size=clans).tolist()
+    dataset = {
+        "clans": build_clans(names, member_counts, points, timestamps, battle_id),
+        "clan_details": build_clan_details(names, now, rng),
+        "leaderboard_snapshots": build_snapshots(names, member_counts, points, timestamps, cadence_minutes, battle_id, finish_time),
+        "battle_id_history": [{
+            "battle_id": battle_id, "timestamp": start, "is_current": True,
+            "start_time_unix": int(start.replace(tzinfo=datetime.timezone.utc).timestamp())
+        }],
+        "clan_members": [],
+        "member_rank_history": [],
+        "member_activity_state": [],
+        "username_cache": []
+    }
+
+    next_user_id = 1000000000
+    for clan_name in names[:tracked_clans]:
+        user_ids = list(range(next_user_id, next_user_id + members))
+        next_user_id += members
+        clan_members, rank_history, activity_state = build_member_collections(
+            clan_name, user_ids, member_points(rng, len(timestamps), members), timestamps, battle_id
+        )
+        dataset["clan_members"].extend(clan_members)
+        dataset["member_rank_history"].extend(rank_history)
+        dataset["member_activity_state"].append(activity_state)
+        dataset["username_cache"].extend(
+            {
+                "user_id": str(user_id),
+                "name": f"player_{user_id}",
+                "display_name": f"Player {user_id % 100000}",
+                "last_updated": time.time()
+            }
+            for user_id in user_ids
+        )
+    return dataset
+
+
+def create_indexes(db):
+    """The indexes api_server and member_data_fetcher create at startup."""
+    db["clans"].create_index([("battle_id", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)])
+    db["clans"].create_index([("battle_id", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING), ("current_points", pymongo.DESCENDING)])
+    db["clans"].create_index([("battle_id", pymongo.ASCENDING), ("clan_name", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)])
+    db["clan_members"].create_index(
+        [("clan_name", pymongo.ASCENDING), ("battle_id", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)]
+    )
+    db["member_rank_history"].create_index(
+        [("clan_name", pymongo.ASCENDING), ("battle_id", pymongo.ASCENDING), ("user_id", pymongo.ASCENDING)],
+        unique=True
+    )
+    db["member_activity_state"].create_index(
+        [("clan_name", pymongo.ASCENDING), ("battle_id", pymongo.ASCENDING)],
+        unique=True
+    )
+
+
+def insert_dataset(db, dataset):
+    """Bulk inserts every collection in parallel batches; returns documents per collection."""
+    jobs = [
+        (name, documents[i:i + INSERT_BATCH_SIZE])
+        for name, documents in dataset.items()
+        for i in range(0, len(documents), INSERT_BATCH_SIZE)
+    ]
+    with ThreadPoolExecutor(max_workers=INSERT_THREADS) as pool:
+        list(pool.map(lambda job: db[job[0]].insert_many(job[1], ordered=False), jobs))
+    return {name: len(documents) for name, documents in dataset.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.environ.get("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--clans", type=int, default=250, help="clans on the leaderboard")
+    parser.add_argument("--tracked-clans", type=int, default=5, help="clans with member data")
+    parser.add_argument("--members", type=int, default=75, help="members per tracked clan")
+    parser.add_argument("--cadence", type=int, default=2, help="minutes between fetch cycles")
+    parser.add_argument("--battle-id", default="SyntheticBattle")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drop", action="store_true", help="drop the collections first")
+    parser.add_argument("--dry-run", action="store_true", help="build documents only, no database")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    dataset = build_dataset(args.days, args.clans, args.tracked_clans, args.members, args.cadence, args.battle_id, args.seed)
+    built = time.perf_counter()
+    print(f"Built {sum(len(docs) for docs in dataset.values()):,} documents in {built - started:.1f}s")
+    if args.dry_run:
+        for name, documents in dataset.items():
+            print(f"  {name:24s} {len(documents):>10,}")
+        return
+
+    client = MongoClient(args.mongo_uri)
+    try:
+        db = client[DB_NAME]
+        if args.drop:
+            for name in COLLECTIONS:
+                db.drop_collection(name)
+        counts = insert_dataset(db, dataset)
+        create_indexes(db)
+    finally:
+        client.close()
+    for name, count in counts.items():
+        print(f"  {name:24s} {count:>10,}")
+    print(f"Inserted in {time.perf_counter() - built:.1f}s, total {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
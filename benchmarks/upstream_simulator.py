@@ -0,0 +1,392 @@
+"""
+Local stand-in for the upstream APIs the fetchers and roblox_api call.
+
+Serves, with payloads shaped and sized like the real responses:
+  GET  /api/clans?page=1&pageSize=250   biggamesapi.io clan leaderboard
+  GET  /api/activeClanBattle            ps99.biggamesapi.io current battle
+  GET  /api/clan/{name}                 ps99.biggamesapi.io clan details with battle contributions
+  GET  /image/{id}                      ps99.biggamesapi.io clan icon image
+  POST /v1/users                        users.roblox.com batch user lookup
+Clan and member points grow with wall-clock time, so consecutive fetch cycles see new data.
+Latency, 429s (with Retry-After) and 500s can be injected to see how the fetchers' retries
+stretch a cycle.
+
+With --replay the responses come from a raw archive (RAW_ARCHIVE_DIR, see raw_archive)
+instead: each request gets the newest archived response at a clock that starts at the
+first archived record and runs --speedup times faster. The battle's Start/FinishTime are
+shifted to the present so the fetchers accept the replayed data.
+
+Point the fetchers and API at it through their base URL variables:
+    python -m benchmarks.upstream_simulator --port 8100 [--latency 80] [--jitter 40] \\
+        [--rate-limit 0.02] [--error-rate 0.01]
+    BIGGAMES_API_URL=http://127.0.0.1:8100 PS99_API_URL=http://127.0.0.1:8100 \\
+        ROBLOX_USERS_API_URL=http://127.0.0.1:8100 python member_data_fetcher.py
+"""
+import argparse
+import bisect
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from raw_archive import RawArchiveReader
+
+BATTLE_ID = "SimulatedBattle"
+CLAN_COUNT = 250
+MEMBERS_PER_CLAN = 75
+# Past battles kept in each clan's Battles map; real clans carry their whole history
+PAST_BATTLES = 8
+# Clans the fetchers track by default come first so they are always on the leaderboard
+LEADING_CLANS = ("NONG", "NXNG")
+COUNTRY_CODES = ("US", "GB", "DE", "BR", "PH", "CA", "FR", "NL")
+
+
+class SimulatedUpstream:
+    """Deterministic clan, member and battle state derived from a seed and the elapsed time."""
+
+    def __init__(self, clans=CLAN_COUNT, members=MEMBERS_PER_CLAN, battle_id=BATTLE_ID, seed=42, past_battles=PAST_BATTLES):
+        rng = random.Random(seed)
+        self.battle_id = battle_id
+        self.past_battles = past_battles
+        self.started = time.time()
+        # The battle has been running for a day and ends in two
+        self.start_time = int(self.started) - 86400
+        self.finish_time = int(self.started) + 2 * 86400
+        names = list(LEADING_CLANS) + [f"CLAN{i:03d}" for i in range(len(LEADING_CLANS), clans)]
+        self.clans = {}
+        next_user_id = 1000000000
+        for index, name in enumerate(names[:clans]):
+            member_count = members if name in LEADING_CLANS else rng.randint(40, members)
+            user_ids = list(range(next_user_id, next_user_id + member_count))
+            next_user_id += member_count
+            self.clans[name] = {
+                "index": index,
+                "icon": f"rbxassetid://{14000000000 + index}",
+                "country_code": rng.choice(COUNTRY_CODES),
+                "created": self.start_time - rng.randint(30, 900) * 86400,
+                "owner": user_ids[0],
+                # Points per second; leaders are fastest so the leaderboard order is stable
+                "members": [(user_id, rng.uniform(0.5, 4.0) / (1 + index * 0.02)) for user_id in user_ids]
+            }
+
+    def _elapsed(self):
+        return time.time() - self.start_time
+
+    def member_points(self, clan):
+        elapsed = self._elapsed()
+        return [(user_id, int(rate * elapsed)) for user_id, rate in clan["members"]]
+
+    def clan_points(self, clan):
+        return sum(points for _, points in self.member_points(clan))
+
+    def clans_page(self, page, page_size):
+        ranked = sorted(self.clans.items(), key=lambda item: self.clan_points(item[1]), reverse=True)
+        rows = ranked[(page - 1) * page_size:page * page_size]
+        return {
+            "status": "ok",
+            "data": [
+                {
+                    "Name": name,
+                    "Icon": clan["icon"],
+                    "Members": len(clan["members"]),
+                    "MemberCapacity": 75,
+                    "DepositedDiamonds": 10000000 * (CLAN_COUNT - clan["index"]),
+                    "CountryCode": clan["country_code"],
+                    "Points": self.clan_points(clan),
+                    "Created": clan["created"]
+                }
+                for name, clan in rows
+            ]
+        }
+
+    def active_battle(self):
+        return {
+            "status": "ok",
+            "data": {
+                "configName": self.battle_id,
+                "category": "ClanBattle",
+                "configData": {
+                    "Title": "Simulated Clan Battle",
+                    "StartTime": self.start_time,
+                    "FinishTime": self.finish_time,
+                    "PlacementRewards": [
+                        {"Best": rank, "Worst": rank, "Item": {"_data": {"id": "Huge Pet", "pt": 1}}}
+                        for rank in range(1, 11)
+                    ]
+                }
+            }
+        }
+
+    def clan_details(self, name):
+        clan = self.clans.get(name)
+        if clan is None:
+            return None
+        contributions = [{"UserID": user_id, "Points": points} for user_id, points in self.member_points(clan)]
+        battles = {}
+        # Past battles first: the member fetcher treats the last entry as the current battle
+        for past in range(self.past_battles, 0, -1):
+            battles[f"PastBattle{past}"] = {
+                "BattleID": f"PastBattle{past}",
+                "Points": sum(c["Points"] for c in contributions) // (past + 1),
+                "PointContributions": [{"UserID": c["UserID"], "Points": c["Points"] // (past + 1)} for c in contributions],
+                "ProcessedAwards": True,
+                "AwardUserIDs": [c["UserID"] for c in contributions[:10]]
+            }
+        battles[self.battle_id] = {
+            "BattleID": self.battle_id,
+            "Points": sum(c["Points"] for c in contributions),
+            "PointContributions": contributions,
+            "ProcessedAwards": False
+        }
+        return {
+            "status": "ok",
+            "data": {
+                "Name": name,
+                "Owner": clan["owner"],
+                "Icon": clan["icon"],
+                "Desc": f"{name} clan",
+                "CountryCode": clan["country_code"],
+                "Created": clan["created"],
+                "MemberCapacity": 75,
+                "OfficerCapacity": 4,
+                "GuildLevel": 10,
+                "Members": [
+                    {"UserID": user_id, "PermissionLevel": 10, "JoinTime": clan["created"]}
+                    for user_id, _ in clan["members"]
+                ],
+                "DepositedDiamonds": 10000000 * (CLAN_COUNT - clan["index"]),
+                "DiamondContributions": {"AllTime": {"Sum": 0, "Data": []}},
+                "Status": "",
+                "Battles": battles
+            }
+        }
+
+    @staticmethod
+    def users(user_ids):
+        return {
+            "data": [
+                {"hasVerifiedBadge": False, "id": int(user_id), "name": f"player_{user_id}", "displayName": f"Player {int(user_id) % 100000}"}
+                for user_id in user_ids
+            ]
+        }
+
+
+class ArchivedUpstream:
+    """Replays archived upstream responses (see raw_archive) on an accelerated clock."""
+
+    def __init__(self, archive_dir, speedup=1.0):
+        self.speedup = speedup
+        self._readers = {}
+        self._entries = {}  # (source, key) -> index entries, oldest first
+        for stream in ("clan_fetcher", "member_fetcher"):
+            reader = self._readers[stream] = RawArchiveReader(archive_dir, stream)
+            for entry in reader.entries():
+                self._entries.setdefault((entry[4], entry[5]), []).append((entry[0], stream, entry))
+        if not self._entries:
+            raise SystemExit(f"No archived responses in {archive_dir}")
+        for entries in self._entries.values():
+            entries.sort(key=lambda item: item[0])
+        self._times = {source_key: [item[0] for item in entries] for source_key, entries in self._entries.items()}
+        self.first = min(entries[0][0] for entries in self._entries.values())
+        self.started = time.time()
+        # Archived battle times are moved by this much so they bracket the present
+        self.shift = int(self.started - self.first)
+        self.clans = {}
+
+    def _payload(self, source, key=None):
+        entries = self._entries.get((source, key))
+        if not entries:
+            return None
+        now = self.first + (time.time() - self.started) * self.speedup
+        position = max(bisect.bisect_right(self._times[(source, key)], now) - 1, 0)
+        _, stream, entry = entries[position]
+        return self._readers[stream].read(entry)["payload"]
+
+    def clans_page(self, page, page_size):
+        # Archived leaderboards are whole cycles (every page merged); serve the requested slice
+        payload = self._payload("clans")
+        if not payload or not isinstance(payload.get("data"), list):
+            return payload
+        return dict(payload, data=payload["data"][(page - 1) * page_size:page * page_size])
+
+    def active_battle(self):
+        payload = self._payload("activeClanBattle")
+        config = ((payload or {}).get("data") or {}).get("configData") or {}
+        for field in ("StartTime", "FinishTime"):
+            if field in config:
+                config[field] += self.shift
+        return payload
+
+    def clan_details(self, name):
+        return self._payload("clan", name)
+
+    users = staticmethod(SimulatedUpstream.users)
+
+
+class FaultProfile:
+    """Latency and failure injection applied to every request."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, rate_limit=0.0, error_rate=0.0, retry_after=1, seed=42):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """Returns (delay seconds, status to fail with or None)."""
+        with self._lock:
+            delay = max(self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms), 0) / 1000
+            roll = self._random.random()
+        if roll < self.rate_limit:
+            return delay, 429
+        if roll < self.rate_limit + self.error_rate:
+            return delay, 500
+        return delay, None
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    upstream = None
+    faults = None
+    counts = None
+    counts_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload=None, headers=None):
+        body = json.dumps(payload, separators=(",", ":")).encode() if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject(self, route):
+        delay, status = self.faults.draw()
+        with self.counts_lock:
+            self.counts[route] = self.counts.get(route, 0) + 1
+            if status:
+                self.counts[status] = self.counts.get(status, 0) + 1
+        if delay:
+            time.sleep(delay)
+        if status == 429:
+            self._send(429, {"status": "error", "error": {"message": "Too many requests"}}, {"Retry-After": str(self.faults.retry_after)})
+            return True
+        if status == 500:
+            self._send(500, {"status": "error", "error": {"message": "Internal server error"}})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/api/clans":
+            if self._inject("clans"):
+                return
+            query = parse_qs(url.query)
+            page = int(query.get("page", ["1"])[0])
+            page_size = min(int(query.get("pageSize", ["250"])[0]), CLAN_COUNT)
+            self._send(200, self.upstream.clans_page(page, page_size))
+        elif url.path == "/api/activeClanBattle":
+            if self._inject("activeClanBattle"):
+                return
+            self._send(200, self.upstream.active_battle())
+        elif url.path.startswith("/image/"):
+            if self._inject("image"):
+                return
+            image_id = url.path[len("/image/"):]
+            if not image_id.isdigit():
+                self._send(404, {"status": "error"})
+                return
+            # A fixed-size stand-in for a ~20 KB icon, distinct per image ID
+            body = (b"\x89PNG\r\n\x1a\n" + image_id.encode()) * (20000 // (8 + len(image_id)))
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path.startswith("/api/clan/"):
+            if self._inject("clan"):
+                return
+            details = self.upstream.clan_details(unquote(url.path[len("/api/clan/"):]))
+            if details is None:
+                self._send(404, {"status": "error", "error": {"message": "Clan not found"}})
+            else:
+                self._send(200, details)
+        else:
+            self._send(404, {"status": "error"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if url.path.rstrip("/") == "/v1/users":
+            if self._inject("users"):
+                return
+            self._send(200, self.upstream.users(body.get("userIds", [])[:100]))
+        else:
+            self._send(404, {"errors": [{"message": "NotFound"}]})
+
+
+def start_simulator(host="127.0.0.1", port=0, upstream=None, faults=None):
+    """
+    Starts the simulator on a background thread. Returns (server, base URL); the request
+    counts per route and injected status are in server.counts. Stop with server.shutdown().
+    """
+    handler = type("BoundSimulatorHandler", (SimulatorHandler,), {
+        "upstream": upstream or SimulatedUpstream(),
+        "faults": faults or FaultProfile(),
+        "counts": {}
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.counts = handler.counts
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--clans", type=int, default=CLAN_COUNT)
+    parser.add_argument("--members", type=int, default=MEMBERS_PER_CLAN, help="members in the leading clans")
+    parser.add_argument("--battle-id", default=BATTLE_ID)
+    parser.add_argument("--past-battles", type=int, default=PAST_BATTLES, help="past battles in each clan's details")
+    parser.add_argument("--latency", type=float, default=0, help="mean added latency, ms")
+    parser.add_argument("--jitter", type=float, default=0, help="uniform +/- jitter on the latency, ms")
+    parser.add_argument("--rate-limit", type=float, default=0, help="fraction of requests answered 429")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests answered 500")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on 429s")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--replay", metavar="ARCHIVE_DIR", help="serve responses from a raw archive")
+    parser.add_argument("--speedup", type=float, default=1, help="replay clock speed")
+    args = parser.parse_args()
+
+    if args.replay:
+        upstream = ArchivedUpstream(args.replay, args.speedup)
+    else:
+        upstream = SimulatedUpstream(args.clans, args.members, args.battle_id, args.seed, args.past_battles)
+    faults = FaultProfile(args.latency, args.jitter, args.rate_limit, args.error_rate, args.retry_after, args.seed)
+    server, base_url = start_simulator(args.host, args.port, upstream, faults)
+    if args.replay:
+        print(f"Upstream simulator on {base_url} replaying {args.replay} at {args.speedup}x")
+    else:
+        print(f"Upstream simulator on {base_url} (battle {args.battle_id}, {len(upstream.clans)} clans)")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"Requests: {dict(server.counts)}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
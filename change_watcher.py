@@ -0,0 +1,219 @@
+"""
+Tells the API process when the fetchers write new data.
+
+ChangeWatcher follows a MongoDB change stream on the watched collections and calls the
+collection's handler with the changed document's key fields (battle_id, clan_name,
+timestamp, ...) as soon as a write lands. Handlers invalidate or refresh in-process and
+shared caches. On a deployment without a replica set, change streams are unavailable
+and the watcher polls each collection every CHANGE_POLL_INTERVAL seconds instead.
+
+CHANGE_WATCHER_MODE: "auto" (change streams, falling back to polling), "poll" or "off".
+To try change streams locally, run a single-node replica set:
+    mongod --replSet rs0 --dbpath /tmp/rs0 && mongosh --eval "rs.initiate()"
+    MONGO_URI="mongodb://localhost:27017/?replicaSet=rs0" python combined_api_server.py
+"""
+import logging
+import os
+import threading
+
+import pymongo
+import pymongo.errors
+
+logger = logging.getLogger(__name__)
+
+CHANGE_WATCHER_MODE = os.environ.get("CHANGE_WATCHER_MODE", "auto")
+CHANGE_POLL_INTERVAL = float(os.environ.get("CHANGE_POLL_INTERVAL", "5"))
+# Wait before reopening a change stream after a transient error
+RESUME_BACKOFF_SECONDS = 5
+
+# Fields handed to handlers; everything else is projected away in the change stream
+KEY_FIELDS = ("battle_id", "clan_name", "timestamp", "is_current")
+
+# How each collection is polled without change streams:
+#   ("since", field)  documents whose field grew since the last poll (on an index, see
+#                     ensure_indexes)
+#   ("fingerprint",)  the whole (small) collection's key fields, compared between polls
+POLL_STRATEGIES = {
+    "leaderboard_snapshots": ("since", "timestamp"),
+    "clan_members": ("since", "timestamp"),
+    "clan_details": ("since", "last_checked"),
+    "battle_id_history": ("fingerprint",)
+}
+POLL_BATCH_LIMIT = 1000
+
+# Server error codes meaning change streams are not supported here
+CHANGE_STREAM_UNSUPPORTED = {40573, 40324, 136}
+# Other server errors (e.g. Unauthorized without the changeStream privilege) opening the
+# stream this many times in a row also switch the watcher to polling
+STREAM_FAILURES_BEFORE_POLL = 3
+
+
+def ensure_indexes(db):
+    """Creates the indexes the polling fallback filters and sorts on, one per "since" field."""
+    for collection, strategy in POLL_STRATEGIES.items():
+        if strategy[0] == "since":
+            db[collection].create_index([(strategy[1], pymongo.DESCENDING)])
+
+
+class ChangeWatcher:
+    """
+    Background thread dispatching writes on the watched collections to
+    handlers[collection](document). `document` holds the KEY_FIELDS present on the changed
+    document; it is empty for deletes, where handlers should invalidate broadly.
+
+    `live` is True only while writes are being observed (a change stream is open, or the
+    last poll succeeded); on_live(live) is called whenever that changes, so callers can
+    keep caches that rely on the handlers only while it holds.
+    """
+
+    def __init__(self, get_client, db_name, handlers, mode=CHANGE_WATCHER_MODE, poll_interval=CHANGE_POLL_INTERVAL, on_live=None):
+        self._get_client = get_client
+        self.db_name = db_name
+        self.handlers = handlers
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self._resume_token = None
+        self._poll_state = {}
+        self._stopping = threading.Event()
+        self._thread = None
+        self._on_live = on_live
+        self._stream_failures = 0
+        self._indexed = False
+        self.live = False
+        self.events = 0
+
+    def start(self):
+        if self.mode == "off":
+            logger.info("Change watcher disabled")
+            return
+        self._thread = threading.Thread(target=self._run, name="change-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._set_live(False)
+
+    def _set_live(self, live):
+        if live == self.live:
+            return
+        self.live = live
+        if self._on_live is not None:
+            try:
+                self._on_live(live)
+            except Exception as e:
+                logger.error(f"Change watcher on_live callback failed: {e}")
+
+    def _dispatch(self, collection, document):
+        handler = self.handlers.get(collection)
+        if handler is None:
+            return
+        self.events += 1
+        try:
+            handler({field: document[field] for field in KEY_FIELDS if field in document})
+        except Exception as e:
+            logger.error(f"Change handler for {collection} failed: {e}")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                if self.mode == "poll":
+                    self._poll_forever()
+                else:
+                    self._stream_forever()
+            except pymongo.errors.OperationFailure as e:
+                # Writes may go unseen from here until the watcher is live again
+                self._set_live(False)
+                if self.mode != "poll":
+                    self._stream_failures += 1
+                    if (e.code in CHANGE_STREAM_UNSUPPORTED or "replica set" in str(e)
+                            or self._stream_failures >= STREAM_FAILURES_BEFORE_POLL):
+                        logger.info(f"Change streams unavailable ({e}); polling every {self.poll_interval}s instead")
+                        self.mode = "poll"
+                        continue
+                logger.error(f"Change watcher error: {e}")
+            except pymongo.errors.PyMongoError as e:
+                self._set_live(False)
+                logger.warning(f"Change watcher lost its connection: {e}")
+            except Exception as e:
+                self._set_live(False)
+                logger.error(f"Unexpected change watcher error: {e}")
+            self._stopping.wait(RESUME_BACKOFF_SECONDS)
+
+    def _stream_forever(self):
+        db = self._get_client()[self.db_name]
+        pipeline = [
+            {"$match": {
+                "ns.coll": {"$in": list(self.handlers)},
+                "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+            }},
+            {"$project": {"ns.coll": 1, "operationType": 1, **{f"fullDocument.{field}": 1 for field in KEY_FIELDS}}}
+        ]
+        # updateLookup: clan_details and battle_id_history change through $set updates
+        with db.watch(pipeline, full_document="updateLookup", resume_after=self._resume_token, max_await_time_ms=1000) as stream:
+            self.mode = "change_stream"
+            self._stream_failures = 0
+            self._set_live(True)
+            logger.info(f"Watching {', '.join(self.handlers)} through a change stream")
+            while not self._stopping.is_set():
+                change = stream.try_next()
+                if change is None:
+                    continue
+                self._resume_token = stream.resume_token
+                self._dispatch(change["ns"]["coll"], change.get("fullDocument") or {})
+
+    def _poll_forever(self):
+        db = self._get_client()[self.db_name]
+        if not self._indexed:
+            try:
+                ensure_indexes(db)
+                self._indexed = True
+            except pymongo.errors.OperationFailure as e:
+                # Polling still works without them, one collection scan per poll
+                logger.error(f"Could not create the change watcher's polling indexes: {e}")
+        # The first pass only records where each collection is, without dispatching
+        for collection in self.handlers:
+            self._poll(db, collection, dispatch=False)
+        self._set_live(True)
+        while not self._stopping.wait(self.poll_interval):
+            for collection in self.handlers:
+                self._poll(db, collection)
+
+    def _poll(self, db, collection, dispatch=True):
+        strategy = POLL_STRATEGIES.get(collection)
+        if strategy is None:
+            return
+        projection = {"_id": 0, **{field: 1 for field in KEY_FIELDS}}
+
+        if strategy[0] == "fingerprint":
+            documents = list(db[collection].find({}, projection).sort("_id", pymongo.ASCENDING))
+            previous = self._poll_state.get(collection)
+            self._poll_state[collection] = documents
+            if dispatch and documents != previous:
+                self._dispatch(collection, {})
+            return
+
+        field = strategy[1]
+        last_seen = self._poll_state.get(collection)
+        if last_seen is None and not dispatch:
+            newest = db[collection].find_one({}, {"_id": 0, field: 1}, sort=[(field, pymongo.DESCENDING)])
+            self._poll_state[collection] = newest.get(field) if newest else None
+            return
+        # A collection that was empty so far: everything in it is new
+        query = {field: {"$gt": last_seen}} if last_seen is not None else {field: {"$exists": True}}
+        documents = list(
+            db[collection].find(query, {**projection, field: 1})
+            .sort(field, pymongo.ASCENDING)
+            .limit(POLL_BATCH_LIMIT)
+        )
+        if documents:
+            self._poll_state[collection] = documents[-1][field]
+        if not dispatch:
+            return
+        # One dispatch per distinct key with its newest document, not per document
+        newest = {}
+        for document in documents:
+            newest[tuple(document.get(f) for f in KEY_FIELDS if f != "timestamp")] = document
+        for document in newest.values():
+            self._dispatch(collection, document)
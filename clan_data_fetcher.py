@@ -5,11 +5,24 @@ import datetime
 import time
 import os
 import logging
+import tempfile
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from logging.handlers import RotatingFileHandler
 from dotenv import load_dotenv
 from pymongo import MongoClient
 from pymongo.collection import Collection
 import traceback # Ensure traceback is imported
+import static_publisher
+import raw_archive
+import battle_trajectories
+import clan_history
+import leaderboard_events
+import tracing
+from clan_icons import icon_image_id
+from pymongo.operations import UpdateOne
+from write_pipeline import WritePipeline
 import urllib3
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
@@ -74,6 +87,9 @@ logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file for local execution
 load_dotenv()
+import mongo_monitoring
+# Latency stats and slow-query logging for every MongoClient this process creates
+mongo_monitoring.install()
 
 # --- MongoDB Atlas Connection ---
 MONGO_CONNECTION_STRING = os.environ.get("MONGO_URI")
@@ -83,8 +99,26 @@ if not MONGO_CONNECTION_STRING:
 DB_NAME = "clan_dashboard_db"
 
 # --- API URLs ---
-CLANS_API_URL = "https://biggamesapi.io/api/clans?page=1&pageSize=250&sort=Points&sortOrder=desc"
-WAR_END_API_URL = "https://ps99.biggamesapi.io/api/activeClanBattle"
+# Base URLs are configurable so the fetchers can run against benchmarks.upstream_simulator
+BIGGAMES_API_URL = os.environ.get("BIGGAMES_API_URL", "https://biggamesapi.io")
+PS99_API_URL = os.environ.get("PS99_API_URL", "https://ps99.biggamesapi.io")
+CLANS_API_URL = f"{BIGGAMES_API_URL}/api/clans?page={{page}}&pageSize={{page_size}}&sort=Points&sortOrder=desc"
+# Leaderboard depth collected each cycle, fetched as concurrent pages of CLANS_PAGE_SIZE
+# (the API's largest page) under a shared budget of CLANS_REQUESTS_PER_SECOND page requests
+CLAN_FETCH_DEPTH = int(os.environ.get("CLAN_FETCH_DEPTH", "250"))
+CLANS_PAGE_SIZE = 250
+CLANS_FETCH_CONCURRENCY = int(os.environ.get("CLANS_FETCH_CONCURRENCY", "4"))
+CLANS_REQUESTS_PER_SECOND = float(os.environ.get("CLANS_REQUESTS_PER_SECOND", "4"))
+WAR_END_API_URL = f"{PS99_API_URL}/api/activeClanBattle"
+# Raw responses are archived under this stream when RAW_ARCHIVE_DIR is set (see raw_archive)
+ARCHIVE_STREAM = "clan_fetcher"
+# Cycles not yet written while MongoDB is unreachable are kept here (see write_pipeline)
+WRITE_JOURNAL_PATH = os.environ.get("CLAN_WRITE_JOURNAL_PATH") or os.path.join(tempfile.gettempdir(), "clan_write_journal.bson")
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Battle of the last collected cycle, so collection continues through a MongoDB outage
+last_collected_battle_id = None
 
 # --- Helper Function to Get War Finish Time ---
 def get_war_finish_time():
@@ -93,6 +127,7 @@ def get_war_finish_time():
         response = session.get(WAR_END_API_URL, timeout=30)
         response.raise_for_status()
         raw_data = response.json()
+        raw_archive.record(ARCHIVE_STREAM, "activeClanBattle", raw_data)
         if ("data" in raw_data and isinstance(raw_data.get("data"), dict) and
             "configData" in raw_data["data"] and isinstance(raw_data["data"].get("configData"), dict) and
             "FinishTime" in raw_data["data"]["configData"]):
@@ -120,26 +155,91 @@ def get_war_finish_time():
         return None
 
 # --- API Fetching ---
-def fetch_clan_data():
-    """Fetches the top 250 clan data from the Big Games API."""
-    logger.info(f"Attempting to fetch data from: {CLANS_API_URL}")
+class RequestBudget:
+    """Spaces request starts at least 1/per_second apart, across threads."""
+
+    def __init__(self, per_second):
+        self.interval = 1 / per_second if per_second > 0 else 0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+clans_request_budget = RequestBudget(CLANS_REQUESTS_PER_SECOND)
+
+def fetch_clans_page(page, page_size):
+    """One page of the clan leaderboard as a list of clans, or None if it could not be fetched."""
+    url = CLANS_API_URL.format(page=page, page_size=page_size)
     try:
-        response = session.get(CLANS_API_URL, timeout=15)
-        response.raise_for_status()
-        api_response = response.json()
-        if isinstance(api_response, dict) and api_response.get("status") == "ok" and "data" in api_response:
-            clan_list = api_response["data"]
-            logger.info(f"Successfully parsed JSON. Found {len(clan_list)} clans.")
-            return clan_list
-        else:
-            logger.error(f"API response status not 'ok' or 'data' key missing: {api_response}")
-            return None
+        clans_request_budget.wait()
+        with tracing.span("fetch_clans_page", kind=tracing.SPAN_KIND_CLIENT, page=page, **{"url.full": url}) as page_span:
+            response = session.get(url, timeout=15)
+            page_span.set_attribute("http.response.status_code", response.status_code)
+            response.raise_for_status()
+            api_response = response.json()
+        if isinstance(api_response, dict) and api_response.get("status") == "ok" and isinstance(api_response.get("data"), list):
+            return api_response["data"]
+        logger.error(f"API response for page {page} status not 'ok' or 'data' key missing: {api_response}")
+        return None
     except requests.exceptions.RequestException as e:
-        logger.error(f"An error occurred fetching data from the API: {e}")
+        logger.error(f"An error occurred fetching clans page {page} from the API: {e}")
         return None
     except Exception as e:
-        logger.error(f"An unexpected error occurred during API fetch/parse: {e}")
+        logger.error(f"An unexpected error occurred during API fetch/parse of clans page {page}: {e}")
+        return None
+
+def merge_clan_pages(pages, page_size, depth):
+    """
+    One leaderboard from pages fetched a moment apart. A clan that moved across a page
+    boundary in between shows up on both pages (the newer, higher Points entry is kept)
+    or on neither; pages after a failed or short page are dropped, so the result is
+    always a gap-free top of the leaderboard.
+    """
+    merged = {}
+    for page, clans in enumerate(pages, 1):
+        if clans is None:
+            logger.warning(f"Clans page {page} failed; keeping the {len(merged)} clans ranked above it")
+            break
+        for clan in clans:
+            name = clan.get("Name")
+            if name is None:
+                continue
+            kept = merged.get(name)
+            if kept is None or (clan.get("Points") or 0) > (kept.get("Points") or 0):
+                merged[name] = clan
+        if len(clans) < page_size:
+            break  # End of the leaderboard
+    return sorted(merged.values(), key=lambda clan: clan.get("Points") or 0, reverse=True)[:depth]
+
+def fetch_clan_data(depth=CLAN_FETCH_DEPTH):
+    """Fetches the top `depth` clans from the Big Games API, or None if the first page fails."""
+    page_size = min(CLANS_PAGE_SIZE, depth)
+    page_count = -(-depth // page_size)
+    logger.info(f"Attempting to fetch the top {depth} clans ({page_count} pages) from: {BIGGAMES_API_URL}")
+    with tracing.span("fetch_clan_data", depth=depth, pages=page_count):
+        if page_count == 1:
+            pages = [fetch_clans_page(1, page_size)]
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, min(CLANS_FETCH_CONCURRENCY, page_count))) as pool:
+                # Each page's span joins the cycle's trace through a copy of this context
+                futures = [
+                    pool.submit(contextvars.copy_context().run, fetch_clans_page, page, page_size)
+                    for page in range(1, page_count + 1)
+                ]
+                pages = [future.result() for future in futures]
+    if pages[0] is None:
         return None
+    clan_list = merge_clan_pages(pages, page_size, depth)
+    # Archived merged, so each archived leaderboard is one cycle's tick (see rebuild_battle)
+    raw_archive.record(ARCHIVE_STREAM, "clans", {"status": "ok", "data": clan_list})
+    logger.info(f"Successfully parsed JSON. Found {len(clan_list)} clans.")
+    return clan_list
 
 def get_current_battle_info(client):
     """Get the current active battle from battle_id_history."""
@@ -186,7 +286,7 @@ def get_nong_current_points(clan_list):
         if nong_data:
             print(f"Current NONG points from API: {nong_data.get('Points')}")
             return nong_data.get("Points")
-        print("NONG not found in top 250 clans")
+        print(f"NONG not found in top {len(clan_list)} clans")
         return None
     except Exception as e:
         print(f"Error getting NONG's current points: {e}", file=sys.stderr)
@@ -198,6 +298,7 @@ def get_war_timing():
         response = session.get(WAR_END_API_URL, timeout=30)  # Use session with increased timeout
         response.raise_for_status()
         raw_data = response.json()
+        raw_archive.record(ARCHIVE_STREAM, "activeClanBattle", raw_data)
         
         if ("data" in raw_data and 
             isinstance(raw_data.get("data"), dict) and
@@ -290,76 +391,35 @@ def should_collect_clan_data(client, clan_list):
         return False, None
 
 # --- MongoDB Insertion Logic ---
-def insert_clan_data(clan_list, client, battle_id):
-    """Inserts/Updates clan data into MongoDB Atlas."""
-    if not clan_list:
-        print("No clan data provided to insert.")
-        return 0
-        
-    db = client[DB_NAME]
-    clans_collection = db["clans"]
-    details_collection = db["clan_details"]
-    inserted_count = 0
-    details_processed_count = 0
-    processed_count = 0
-    current_timestamp_utc = datetime.datetime.now(datetime.timezone.utc)
-
-    for clan in clan_list:
-        processed_count += 1
-        clan_name = clan.get("Name")
-        clan_points = clan.get("Points")
-        members_count = clan.get("Members")
-        icon = clan.get("Icon")
-        country_code = clan.get("CountryCode")
-        capacity = clan.get("MemberCapacity")
-        created_api = clan.get("Created")
-        
-        if clan_name is None or clan_points is None:
-            continue
-
-        # Insert into 'clans' collection with battle_id
-        try:
-            clan_doc = {
-                "clan_name": clan_name,
-                "current_points": clan_points,
-                "members": members_count,
-                "timestamp": current_timestamp_utc,
-                "battle_id": battle_id  # Add battle_id
-            }
-            
-            insert_result = clans_collection.insert_one(clan_doc)
-            if insert_result.acknowledged:
-                inserted_count += 1
-                
-        except Exception as e_insert:
-            print(f"EXCEPTION during insert into clans for {clan_name}: {e_insert}", file=sys.stderr)
-            continue
-
-        # Update 'clan_details' collection (unchanged)
-        try:
-            details_doc = {
-                "icon": icon,
-                "country_code": country_code,
-                "member_capacity": capacity,
-                "created_timestamp_api": created_api,
-                "last_checked": current_timestamp_utc
-            }
-            update_result = details_collection.update_one(
-                {"clan_name": clan_name},
-                {"$set": details_doc},
-                upsert=True
-            )
-            details_processed_count += 1
-        except Exception as e_update:
-            print(f"Error processing/updating details for clan '{clan_name}': {e_update}", file=sys.stderr)
+def clan_document(clan, battle_id, timestamp):
+    """The clans document for one leaderboard entry, or None if it lacks a name or points."""
+    if clan.get("Name") is None or clan.get("Points") is None:
+        return None
+    return {
+        "clan_name": clan.get("Name"),
+        "current_points": clan.get("Points"),
+        "members": clan.get("Members"),
+        "timestamp": timestamp,
+        "battle_id": battle_id
+    }
 
-    print(f"Processed {processed_count} clans. Successful inserts into 'clans': {inserted_count}. Attempted upserts into 'clan_details': {details_processed_count}.")
-    return inserted_count
+def clan_details_document(clan, timestamp):
+    """The clan_details fields refreshed from one leaderboard entry."""
+    return {
+        "icon": clan.get("Icon"),
+        "country_code": clan.get("CountryCode"),
+        "member_capacity": clan.get("MemberCapacity"),
+        "created_timestamp_api": clan.get("Created"),
+        "last_checked": timestamp
+    }
 
-def create_leaderboard_snapshot(client, battle_id):
+def create_leaderboard_snapshot(client, battle_id, latest_ts=None, war_end_time=None, trace_id=None):
     """
     Creates a snapshot of the top 25 clans for the current battle and saves it to leaderboard_snapshots,
-    including pre-calculated gains for each period.
+    including pre-calculated gains for each period. Returns the saved snapshot document, or None.
+    `latest_ts` (default: the newest clans timestamp) and `war_end_time` (default: fetched
+    from the API) let rebuild_battle.py snapshot past fetch cycles. `trace_id` is the ingest
+    trace of the fetch cycle that produced the data (see tracing).
     """
     db = client[DB_NAME]
     clans_collection = db["clans"]
@@ -367,15 +427,16 @@ def create_leaderboard_snapshot(client, battle_id):
 
     # Gain periods in minutes
     gain_periods = [30, 60, 180, 360, 720, 1080, 1440]
-    now_doc = clans_collection.find_one(
-        {"battle_id": battle_id},
-        sort=[("timestamp", pymongo.DESCENDING)]
-    )
-    if not now_doc or "timestamp" not in now_doc:
-        print("No latest document found for snapshot.")
-        return
+    if latest_ts is None:
+        now_doc = clans_collection.find_one(
+            {"battle_id": battle_id},
+            sort=[("timestamp", pymongo.DESCENDING)]
+        )
+        if not now_doc or "timestamp" not in now_doc:
+            print("No latest document found for snapshot.")
+            return
 
-    latest_ts = now_doc["timestamp"]
+        latest_ts = now_doc["timestamp"]
 
     # Get the top 25 clans at this timestamp
     top_clans_cursor = clans_collection.find(
@@ -383,43 +444,39 @@ def create_leaderboard_snapshot(client, battle_id):
     ).sort("current_points", pymongo.DESCENDING).limit(25)
 
     top_clans = []
-    rank = 1
-    for doc in top_clans_cursor:
-        clan_name = doc.get("clan_name")
-        current_points = doc.get("current_points")
-        members = doc.get("members")
-        gains = {}
-
-        # For each period, find the points X minutes ago and calculate gain
-        for period in gain_periods:
-            past_time = latest_ts - datetime.timedelta(minutes=period)
-            past_doc = clans_collection.find_one(
-                {
-                    "battle_id": battle_id,
-                    "clan_name": clan_name,
-                    "timestamp": {"$lte": past_time}
-                },
-                sort=[("timestamp", pymongo.DESCENDING)]
-            )
-            if past_doc and "current_points" in past_doc:
-                gain = current_points - past_doc["current_points"]
-            else:
-                gain = None  # Not enough history
-            gains[f"gain_{period}m"] = gain
-
-        # Add any fields you want to keep in the snapshot
-        clan_snapshot = {
-            "clan_name": clan_name,
-            "current_points": current_points,
+    for rank, doc in enumerate(top_clans_cursor, 1):
+        top_clans.append({
+            "clan_name": doc.get("clan_name"),
+            "current_points": doc.get("current_points"),
             "current_rank": rank,
-            "members": members,
-        }
-        clan_snapshot.update(gains)
-        top_clans.append(clan_snapshot)
-        rank += 1
+            "members": doc.get("members"),
+        })
+
+    # For each period, the points X minutes ago of all top clans at once and the gain since
+    clan_names = [clan["clan_name"] for clan in top_clans]
+    for period in gain_periods:
+        past_points = clan_history.points_at_or_before(
+            clans_collection, battle_id, clan_names, latest_ts - datetime.timedelta(minutes=period)
+        )
+        for clan in top_clans:
+            past = past_points.get(clan["clan_name"])
+            # None: not enough history
+            clan[f"gain_{period}m"] = clan["current_points"] - past if past is not None else None
+
+    # Resolve icons once here rather than in the API and every browser on each request
+    icons = {
+        doc["clan_name"]: doc.get("icon")
+        for doc in db["clan_details"].find(
+            {"clan_name": {"$in": [clan["clan_name"] for clan in top_clans]}},
+            {"clan_name": 1, "icon": 1, "_id": 0}
+        )
+    }
+    for clan in top_clans:
+        clan["icon"] = icons.get(clan["clan_name"])
+        clan["icon_id"] = icon_image_id(clan["icon"])
 
      # Get war end time
-    war_end_time = get_war_finish_time()
+    war_end_time = war_end_time or get_war_finish_time()
     if not war_end_time:
         print("Could not get war end time for forecast calculation.")
         return
@@ -454,14 +511,143 @@ def create_leaderboard_snapshot(client, battle_id):
         "timestamp": latest_ts,
         "top_clans": top_clans
     }
+    if trace_id:
+        snapshot_doc["trace_id"] = trace_id
     snapshots_collection.replace_one(
         {"battle_id": battle_id, "timestamp": latest_ts},
         snapshot_doc,
         upsert=True
     )
     print(f"Leaderboard snapshot saved for battle {battle_id} at {latest_ts}")
+    return snapshot_doc
+
+def build_cycle_record(clan_list, battle_id, finish_time_dt):
+    """
+    Everything one fetch cycle writes, as a plain document the write pipeline can journal.
+    Every clan of the cycle, whichever page it came from, gets the same tick timestamp.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    # MongoDB keeps milliseconds; the snapshot looks its clans up by this exact timestamp
+    timestamp = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    # The write stage runs on the pipeline thread; the record carries the cycle's trace there
+    cycle_span = tracing.current_span()
+    return {
+        "trace_id": cycle_span.trace_id if cycle_span else None,
+        "span_id": cycle_span.span_id if cycle_span else None,
+        "battle_id": battle_id,
+        "timestamp": timestamp,
+        "finish_time": finish_time_dt,
+        "clans": [doc for doc in (clan_document(clan, battle_id, timestamp) for clan in clan_list) if doc],
+        "details": [
+            {"clan_name": clan["Name"], **clan_details_document(clan, timestamp)}
+            for clan in clan_list if clan.get("Name") is not None
+        ]
+    }
+
+def write_clan_cycles(client, records):
+    """
+    Writes a batch of cycle records: one bulk insert into clans, one bulk upsert of
+    clan_details, then each cycle's leaderboard snapshot in order and the static export of
+    the newest. clans documents that already exist (a journaled batch that was partly
+    written before an outage) are not inserted twice: the unique (battle_id, timestamp,
+    clan_name) index rejects them and those duplicate-key errors are ignored.
+    """
+    db = client[DB_NAME]
+    last = records[-1]
+    # The batch is traced under its newest cycle, linked to the others; each snapshot is
+    # traced under its own cycle
+    with tracing.span("write_clan_cycles", last.get("trace_id"), last.get("span_id"), records=len(records)) as write_span:
+        for record in records[:-1]:
+            write_span.add_link(record.get("trace_id"), record.get("span_id"))
+        clan_docs = []
+        details = {}
+        for record in records:
+            # Copies: insert_many adds _id to the documents it is given
+            clan_docs.extend(dict(doc) for doc in record["clans"])
+            for details_doc in record["details"]:
+                details[details_doc["clan_name"]] = details_doc
+        if clan_docs:
+            with tracing.span("clans.insert_many", documents=len(clan_docs)):
+                try:
+                    db["clans"].insert_many(clan_docs, ordered=False)
+                except pymongo.errors.BulkWriteError as e:
+                    errors = e.details.get("writeErrors", [])
+                    if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors) or e.details.get("writeConcernErrors"):
+                        raise
+                    logger.info(f"Skipped {len(errors)} clans documents that were already written")
+        if details:
+            with tracing.span("clan_details.bulk_write", documents=len(details)):
+                db["clan_details"].bulk_write([
+                    UpdateOne({"clan_name": clan_name}, {"$set": {k: v for k, v in doc.items() if k != "clan_name"}}, upsert=True)
+                    for clan_name, doc in details.items()
+                ], ordered=False)
+        logger.info(f"Wrote {len(clan_docs)} clans documents and {len(details)} clan_details for {len(records)} cycles")
+
+    snapshot_doc = None
+    for record in records:
+        previous_doc = snapshot_doc if snapshot_doc and snapshot_doc["battle_id"] == record["battle_id"] else None
+        with tracing.span("create_leaderboard_snapshot", record.get("trace_id"), record.get("span_id"), battle_id=record["battle_id"]):
+            snapshot_doc = create_leaderboard_snapshot(
+                client, record["battle_id"], record["timestamp"], record["finish_time"], record.get("trace_id")
+            )
+            # Rank-change and overtake events against the previous snapshot
+            with tracing.span("record_snapshot_events"):
+                leaderboard_events.record_snapshot_events(client, snapshot_doc, previous_doc, record["finish_time"])
+    with tracing.span("publish", last.get("trace_id"), last.get("span_id")):
+        # Publish pre-rendered JSON for static/CDN hosting (no-op unless STATIC_EXPORT_DIR is set)
+        static_publisher.publish_cycle(client, last["battle_id"], snapshot_doc, last["finish_time"])
+        # Extend the cross-battle trajectory index once a new grid point has passed
+        try:
+            battle_trajectories.update_battle_trajectories(client, last["battle_id"])
+        except Exception as e:
+            logger.error(f"Error updating battle trajectories for {last['battle_id']}: {e}")
 
 # --- Main Execution ---
+def run_fetch_cycle(mongo_client, pipeline=None):
+    """
+    One fetch cycle: fetches the leaderboard and hands it to the write pipeline (or writes
+    it directly without one). Returns False once the war has ended and collection should stop.
+    """
+    global last_collected_battle_id
+    # Root span of the cycle's ingest trace; the snapshot it produces keeps the trace ID
+    with tracing.span("clan_fetcher.cycle") as cycle_span:
+        current_time_naive = datetime.datetime.now()
+        logger.info(f"Starting new fetch cycle at {current_time_naive}")
+        # Check if war has ended
+        with tracing.span("get_war_finish_time", kind=tracing.SPAN_KIND_CLIENT):
+            finish_time_dt = get_war_finish_time()
+        if finish_time_dt:
+            logger.info(f"Fetched War Finish Time: {finish_time_dt}")
+            if current_time_naive >= finish_time_dt:
+                logger.info("War has ended. Stopping data collection.")
+                return False
+        else:
+            logger.warning("Could not verify war end time. Continuing fetch cycle.")
+        # Fetch and Insert Clan Data
+        clans = fetch_clan_data()
+        if clans:
+            # Check if we should collect data
+            should_collect, battle_id = should_collect_clan_data(mongo_client, clans)
+            if should_collect and battle_id:
+                last_collected_battle_id = battle_id
+            elif pipeline and last_collected_battle_id and not pipeline.check_mongo():
+                # The collection checks need MongoDB; keep the battle in progress and let the
+                # pipeline journal the cycle until it is reachable again
+                logger.warning(f"MongoDB unreachable, collecting for {last_collected_battle_id} into the write journal")
+                should_collect, battle_id = True, last_collected_battle_id
+            if should_collect and battle_id:
+                cycle_span.set_attribute("battle_id", battle_id)
+                record = build_cycle_record(clans, battle_id, finish_time_dt)
+                if pipeline:
+                    pipeline.submit(record)
+                else:
+                    write_clan_cycles(mongo_client, [record])
+            else:
+                logger.info("Skipping data collection this cycle")
+        else:
+            logger.warning("Failed to retrieve clan data from the API this cycle.")
+        return True
+
 def main(mongo_client=None, is_running=None):
     """Main execution function for the clan data fetcher."""
     logger.info("Starting clan data fetcher...")
@@ -474,32 +660,41 @@ def main(mongo_client=None, is_running=None):
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
             return
+    try:
+        clan_history.ensure_indexes(mongo_client)
+    except Exception as e:
+        # write_clan_cycles relies on the unique (battle_id, timestamp, clan_name) index to
+        # make journal replays idempotent; without it a replay duplicates clans documents
+        logger.critical(
+            f"Could not create the clans indexes, so replayed cycles may write duplicate clans "
+            f"documents until existing duplicates are removed and the fetcher restarted: {e}"
+        )
+    try:
+        # The previous snapshot each cycle compares against
+        mongo_client[DB_NAME]["leaderboard_snapshots"].create_index(
+            [("battle_id", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)]
+        )
+    except Exception as e:
+        logger.error(f"Error creating the leaderboard_snapshots index: {e}")
+    try:
+        battle_trajectories.ensure_indexes(mongo_client)
+    except Exception as e:
+        logger.error(f"Error creating the battle_trajectories indexes: {e}")
+    try:
+        leaderboard_events.ensure_indexes(mongo_client)
+    except Exception as e:
+        logger.error(f"Error creating the leaderboard_events indexes: {e}")
+    # Index any battle whose trajectories are missing or were not finalized yet
+    try:
+        battle_trajectories.index_battles(mongo_client)
+    except Exception as e:
+        logger.error(f"Error indexing battle trajectories: {e}")
+    pipeline = WritePipeline(mongo_client, write_clan_cycles, WRITE_JOURNAL_PATH, name="clan_fetcher")
     try:
         while is_running is None or is_running():
             try:
-                current_time_naive = datetime.datetime.now()
-                logger.info(f"Starting new fetch cycle at {current_time_naive}")
-                # Check if war has ended
-                finish_time_dt = get_war_finish_time()
-                if finish_time_dt:
-                    logger.info(f"Fetched War Finish Time: {finish_time_dt}")
-                    if current_time_naive >= finish_time_dt:
-                        logger.info("War has ended. Stopping data collection.")
-                        return
-                else:
-                    logger.warning("Could not verify war end time. Continuing fetch cycle.")
-                # Fetch and Insert Clan Data
-                clans = fetch_clan_data()
-                if clans:
-                    # Check if we should collect data
-                    should_collect, battle_id = should_collect_clan_data(mongo_client, clans)
-                    if should_collect and battle_id:
-                        insert_clan_data(clans, mongo_client, battle_id)
-                        create_leaderboard_snapshot(mongo_client, battle_id)
-                    else:
-                        logger.info("Skipping data collection this cycle")
-                else:
-                    logger.warning("Failed to retrieve clan data from the API this cycle.")
+                if not run_fetch_cycle(mongo_client, pipeline):
+                    return
                 # Wait for next cycle
                 wait_seconds = 120
                 logger.info(f"Cycle complete. Waiting for {wait_seconds} seconds...")
@@ -519,6 +714,8 @@ def main(mongo_client=None, is_running=None):
         logger.error(f"Fatal error in main program: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
     finally:
+        # Write (or journal) cycles still queued before the connection goes away
+        pipeline.close()
         # Only close the connection if we created it
         if mongo_client and not is_running:
             mongo_client.close()
@@ -0,0 +1,56 @@
+"""
+Point lookups over the clans collection that stay cheap as the leaderboard depth grows.
+
+Every fetch cycle writes one clans document per clan, all stamped with the cycle's tick
+timestamp. "Each clan's points as of time T" is therefore answered by the newest tick at
+or before T (one indexed read for every clan on it), with a per-clan indexed lookup only
+for clans that were missing from that tick, instead of one query per clan or a sort over
+the battle's whole history.
+"""
+import pymongo
+
+DB_NAME = "clan_dashboard_db"
+
+
+def ensure_indexes(client):
+    clans = client[DB_NAME]["clans"]
+    # A tick's clans in rank order (leaderboard snapshots, reach-target rankings)
+    clans.create_index([("battle_id", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING), ("current_points", pymongo.DESCENDING)])
+    # One clan's history (gains, first-seen checks, comparisons)
+    clans.create_index([("battle_id", pymongo.ASCENDING), ("clan_name", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)])
+    # One document per clan and tick, so a replayed cycle's inserts are idempotent. Created
+    # last: it fails on a collection that already holds duplicates until they are removed
+    clans.create_index(
+        [("battle_id", pymongo.ASCENDING), ("timestamp", pymongo.ASCENDING), ("clan_name", pymongo.ASCENDING)], unique=True
+    )
+
+
+def points_at_or_before(clans_collection, battle_id, clan_names, at):
+    """{clan_name: current_points} from each clan's newest clans document at or before `at`."""
+    names = set(clan_names)
+    tick_doc = clans_collection.find_one(
+        {"battle_id": battle_id, "timestamp": {"$lte": at}}, {"timestamp": 1, "_id": 0},
+        sort=[("timestamp", pymongo.DESCENDING)]
+    )
+    if not tick_doc or not names:
+        return {}
+    tick = tick_doc["timestamp"]
+    points = {
+        doc["clan_name"]: doc["current_points"]
+        for doc in clans_collection.find(
+            {"battle_id": battle_id, "timestamp": tick, "clan_name": {"$in": list(names)}},
+            {"clan_name": 1, "current_points": 1, "_id": 0}
+        )
+    }
+    missing = names - points.keys()
+    if missing:
+        # Clans outside the fetched depth at that tick: their own last document before it
+        points.update(
+            (row["_id"], row["current_points"])
+            for row in clans_collection.aggregate([
+                {"$match": {"battle_id": battle_id, "clan_name": {"$in": list(missing)}, "timestamp": {"$lt": tick}}},
+                {"$sort": {"battle_id": 1, "clan_name": 1, "timestamp": -1}},
+                {"$group": {"_id": "$clan_name", "current_points": {"$first": "$current_points"}}}
+            ])
+        )
+    return points
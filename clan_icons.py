@@ -0,0 +1,113 @@
+"""
+Clan icon resolution and a local cache of the icon images.
+
+Clan icons arrive from the leaderboard API as "rbxassetid://<id>" strings. The fetcher
+resolves them to image IDs once per snapshot (icon_image_id), and the API serves the
+images from IconStore at /icons/{image_id} instead of every viewer downloading each icon
+from the upstream image service.
+
+IconStore is content addressed: image bytes are kept once under objects/<sha256>, and
+ids/<image_id>.json maps an image ID to its digest and content type. Asset IDs never
+change content (a new icon is a new asset), so responses can be cached as immutable.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import namedtuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+ICON_CACHE_DIR = os.environ.get("ICON_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "clan_icons")
+ICON_SOURCE_URL = f"{os.environ.get('PS99_API_URL', 'https://ps99.biggamesapi.io')}/image/{{}}"
+ICON_CACHE_CONTROL = "public, max-age=31536000, immutable"
+ICON_FETCH_TIMEOUT = 10
+
+# Same pattern as getImageId in script.js
+ASSET_ID_PATTERN = re.compile(r"rbxassetid://(\d+)")
+
+Icon = namedtuple("Icon", ["digest", "content_type", "data"])
+
+
+def icon_image_id(icon):
+    """Image ID from an "rbxassetid://<id>" icon string, or None."""
+    if not icon:
+        return None
+    match = ASSET_ID_PATTERN.search(icon)
+    return match.group(1) if match else None
+
+
+def _atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class IconStore:
+    """On-disk, content-addressed icon cache filled from the upstream image service."""
+
+    def __init__(self, directory=ICON_CACHE_DIR, source_url=ICON_SOURCE_URL):
+        self.directory = directory
+        self.source_url = source_url
+        self._session = requests.Session()
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], digest)
+
+    def _id_path(self, image_id):
+        return os.path.join(self.directory, "ids", f"{image_id}.json")
+
+    def _load(self, image_id):
+        try:
+            with open(self._id_path(image_id), encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(self._object_path(meta["digest"]), "rb") as f:
+                return Icon(meta["digest"], meta["content_type"], f.read())
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    def _fetch(self, image_id):
+        response = self._session.get(self.source_url.format(image_id), timeout=ICON_FETCH_TIMEOUT)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        digest = hashlib.sha256(response.content).hexdigest()
+        content_type = response.headers.get("Content-Type", "image/png").split(";")[0]
+        if not os.path.exists(self._object_path(digest)):
+            _atomic_write(self._object_path(digest), response.content)
+        _atomic_write(self._id_path(image_id), json.dumps({"digest": digest, "content_type": content_type}).encode())
+        logger.info(f"Cached icon {image_id} ({len(response.content)} B)")
+        return Icon(digest, content_type, response.content)
+
+    def get(self, image_id, may_fetch=None):
+        """
+        The icon for an image ID, fetched upstream on a miss, or None if upstream has no
+        such image. Concurrent misses for one ID share a single upstream request.
+        may_fetch(image_id), when given, decides whether a miss may go upstream at all.
+        """
+        icon = self._load(image_id)
+        if icon is not None:
+            return icon
+        if may_fetch is not None and not may_fetch(image_id):
+            return None
+        with self._locks_lock:
+            lock = self._locks.setdefault(image_id, threading.Lock())
+        with lock:
+            icon = self._load(image_id)
+            if icon is None:
+                icon = self._fetch(image_id)
+        with self._locks_lock:
+            self._locks.pop(image_id, None)
+        return icon
+
+
+icon_store = IconStore()
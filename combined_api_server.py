@@ -1,17 +1,122 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import hmac
+import logging
+import os
+from contextlib import asynccontextmanager
+import requests
+from pymongo.errors import PyMongoError
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from api_server import app as clan_app
-from member_api_server import app as member_app
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.middleware import SlowAPIMiddleware
+from startup import StartupProfile, run_warmup
+
+startup_profile = StartupProfile()
+startup_profile.record("import framework", time.perf_counter() - _import_started)
+with startup_profile.phase("import api_server"):
+    import api_server
+    from api_server import app as clan_app
+with startup_profile.phase("import member_api_server"):
+    import member_api_server
+    from member_api_server import app as member_app
+from api_responses import CompressionMiddleware, FastJSONResponse
+from shared_cache import SHARED_CACHE_URL, WEB_CONCURRENCY, rate_limit_storage_uri
+from clan_icons import ICON_CACHE_CONTROL, icon_image_id, icon_store
+from change_watcher import ChangeWatcher
+from mongo_monitoring import command_monitor
+from tracing import TracingMiddleware
+
+logger = logging.getLogger(__name__)
+
+def warm_dashboard():
+    """Loads the newest battle's snapshot, filling the icon cache and diff history."""
+    battle_ids = api_server.load_battle_ids()
+    if battle_ids:
+        api_server.get_dashboard_payload(battle_ids[0]["battle_id"])
+
+def warm_usernames():
+    battle_ids = api_server.load_battle_ids()
+    if battle_ids:
+        member_api_server.warm_member_usernames(battle_ids[0]["battle_id"])
+
+def ping_mongo():
+    api_server.get_mongo_client().admin.command("ping")
+
+# Run concurrently and bounded by WARMUP_TIMEOUT_SECONDS; none of them is required to serve
+WARMUP_STEPS = {
+    "mongo ping": ping_mongo,
+    "indexes": api_server.ensure_indexes,
+    "battle ids": api_server.load_battle_ids,
+    "latest snapshot": warm_dashboard,
+    "hot usernames": warm_usernames
+}
+
+async def warm_up(app):
+    statuses = await run_warmup(startup_profile, WARMUP_STEPS)
+    app.state.warmup = statuses
+    app.state.ready = True
+    startup_profile.mark_ready()
+    logger.info(f"Startup profile: {startup_profile.report()}")
+
+def build_change_watcher(loop):
+    """Invalidates caches, and pushes new snapshots to stream subscribers, as writes land."""
+    def on_snapshot(change):
+        battle_id = change.get("battle_id")
+        api_server.invalidate_dashboard(battle_id)
+        if battle_id is not None:
+            asyncio.run_coroutine_threadsafe(api_server.broadcaster.notify(battle_id), loop)
+
+    def on_battle_ids(change):
+        api_server.invalidate_battle_ids()
+
+    def on_clan_details(change):
+        api_server.invalidate_icons(change.get("clan_name"))
+
+    def on_members(change):
+        member_api_server.invalidate_member_caches(change.get("clan_name"), change.get("battle_id"))
+
+    def on_live(live):
+        # The dashboard payload is only cached while every snapshot write is observed;
+        # writes may have been missed while the watcher was down, so start over either way
+        api_server.dashboard_cache_enabled = live
+        api_server.invalidate_dashboard()
+
+    return ChangeWatcher(api_server.get_mongo_client, api_server.DB_NAME, {
+        "leaderboard_snapshots": on_snapshot,
+        "battle_id_history": on_battle_ids,
+        "clan_details": on_clan_details,
+        "clan_members": on_members
+    }, on_live=on_live)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm up in the background: the port opens immediately (liveness) and /readyz
+    # reports ready once warm-up has finished or hit its time bound
+    app.state.ready = False
+    app.state.warmup = {}
+    warmup_task = asyncio.create_task(warm_up(app))
+    change_watcher = build_change_watcher(asyncio.get_running_loop())
+    change_watcher.start()
+    app.state.change_watcher = change_watcher
+    yield
+    warmup_task.cancel()
+    change_watcher.stop()
+    api_server.close_mongo_client()
+
+startup_profile.record("import total", time.perf_counter() - _import_started)
 
 # Create the main FastAPI app
 app = FastAPI(
     title="Clan Dashboard Combined API",
     version="0.1.0",
     docs_url=None,
-    redoc_url=None
+    redoc_url=None,
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware to only allow GitHub Pages frontend
@@ -21,17 +126,40 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Snapshot-Timestamp", "X-Ingest-Trace-Id"],
 )
 
-# Add global rate limiting: 30 requests per minute per IP
+# Admin endpoints exist only when ADMIN_TOKEN is set, and need it in X-Admin-Token
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+def check_admin(request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get("x-admin-token") or ""
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+# Add global rate limiting: 30 requests per minute per IP (RATE_LIMIT overrides, e.g. for load tests)
+# Counters live in the shared cache store so the limit holds across workers
+RATE_LIMIT = os.environ.get("RATE_LIMIT", "30/minute")
+RATE_LIMIT_STORAGE_URI = os.environ.get("RATE_LIMIT_STORAGE_URI") or rate_limit_storage_uri(SHARED_CACHE_URL)
 limiter = Limiter(
     key_func=get_remote_address,
-    default_limits=["30/minute"]
+    default_limits=[RATE_LIMIT],
+    storage_uri=RATE_LIMIT_STORAGE_URI
 )
 app.state.limiter = limiter
 app.add_exception_handler(429, _rate_limit_exceeded_handler)
 app.add_middleware(SlowAPIMiddleware)
 
+# Negotiated brotli/gzip for complete responses over 1 KB (wraps the mounted apps, inside
+# tracing: middleware added later runs further out)
+app.add_middleware(CompressionMiddleware)
+
+# One span per request, outermost so it covers rate limiting and compression too
+# (exported only when TRACE_EXPORT_PATH is set, see tracing)
+app.add_middleware(TracingMiddleware)
+
 # Mount the clan API sub-application
 app.mount("/api/clan", clan_app)
 # Mount the member API sub-application
@@ -43,6 +171,87 @@ async def read_root():
     """Basic endpoint to check if the API is running."""
     return {"message": "Welcome to the Clan Dashboard Combined API!"}
 
+# Liveness: the process is up and serving (never touches MongoDB)
+@app.get("/healthz")
+@limiter.exempt
+async def healthz(request: Request):
+    return {"status": "ok"}
+
+# Readiness: warm-up has finished (or timed out) and MongoDB answers a ping
+@app.get("/readyz")
+@limiter.exempt
+async def readyz(request: Request):
+    if not getattr(app.state, "ready", False):
+        return FastJSONResponse({"status": "starting", "warmup": app.state.warmup}, status_code=503)
+    if app.state.warmup.get("mongo ping") != "ok":
+        try:
+            await asyncio.wait_for(asyncio.to_thread(ping_mongo), timeout=5)
+            app.state.warmup["mongo ping"] = "ok"
+        except Exception as e:
+            return FastJSONResponse({"status": "unavailable", "detail": str(e) or type(e).__name__, "warmup": app.state.warmup}, status_code=503)
+    return {"status": "ready", "warmup": app.state.warmup}
+
+# Only icons of clans in clan_details are fetched upstream, so the proxy cannot be used to
+# pull arbitrary assets; the known image IDs are reloaded at most this often
+KNOWN_ICONS_REFRESH_SECONDS = 60
+_known_icon_ids = frozenset()
+_known_icon_ids_loaded_at = None
+
+def is_known_icon(image_id):
+    global _known_icon_ids, _known_icon_ids_loaded_at
+    if image_id in _known_icon_ids:
+        return True
+    now = time.monotonic()
+    if _known_icon_ids_loaded_at is not None and now - _known_icon_ids_loaded_at < KNOWN_ICONS_REFRESH_SECONDS:
+        return False
+    icons = api_server.get_mongo_client()[api_server.DB_NAME]["clan_details"].distinct("icon")
+    _known_icon_ids = frozenset(filter(None, map(icon_image_id, icons)))
+    _known_icon_ids_loaded_at = now
+    return image_id in _known_icon_ids
+
+# Clan icon proxy: exempt from the rate limit, a dashboard load requests 25+ icons at once
+@app.get("/icons/{image_id}")
+@limiter.exempt
+async def get_clan_icon(image_id: str, request: Request):
+    """Serves a clan icon image from the local icon cache, fetching known clan icons upstream once."""
+    if not image_id.isdigit():
+        raise HTTPException(status_code=404, detail="Unknown icon")
+    try:
+        icon = await asyncio.to_thread(icon_store.get, image_id, is_known_icon)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Error fetching icon {image_id}: {e}")
+        raise HTTPException(status_code=502, detail="Icon unavailable")
+    except PyMongoError as e:
+        logger.warning(f"Error loading known icons: {e}")
+        raise HTTPException(status_code=503, detail="Icon unavailable")
+    if icon is None:
+        raise HTTPException(status_code=404, detail="Unknown icon")
+    headers = {"Cache-Control": ICON_CACHE_CONTROL, "ETag": f'"{icon.digest}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(icon.data, media_type=icon.content_type, headers=headers)
+
+@app.get("/startup-profile")
+@limiter.exempt
+async def get_startup_profile(request: Request):
+    """Import and warm-up timings for this worker, to spot cold-start regressions."""
+    return startup_profile.report()
+
+# Not exempt from the rate limit, which also bounds token guessing
+@app.get("/admin/mongo-stats")
+async def get_mongo_stats(request: Request):
+    """
+    MongoDB command latency per collection and operation for this worker, the recent slow
+    queries and the executionStats explain captured for each slow query shape.
+    """
+    check_admin(request)
+    return command_monitor.report()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    port = int(os.environ.get("PORT", "8000"))
+    if WEB_CONCURRENCY > 1:
+        # Workers need an import string; each one re-imports this module with the same env
+        uvicorn.run("combined_api_server:app", host="0.0.0.0", port=port, workers=WEB_CONCURRENCY)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port) 
\ No newline at end of file
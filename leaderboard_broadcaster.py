@@ -0,0 +1,129 @@
+import asyncio
+import datetime
+import logging
+
+from api_responses import encode_json
+
+logger = logging.getLogger(__name__)
+
+# How often the shared watcher checks for a new snapshot (one query per battle, not per client)
+DEFAULT_POLL_INTERVAL = 15
+# Pending events kept per subscriber; a slow client only ever needs the newest snapshot
+SUBSCRIBER_QUEUE_SIZE = 2
+
+
+def format_sse(event, data, event_id=None):
+    """Encodes a single Server-Sent Events message."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    for line in data.splitlines() or [""]:
+        lines.append(f"data: {line}")
+    return "\n".join(lines) + "\n\n"
+
+
+class LeaderboardBroadcaster:
+    """
+    Fans out new leaderboard snapshots to every streaming subscriber of a battle.
+
+    One watcher task per battle checks for a newer snapshot timestamp and, only when it
+    changes, loads the payload and encodes the SSE message once. Subscribers receive the
+    pre-encoded message, so the cost of an update does not grow with the number of clients.
+    """
+
+    def __init__(self, load_latest_timestamp, load_snapshot_payload, poll_interval=DEFAULT_POLL_INTERVAL):
+        # load_latest_timestamp(battle_id) -> datetime or None (cheap, blocking)
+        # load_snapshot_payload(battle_id) -> dict with "timestamp" and "top_clans", or None (blocking)
+        self._load_latest_timestamp = load_latest_timestamp
+        self._load_snapshot_payload = load_snapshot_payload
+        self.poll_interval = poll_interval
+        self._subscribers = {}  # battle_id -> set of asyncio.Queue
+        self._latest = {}  # battle_id -> (timestamp, encoded message)
+        self._watchers = {}  # battle_id -> asyncio.Task
+
+    def subscriber_count(self, battle_id=None):
+        if battle_id is not None:
+            return len(self._subscribers.get(battle_id, ()))
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def subscribe(self, battle_id):
+        """Registers a subscriber and primes it with the latest known snapshot."""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        if battle_id not in self._latest:
+            await self._refresh(battle_id)
+        latest = self._latest.get(battle_id)
+        if latest is not None:
+            self._offer(queue, latest[1])
+        self._subscribers.setdefault(battle_id, set()).add(queue)
+
+        watcher = self._watchers.get(battle_id)
+        if watcher is None or watcher.done():
+            self._watchers[battle_id] = asyncio.create_task(self._watch(battle_id))
+        logger.info(f"Dashboard stream subscriber added for {battle_id} ({self.subscriber_count(battle_id)} active)")
+        return queue
+
+    def unsubscribe(self, battle_id, queue):
+        queues = self._subscribers.get(battle_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        logger.info(f"Dashboard stream subscriber removed for {battle_id} ({len(queues)} active)")
+        if not queues:
+            del self._subscribers[battle_id]
+            watcher = self._watchers.pop(battle_id, None)
+            if watcher is not None:
+                watcher.cancel()
+
+    def publish(self, battle_id, payload):
+        """Encodes a snapshot payload once and delivers it to every subscriber of the battle."""
+        timestamp = payload.get("timestamp")
+        latest = self._latest.get(battle_id)
+        if latest is not None and timestamp is not None and latest[0] == timestamp:
+            return 0
+        event_id = timestamp.isoformat() if isinstance(timestamp, datetime.datetime) else timestamp
+        message = format_sse("snapshot", encode_json(payload).decode(), event_id=event_id)
+        self._latest[battle_id] = (timestamp, message)
+
+        delivered = 0
+        for queue in list(self._subscribers.get(battle_id, ())):
+            self._offer(queue, message)
+            delivered += 1
+        logger.info(f"Published snapshot {event_id} for {battle_id} to {delivered} subscribers")
+        return delivered
+
+    @staticmethod
+    def _offer(queue, message):
+        # Drop the oldest pending message rather than blocking on a slow client
+        while queue.full():
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+        queue.put_nowait(message)
+
+    async def notify(self, battle_id):
+        """Publishes a battle's new snapshot right away (called when a write is observed)."""
+        if battle_id in self._subscribers:
+            await self._refresh(battle_id)
+
+    async def _refresh(self, battle_id):
+        latest = self._latest.get(battle_id)
+        try:
+            timestamp = await asyncio.to_thread(self._load_latest_timestamp, battle_id)
+            if timestamp is None or (latest is not None and latest[0] == timestamp):
+                return
+            payload = await asyncio.to_thread(self._load_snapshot_payload, battle_id)
+        except Exception as e:
+            logger.error(f"Error checking for new snapshot for {battle_id}: {e}")
+            return
+        if payload:
+            self.publish(battle_id, payload)
+
+    async def _watch(self, battle_id):
+        try:
+            while battle_id in self._subscribers:
+                await asyncio.sleep(self.poll_interval)
+                await self._refresh(battle_id)
+        except asyncio.CancelledError:
+            pass
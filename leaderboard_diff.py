@@ -0,0 +1,103 @@
+import datetime
+import threading
+from collections import OrderedDict
+
+# Snapshots kept per battle for computing diffs (~1 hour at the 2-minute fetch cadence)
+DEFAULT_HISTORY_SIZE = 30
+
+
+def snapshot_key(timestamp):
+    """Normalizes a snapshot timestamp (datetime or ISO string) to the key used by clients."""
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        except ValueError:
+            return timestamp
+    if isinstance(timestamp, datetime.datetime):
+        # Mongo returns naive UTC datetimes; treat aware input the same way
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return timestamp.isoformat()
+    return None
+
+
+def diff_snapshots(old_clans, new_clans):
+    """
+    Computes a compact patch turning old_clans into new_clans in O(clans).
+
+    Returns changed fields per clan, rank moves, clans that entered (full entries) and
+    names of clans that left the leaderboard.
+    """
+    old_by_name = {clan["clan_name"]: clan for clan in old_clans}
+    new_names = set()
+    changed = {}
+    rank_moves = []
+    entered = []
+
+    for clan in new_clans:
+        name = clan["clan_name"]
+        new_names.add(name)
+        previous = old_by_name.get(name)
+        if previous is None:
+            entered.append(clan)
+            continue
+        fields = {key: value for key, value in clan.items() if previous.get(key) != value}
+        for key in previous:
+            if key not in clan:
+                fields[key] = None
+        if fields:
+            changed[name] = fields
+        if previous.get("current_rank") != clan.get("current_rank"):
+            rank_moves.append({
+                "clan_name": name,
+                "from": previous.get("current_rank"),
+                "to": clan.get("current_rank")
+            })
+
+    left = [name for name in old_by_name if name not in new_names]
+    return {
+        "changed": changed,
+        "rank_moves": rank_moves,
+        "entered": entered,
+        "left": left
+    }
+
+
+class SnapshotHistory:
+    """Keeps the last N leaderboard snapshots per battle, keyed by snapshot timestamp."""
+
+    def __init__(self, max_snapshots=DEFAULT_HISTORY_SIZE):
+        self.max_snapshots = max_snapshots
+        self._battles = {}  # battle_id -> OrderedDict(snapshot key -> top_clans)
+        self._lock = threading.Lock()
+
+    def add(self, battle_id, timestamp, top_clans):
+        key = snapshot_key(timestamp)
+        if key is None:
+            return
+        with self._lock:
+            snapshots = self._battles.setdefault(battle_id, OrderedDict())
+            if key in snapshots:
+                return
+            # Store a shallow copy of each entry so later in-place edits don't alter history
+            snapshots[key] = [dict(clan) for clan in top_clans]
+            while len(snapshots) > self.max_snapshots:
+                snapshots.popitem(last=False)
+
+    def get(self, battle_id, timestamp):
+        key = snapshot_key(timestamp)
+        with self._lock:
+            return self._battles.get(battle_id, {}).get(key)
+
+    def build_response(self, battle_id, timestamp, top_clans, since):
+        """
+        Returns a diff from `since` to the given snapshot, or the full payload when `since`
+        is unknown (client too far behind, or the server restarted).
+        """
+        key = snapshot_key(timestamp)
+        base = self.get(battle_id, since)
+        if base is None:
+            return {"type": "full", "timestamp": key, "top_clans": top_clans}
+        patch = diff_snapshots(base, top_clans)
+        patch.update({"type": "diff", "since": snapshot_key(since), "timestamp": key})
+        return patch
@@ -0,0 +1,177 @@
+"""
+Rank-change, overtake and projected-overtake events derived from consecutive snapshots.
+
+After each leaderboard snapshot, detect_events compares it with the previous snapshot of
+the battle in O(clans + events) and the events are stored in leaderboard_events, so
+"when did X pass Y" is an indexed read instead of a scan of the raw clans history.
+
+    rank_change         clan_name moved from_rank -> to_rank (None: entered/left the top 25)
+    overtake            clan_name passed other_clan since the previous snapshot
+    projected_overtake  at current gain rates clan_name passes other_clan (the clan one
+                        rank above) before the war ends; emitted when the projection
+                        first appears, with eta and eta_minutes
+"""
+import datetime
+import logging
+
+import pymongo
+
+logger = logging.getLogger(__name__)
+
+DB_NAME = "clan_dashboard_db"
+EVENT_TYPES = ("rank_change", "overtake", "projected_overtake")
+# Gain window the rates come from, the same one create_leaderboard_snapshot projects with
+FORECAST_PERIOD_MINUTES = 360
+
+
+def ensure_indexes(client):
+    collection = client[DB_NAME]["leaderboard_events"]
+    collection.create_index([("battle_id", pymongo.ASCENDING), ("_id", pymongo.DESCENDING)])
+    collection.create_index([("battle_id", pymongo.ASCENDING), ("clan_name", pymongo.ASCENDING), ("_id", pymongo.DESCENDING)])
+    collection.create_index([("battle_id", pymongo.ASCENDING), ("other_clan", pymongo.ASCENDING), ("_id", pymongo.DESCENDING)])
+    collection.create_index([("battle_id", pymongo.ASCENDING), ("timestamp", pymongo.ASCENDING)])
+
+
+def _overtakes(old_clans, new_clans):
+    """
+    (overtaker, overtaken) pairs among clans in both snapshots. Walks the new order while
+    removing each clan from a linked list of the old order: clans still ahead of it in that
+    list were above it before and are below it now.
+    """
+    new_names = {clan["clan_name"] for clan in new_clans}
+    old_order = [clan["clan_name"] for clan in old_clans if clan["clan_name"] in new_names]
+    old_names = set(old_order)
+    following = dict(zip(old_order, old_order[1:] + [None]))
+    preceding = dict(zip(old_order, [None] + old_order[:-1]))
+    head = old_order[0] if old_order else None
+
+    pairs = []
+    for clan in new_clans:
+        name = clan["clan_name"]
+        if name not in old_names:
+            continue
+        passed = head
+        while passed != name:
+            pairs.append((name, passed))
+            passed = following[passed]
+        # Unlink name
+        before, after = preceding[name], following[name]
+        if before is None:
+            head = after
+        else:
+            following[before] = after
+        if after is not None:
+            preceding[after] = before
+    return pairs
+
+
+def _projected_passes(clans, war_end_time, timestamp):
+    """(clan, clan one rank above, minutes until it passes) where the gap closes before the war ends."""
+    minutes_remaining = (war_end_time - timestamp).total_seconds() / 60 if war_end_time else None
+    passes = []
+    for above, below in zip(clans, clans[1:]):
+        gain_above = above.get(f"gain_{FORECAST_PERIOD_MINUTES}m")
+        gain_below = below.get(f"gain_{FORECAST_PERIOD_MINUTES}m")
+        if gain_above is None or gain_below is None:
+            continue
+        closing_rate = (gain_below - gain_above) / FORECAST_PERIOD_MINUTES
+        gap = above["current_points"] - below["current_points"]
+        if closing_rate <= 0 or gap < 0:
+            continue
+        eta_minutes = gap / closing_rate
+        if minutes_remaining is not None and eta_minutes > minutes_remaining:
+            continue
+        passes.append((below, above, eta_minutes))
+    return passes
+
+
+def detect_events(previous, current, war_end_time=None):
+    """
+    Events between two snapshot documents of a battle ({"battle_id", "timestamp",
+    "top_clans"}). `previous` may be None for a battle's first snapshot.
+    """
+    battle_id, timestamp = current["battle_id"], current["timestamp"]
+    new_clans = current.get("top_clans") or []
+    old_clans = (previous or {}).get("top_clans") or []
+    base = {"battle_id": battle_id, "timestamp": timestamp}
+    events = []
+
+    if previous is not None:
+        old_ranks = {clan["clan_name"]: clan.get("current_rank") for clan in old_clans}
+        new_ranks = {clan["clan_name"]: clan.get("current_rank") for clan in new_clans}
+        for name, rank in new_ranks.items():
+            if old_ranks.get(name) != rank:
+                events.append({**base, "type": "rank_change", "clan_name": name, "from_rank": old_ranks.get(name), "to_rank": rank})
+        for name, rank in old_ranks.items():
+            if name not in new_ranks:
+                events.append({**base, "type": "rank_change", "clan_name": name, "from_rank": rank, "to_rank": None})
+
+        points = {clan["clan_name"]: clan.get("current_points") for clan in new_clans}
+        for name, passed in _overtakes(old_clans, new_clans):
+            events.append({
+                **base, "type": "overtake", "clan_name": name, "other_clan": passed,
+                "to_rank": new_ranks[name], "points_gap": points[name] - points[passed]
+            })
+
+    # Only projections that were not already standing at the previous snapshot
+    already_projected = set()
+    if previous is not None:
+        already_projected = {
+            (below["clan_name"], above["clan_name"])
+            for below, above, _ in _projected_passes(old_clans, war_end_time, previous["timestamp"])
+        }
+    for below, above, eta_minutes in _projected_passes(new_clans, war_end_time, timestamp):
+        if (below["clan_name"], above["clan_name"]) in already_projected:
+            continue
+        events.append({
+            **base, "type": "projected_overtake", "clan_name": below["clan_name"], "other_clan": above["clan_name"],
+            "from_rank": below.get("current_rank"), "points_gap": above["current_points"] - below["current_points"],
+            "eta_minutes": round(eta_minutes, 1), "eta": timestamp + datetime.timedelta(minutes=eta_minutes)
+        })
+    return events
+
+
+def previous_snapshot(db, battle_id, timestamp):
+    return db["leaderboard_snapshots"].find_one(
+        {"battle_id": battle_id, "timestamp": {"$lt": timestamp}},
+        sort=[("timestamp", pymongo.DESCENDING)]
+    )
+
+
+def record_snapshot_events(client, snapshot_doc, previous=None, war_end_time=None):
+    """
+    Stores the events between a new snapshot and the previous one (read from
+    leaderboard_snapshots unless given). Rewrites the snapshot's events if it was recorded
+    before, so replayed cycles do not duplicate them. Returns the number of events.
+    """
+    if not snapshot_doc:
+        return 0
+    db = client[DB_NAME]
+    if previous is None:
+        previous = previous_snapshot(db, snapshot_doc["battle_id"], snapshot_doc["timestamp"])
+    events = detect_events(previous, snapshot_doc, war_end_time)
+    collection = db["leaderboard_events"]
+    collection.delete_many({"battle_id": snapshot_doc["battle_id"], "timestamp": snapshot_doc["timestamp"]})
+    if events:
+        collection.insert_many(events, ordered=True)
+    return len(events)
+
+
+def load_events(db, battle_id, clan_name=None, event_types=None, before=None, limit=50):
+    """
+    A page of a battle's events, newest first. `before` is the `next` cursor of the
+    previous page (an event _id); returns (events, next cursor or None).
+    """
+    query = {"battle_id": battle_id}
+    if clan_name:
+        query["$or"] = [{"clan_name": clan_name}, {"other_clan": clan_name}]
+    if event_types:
+        query["type"] = {"$in": list(event_types)}
+    if before is not None:
+        query["_id"] = {"$lt": before}
+    events = list(db["leaderboard_events"].find(query).sort("_id", pymongo.DESCENDING).limit(limit + 1))
+    next_cursor = str(events[limit - 1]["_id"]) if len(events) > limit else None
+    events = events[:limit]
+    for event in events:
+        event["id"] = str(event.pop("_id"))
+    return events, next_cursor
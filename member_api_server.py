@@ -1,6 +1,7 @@
 from fastapi import FastAPI, HTTPException
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 import uvicorn
 import requests
 import datetime
@@ -11,10 +12,17 @@ import os
 import traceback
 from dotenv import load_dotenv
 load_dotenv()
+import mongo_monitoring
+# Latency stats and slow-query logging for every MongoClient this process creates
+mongo_monitoring.install()
 from pymongo import MongoClient
 from pymongo.collection import Collection
 from fastapi.middleware.cors import CORSMiddleware
+from collections import OrderedDict
+import numpy as np
 from roblox_api import get_usernames_batch
+from api_responses import NDJSON_MEDIA_TYPE, FastJSONResponse, accepts_ndjson, encode_ndjson_line
+from member_stats import SNAPSHOT_MINUTES, UPTIME_WINDOWS, compute_member_stats, inactive_minutes, rank_members
 import logging
 
 # Configure logging
@@ -32,13 +40,31 @@ app = FastAPI(
     title="Clan Member Tracking API",
     version="0.1.0",
     docs_url=None,
-    redoc_url=None
+    redoc_url=None,
+    default_response_class=FastJSONResponse
 )
 
 # --- MongoDB Atlas Connection ---
 MONGO_CONNECTION_STRING = os.environ.get("MONGO_URI")
 DB_NAME = "clan_dashboard_db"
 
+def warm_member_usernames(battle_id):
+    """
+    Preloads usernames for every tracked clan's roster in the battle into the shared
+    cache, reading the IDs from member_activity_state instead of the member history.
+    """
+    client = MongoClient(MONGO_CONNECTION_STRING, serverSelectionTimeoutMS=5000)
+    try:
+        user_ids = set()
+        for state in client[DB_NAME]["member_activity_state"].find({"battle_id": battle_id}, {"_id": 0, "members": 1}):
+            user_ids.update(state.get("members", {}).keys())
+        if user_ids:
+            get_usernames_batch(list(user_ids), client)
+        logger.info(f"Warmed usernames for {len(user_ids)} members of {battle_id}")
+        return len(user_ids)
+    finally:
+        client.close()
+
 # --- Root endpoint ---
 @app.get("/")
 async def read_root():
@@ -141,7 +167,7 @@ async def get_member_tracking(clan_name: str, battle_id: str):
             "members": members_with_names
         }
         logger.info(f"Successfully processed data for {clan_name} with {len(members_with_names)} members")
-        return response_data
+        return FastJSONResponse(response_data)
 
     except Exception as e:
         logger.error(f"Unexpected error in get_member_tracking: {e}")
@@ -151,11 +177,141 @@ async def get_member_tracking(clan_name: str, battle_id: str):
         if client:
             client.close()
 
+# --- History response builders ---
+UNKNOWN_USER = {"name": "Unknown", "display_name": "Unknown"}
+HISTORY_FORMAT_PATTERN = "^(full|compact)$"
+
+def build_full_history(records, usernames, user_ids=None, include_battle_id=True):
+    """
+    Builds the default history format: one entry per snapshot, each repeating
+    UserID/username/display_name for every member. `user_ids` limits members to those IDs.
+    """
+    processed_history = []
+    for data in records:
+        members_with_names = []
+        for member in data.get("members", []):
+            if not member.get("UserID"):
+                logger.warning(f"Skipping member with missing UserID: {member}")
+                continue
+
+            user_id = str(member["UserID"])
+            # Only include the requested user's data when userId is provided
+            if user_ids and user_id not in user_ids:
+                continue
+
+            user_info = usernames.get(user_id, UNKNOWN_USER)
+
+            members_with_names.append({
+                "UserID": user_id,
+                "username": user_info["name"],
+                "display_name": user_info["display_name"],
+                "points": member.get("Points", member.get("points", 0))  # Try both cases
+            })
+
+        entry = {
+            "timestamp": data.get("timestamp", datetime.datetime.now()),
+            "total_points": data.get("total_points", 0),
+            "is_active": data.get("is_active", False),
+        }
+        if include_battle_id:
+            entry["battle_id"] = data.get("battle_id")  # Include battle_id in response
+        entry["members"] = members_with_names
+        processed_history.append(entry)
+    return processed_history
+
+def build_compact_history(records, usernames, user_ids=None):
+    """
+    Builds the dictionary-encoded history format: each member is listed once in `members`,
+    and `points` is a snapshots x members matrix (row i belongs to timestamps[i], column j
+    to members[j]; null where the member was absent from that snapshot).
+    """
+    # Pass 1: assign a column per member. Keyed by the raw UserID so the str() conversion
+    # and username lookup happen once per member rather than once per member per snapshot.
+    column_by_raw_id = {}
+    column_by_user_id = {}
+    members = []
+    for data in records:
+        for member in data.get("members", []):
+            raw_id = member.get("UserID")
+            if not raw_id or raw_id in column_by_raw_id:
+                continue
+            user_id = str(raw_id)
+            if user_ids and user_id not in user_ids:
+                column_by_raw_id[raw_id] = None
+                continue
+            column = column_by_user_id.get(user_id)
+            if column is None:
+                column = column_by_user_id[user_id] = len(members)
+                user_info = usernames.get(user_id, UNKNOWN_USER)
+                members.append({
+                    "UserID": user_id,
+                    "username": user_info["name"],
+                    "display_name": user_info["display_name"]
+                })
+            column_by_raw_id[raw_id] = column
+
+    # Pass 2: fill one fixed-width row per snapshot
+    width = len(members)
+    points = []
+    timestamps = []
+    total_points = []
+    is_active = []
+    for data in records:
+        row = [None] * width
+        for member in data.get("members", []):
+            column = column_by_raw_id.get(member.get("UserID"))
+            if column is not None:
+                row[column] = member.get("Points", member.get("points", 0))
+        points.append(row)
+        timestamps.append(data.get("timestamp", datetime.datetime.now()))
+        total_points.append(data.get("total_points", 0))
+        is_active.append(data.get("is_active", False))
+
+    return {
+        "format": "compact",
+        "members": members,
+        "timestamps": timestamps,
+        "total_points": total_points,
+        "is_active": is_active,
+        "points": points
+    }
+
+# Snapshots fetched per cursor round trip when streaming NDJSON
+HISTORY_STREAM_BATCH_SIZE = 50
+
+def stream_history_ndjson(client, cursor, usernames, user_ids=None):
+    """
+    Yields one full-format snapshot per line straight from the Mongo cursor, so memory
+    stays at one cursor batch however long the battle is. Owns (and closes) the client.
+    """
+    try:
+        for record in cursor:
+            yield encode_ndjson_line(build_full_history([record], usernames, user_ids)[0])
+    except Exception as e:
+        # Headers are already sent; log and end the stream early
+        logger.error(f"Error streaming member history: {e}")
+        logger.error(traceback.format_exc())
+    finally:
+        cursor.close()
+        client.close()
+
 # --- Member history endpoint ---
 @app.get("/member-history/{clan_name}")
-async def get_member_history(clan_name: str, battle_id: str, userId: Optional[str] = None):
-    """Get historical member data for a specific clan, filtered by battle_id and optionally by userId."""
-    logger.info(f"Received history request - clan: {clan_name}, userId: {userId}, battle_id: {battle_id}")
+async def get_member_history(
+    request: Request,
+    clan_name: str,
+    battle_id: str,
+    userId: Optional[str] = None,
+    format: str = Query("full", pattern=HISTORY_FORMAT_PATTERN, description="'full' or dictionary-encoded 'compact'")
+):
+    """
+    Get historical member data for a specific clan, filtered by battle_id and optionally by userId.
+
+    With `Accept: application/x-ndjson` the snapshots are streamed newest first, one
+    full-format snapshot per line (`format` is ignored).
+    """
+    stream = accepts_ndjson(request.headers.get("accept"))
+    logger.info(f"Received history request - clan: {clan_name}, userId: {userId}, battle_id: {battle_id}, format: {format}, stream: {stream}")
     client = None
     try:
         client = MongoClient(MONGO_CONNECTION_STRING)
@@ -197,8 +353,17 @@ async def get_member_history(clan_name: str, battle_id: str, userId: Optional[st
                 }},
                 {"$sort": {"timestamp": -1}}
             ]
-            historical_data = list(members_collection.aggregate(pipeline))
+            if stream:
+                cursor = members_collection.aggregate(pipeline, batchSize=HISTORY_STREAM_BATCH_SIZE)
+            else:
+                historical_data = list(members_collection.aggregate(pipeline))
             logger.info(f"Using aggregation pipeline with userId filter: {userId}")
+        elif stream:
+            cursor = members_collection.find(
+                query,
+                sort=[("timestamp", pymongo.DESCENDING)],
+                batch_size=HISTORY_STREAM_BATCH_SIZE
+            )
         else:
             # Get historical data with the basic query for all members
             historical_data = list(members_collection.find(
@@ -206,6 +371,27 @@ async def get_member_history(clan_name: str, battle_id: str, userId: Optional[st
                 sort=[("timestamp", pymongo.DESCENDING)]
             ))
 
+        # Only include the requested user's data when userId is provided
+        user_ids = {userId, str(int(userId))} if userId else None
+
+        if stream:
+            # Resolve names up front from the distinct IDs instead of materializing the battle
+            if userId:
+                member_ids = user_ids
+            else:
+                member_ids = {str(member_id) for member_id in members_collection.distinct("members.UserID", query) if member_id}
+            if not member_ids:
+                cursor.close()
+                raise HTTPException(status_code=404, detail=f"No historical data found for clan {clan_name}")
+            logger.info(f"Streaming history for {clan_name} with {len(member_ids)} unique members")
+            usernames = get_usernames_batch(list(member_ids), client)
+            response = StreamingResponse(
+                stream_history_ndjson(client, cursor, usernames, user_ids),
+                media_type=NDJSON_MEDIA_TYPE
+            )
+            client = None  # Closed by the stream once the cursor is exhausted
+            return response
+
         logger.info(f"Found {len(historical_data)} historical records for {clan_name}")
 
         if not historical_data:
@@ -227,45 +413,25 @@ async def get_member_history(clan_name: str, battle_id: str, userId: Optional[st
         logger.info(f"Fetching usernames for {len(all_member_ids)} unique members")
         usernames = get_usernames_batch(list(all_member_ids), client)
 
-        # Process historical data
-        processed_history = []
-        for data in historical_data:
-            members_with_names = []
-            for member in data.get("members", []):
-                if not member.get("UserID"):
-                    logger.warning(f"Skipping member with missing UserID: {member}")
-                    continue
-                    
-                user_id = str(member["UserID"])
-                # Only include the requested user's data when userId is provided
-                if userId and user_id != userId and user_id != str(int(userId)):
-                    continue
-                    
-                user_info = usernames.get(user_id, {"name": "Unknown", "display_name": "Unknown"})
-                
-                members_with_names.append({
-                    "UserID": user_id,
-                    "username": user_info["name"],
-                    "display_name": user_info["display_name"],
-                    "points": member.get("Points", member.get("points", 0))  # Try both cases
-                })
+        if format == "compact":
+            compact_history = build_compact_history(historical_data, usernames, user_ids)
+            compact_history.update({"status": "ok", "clan_name": clan_name, "battle_id": battle_id})
+            logger.info(f"Successfully processed compact historical data for {clan_name}")
+            return FastJSONResponse(compact_history)
 
-            processed_history.append({
-                "timestamp": data.get("timestamp", datetime.datetime.now()),
-                "total_points": data.get("total_points", 0),
-                "is_active": data.get("is_active", False),
-                "battle_id": data.get("battle_id"),  # Include battle_id in response
-                "members": members_with_names
-            })
+        # Process historical data
+        processed_history = build_full_history(historical_data, usernames, user_ids)
 
         logger.info(f"Successfully processed historical data for {clan_name}")
-        return {
+        return FastJSONResponse({
             "status": "ok",
             "clan_name": clan_name,
             "battle_id": battle_id,  # Include battle_id in response
             "history": processed_history
-        }
+        })
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in get_member_history: {e}")
         logger.error(traceback.format_exc())
@@ -275,20 +441,42 @@ async def get_member_history(clan_name: str, battle_id: str, userId: Optional[st
             client.close()
 
 @app.get("/member-history/{clan_name}/recent")
-async def get_recent_member_history(clan_name: str, battle_id: str, hours: int = 24):
-    """Get recent historical data for a clan's members for a specific battle."""
-    logger.info(f"Starting recent history fetch for clan: {clan_name}, hours: {hours}, battle_id: {battle_id}")
+async def get_recent_member_history(
+    clan_name: str,
+    battle_id: str,
+    hours: int = 24,
+    format: str = Query("full", pattern=HISTORY_FORMAT_PATTERN, description="'full' or dictionary-encoded 'compact'"),
+    since: Optional[str] = Query(None, description="Only return snapshots newer than this ISO timestamp")
+):
+    """
+    Get recent historical data for a clan's members for a specific battle.
+
+    With `since` (the newest timestamp a client already has) only newer snapshots are
+    returned, so clients can append to their cached window instead of re-fetching it.
+    """
+    logger.info(f"Starting recent history fetch for clan: {clan_name}, hours: {hours}, battle_id: {battle_id}, format: {format}, since: {since}")
     client = None
     try:
         start_time = time.time()
-        logger.info(f"Starting recent history fetch for clan: {clan_name}")
-        
+
+        since_time = None
+        if since:
+            try:
+                since_time = datetime.datetime.fromisoformat(since.replace("Z", "+00:00"))
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid since timestamp: {since}")
+            if since_time.tzinfo is not None:
+                since_time = since_time.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
         client = MongoClient(MONGO_CONNECTION_STRING)
         db = client[DB_NAME]
         
         # Calculate the cutoff time
         cutoff_time = datetime.datetime.utcnow() - datetime.timedelta(hours=hours)
-        logger.info(f"Fetching records since: {cutoff_time}")
+        timestamp_filter = {"$gte": cutoff_time}
+        if since_time is not None and since_time >= cutoff_time:
+            timestamp_filter = {"$gt": since_time}
+        logger.info(f"Fetching records matching timestamp {timestamp_filter}")
         
         # Query MongoDB for recent records
         collection = db["clan_members"]
@@ -296,26 +484,23 @@ async def get_recent_member_history(clan_name: str, battle_id: str, hours: int =
         # Add timing for MongoDB query
         query_start = time.time()
         
-        # First check if we have any records at all
-        total_records = collection.count_documents({"clan_name": clan_name})
-        logger.info(f"Total records for clan {clan_name}: {total_records}")
-        
-        # Get recent records
+        # Served by the (clan_name, battle_id, timestamp) index created by member_data_fetcher
         records = list(collection.find(
             {
+                "clan_name": clan_name,
                 "battle_id": battle_id,
-                "timestamp": {"$gte": cutoff_time}
+                "timestamp": timestamp_filter
             },
             sort=[("timestamp", pymongo.DESCENDING)]  # Sort by newest first
         ))
         query_time = time.time() - query_start
         logger.info(f"MongoDB query took {query_time:.2f} seconds")
         
-        if not records:
+        if not records and since_time is None:
             logger.warning(f"No recent records found. Fetching last 100 records instead.")
             # If no recent records, get the last 100 records
             records = list(collection.find(
-                {"battle_id": battle_id},
+                {"clan_name": clan_name, "battle_id": battle_id},
                 sort=[("timestamp", pymongo.DESCENDING)],
                 limit=100
             ))
@@ -341,29 +526,10 @@ async def get_recent_member_history(clan_name: str, battle_id: str, hours: int =
 
         # Process historical data
         process_start = time.time()
-        processed_history = []
-        for data in records:
-            members_with_names = []
-            for member in data.get("members", []):
-                if not member.get("UserID"):
-                    continue
-                    
-                user_id = str(member["UserID"])
-                user_info = usernames.get(user_id, {"name": "Unknown", "display_name": "Unknown"})
-                
-                members_with_names.append({
-                    "UserID": user_id,
-                    "username": user_info["name"],
-                    "display_name": user_info["display_name"],
-                    "points": member["Points"]
-                })
-
-            processed_history.append({
-                "timestamp": data.get("timestamp", datetime.datetime.now()),
-                "total_points": data.get("total_points", 0),
-                "is_active": data.get("is_active", False),
-                "members": members_with_names
-            })
+        if format == "compact":
+            response_data = build_compact_history(records, usernames)
+        else:
+            response_data = {"history": build_full_history(records, usernames, include_battle_id=False)}
         
         process_time = time.time() - process_start
         logger.info(f"Data processing took {process_time:.2f} seconds")
@@ -371,15 +537,256 @@ async def get_recent_member_history(clan_name: str, battle_id: str, hours: int =
         total_time = time.time() - start_time
         logger.info(f"Total recent history operation took {total_time:.2f} seconds")
         
-        return {
-            "clan_name": clan_name,
-            "history": processed_history
-        }
+        response_data["clan_name"] = clan_name
+        response_data["since"] = since
+        return FastJSONResponse(response_data)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Error in get_recent_member_history: %s", str(e))
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         if client:
-            client.close() 
\ No newline at end of file
+            client.close()
+
+# --- Member stats endpoint ---
+# Results keyed by (clan, battle, latest snapshot timestamp, period, hours); a new snapshot
+# changes the key, so entries are never stale; invalidate_member_caches only frees the slots.
+MEMBER_STATS_CACHE = OrderedDict()
+MEMBER_STATS_CACHE_SIZE = 128
+
+def invalidate_member_caches(clan_name=None, battle_id=None):
+    """
+    Drops cached member stats superseded by a new clan_members snapshot (called by the
+    change watcher), so the LRU holds current entries instead of keys no request will hit.
+    Without a clan_name every entry goes.
+    """
+    stale = [
+        key for key in list(MEMBER_STATS_CACHE)
+        if clan_name is None or (key[0] == clan_name and (battle_id is None or key[1] == battle_id))
+    ]
+    for key in stale:
+        MEMBER_STATS_CACHE.pop(key, None)
+    return len(stale)
+
+@app.get("/member-stats/{clan_name}")
+async def get_member_stats(
+    clan_name: str,
+    battle_id: str,
+    period: int = Query(60, gt=0, description="Points-gained period in minutes"),
+    hours: Optional[int] = Query(None, gt=0, description="History window in hours (default: whole battle)")
+):
+    """
+    Clan member stats computed server-side with NumPy: average points, points gained over
+    `period`, uptime for the 2/6/10-minute windows and the table's category classes.
+    """
+    logger.info(f"Received stats request - clan: {clan_name}, battle_id: {battle_id}, period: {period}, hours: {hours}")
+    client = None
+    try:
+        start_time = time.time()
+        client = MongoClient(MONGO_CONNECTION_STRING)
+        db = client[DB_NAME]
+        members_collection = db["clan_members"]
+
+        latest = members_collection.find_one(
+            {"clan_name": clan_name, "battle_id": battle_id},
+            {"timestamp": 1, "_id": 0},
+            sort=[("timestamp", pymongo.DESCENDING)]
+        )
+        if not latest:
+            logger.warning(f"No data found for clan: {clan_name}")
+            raise HTTPException(status_code=404, detail=f"No data found for clan {clan_name}")
+
+        cache_key = (clan_name, battle_id, latest.get("timestamp"), period, hours)
+        cached = MEMBER_STATS_CACHE.get(cache_key)
+        if cached is not None:
+            MEMBER_STATS_CACHE.move_to_end(cache_key)
+            logger.info(f"Serving cached member stats for {clan_name}")
+            return FastJSONResponse(cached)
+
+        query = {"clan_name": clan_name, "battle_id": battle_id}
+        if hours:
+            query["timestamp"] = {"$gte": datetime.datetime.utcnow() - datetime.timedelta(hours=hours)}
+        records = list(members_collection.find(
+            query,
+            {"timestamp": 1, "total_points": 1, "is_active": 1, "members": 1, "_id": 0},
+            sort=[("timestamp", pymongo.DESCENDING)]
+        ))
+        if not records:
+            # Window older than the newest snapshot; fall back to just the latest one
+            records = list(members_collection.find(
+                {"clan_name": clan_name, "battle_id": battle_id},
+                {"timestamp": 1, "total_points": 1, "is_active": 1, "members": 1, "_id": 0},
+                sort=[("timestamp", pymongo.DESCENDING)],
+                limit=1
+            ))
+
+        all_member_ids = {str(member["UserID"]) for member in records[0].get("members", []) if member.get("UserID")}
+        usernames = get_usernames_batch(list(all_member_ids), client)
+
+        # Build the snapshots x members matrix once (None -> NaN for absent members)
+        history = build_compact_history(records, usernames)
+        points = np.array(history["points"], dtype=float).reshape(len(records), len(history["members"]))
+        roster, per_member, summary = compute_member_stats(points, period)
+
+        members = []
+        for position, column in enumerate(roster):
+            member = dict(history["members"][column])
+            member.update({
+                "points": int(per_member["points"][position]),
+                "points_gained": int(per_member["points_gained"][position]),
+                "uptime": {f"{window}m": float(per_member["uptime"][window][position]) for window in UPTIME_WINDOWS},
+                "points_category": per_member["points_category"][position],
+                "gain_category": per_member["gain_category"][position],
+                "uptime_category": {f"{window}m": per_member["uptime_category"][window][position] for window in UPTIME_WINDOWS}
+            })
+            members.append(member)
+
+        response_data = {
+            "status": "ok",
+            "clan_name": clan_name,
+            "battle_id": battle_id,
+            "timestamp": latest.get("timestamp"),
+            "period_minutes": period,
+            "snapshot_count": len(records),
+            "stats": summary,
+            "members": members
+        }
+        MEMBER_STATS_CACHE[cache_key] = response_data
+        while len(MEMBER_STATS_CACHE) > MEMBER_STATS_CACHE_SIZE:
+            MEMBER_STATS_CACHE.popitem(last=False)
+
+        logger.info(f"Member stats for {clan_name} ({len(records)} snapshots x {len(members)} members) took {time.time() - start_time:.2f} seconds")
+        return FastJSONResponse(response_data)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_member_stats: {e}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if client:
+            client.close()
+
+# --- Member rank history endpoint ---
+@app.get("/member-rank-history/{clan_name}/{user_id}")
+async def get_member_rank_history(clan_name: str, user_id: str, battle_id: str):
+    """
+    A member's intra-clan rank at every snapshot of the battle, as parallel
+    `timestamps`/`ranks` arrays (oldest first). Ranks are assigned at ingest by
+    member_data_fetcher; battles recorded before that are ranked here on the fly.
+    """
+    logger.info(f"Received rank history request - clan: {clan_name}, user_id: {user_id}, battle_id: {battle_id}")
+    client = None
+    try:
+        client = MongoClient(MONGO_CONNECTION_STRING)
+        db = client[DB_NAME]
+
+        rank_doc = db["member_rank_history"].find_one(
+            {"clan_name": clan_name, "battle_id": battle_id, "user_id": user_id},
+            {"_id": 0, "timestamps": 1, "ranks": 1}
+        )
+        if rank_doc:
+            timestamps, ranks = rank_doc.get("timestamps", []), rank_doc.get("ranks", [])
+        else:
+            # Fallback for snapshots stored before ranks were recorded at ingest
+            logger.info(f"No stored rank history for {user_id} in {clan_name}, ranking snapshots")
+            timestamps, ranks = [], []
+            cursor = db["clan_members"].find(
+                {"clan_name": clan_name, "battle_id": battle_id},
+                {"_id": 0, "timestamp": 1, "members": 1},
+                sort=[("timestamp", pymongo.ASCENDING)]
+            )
+            for record in cursor:
+                for ranked_user_id, rank in rank_members(record.get("members", [])):
+                    if ranked_user_id == user_id:
+                        timestamps.append(record.get("timestamp"))
+                        ranks.append(rank)
+                        break
+
+        if not timestamps:
+            raise HTTPException(status_code=404, detail=f"No rank history found for member {user_id} in clan {clan_name}")
+
+        return FastJSONResponse({
+            "status": "ok",
+            "clan_name": clan_name,
+            "battle_id": battle_id,
+            "user_id": user_id,
+            "timestamps": timestamps,
+            "ranks": ranks
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_member_rank_history: {e}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if client:
+            client.close()
+
+# --- Member inactivity endpoint ---
+@app.get("/member-inactivity/{clan_name}")
+async def get_member_inactivity(
+    clan_name: str,
+    battle_id: str,
+    window: int = Query(SNAPSHOT_MINUTES, gt=0, description="Uptime window in minutes; members active within it count as 0"),
+    min_minutes: int = Query(0, ge=0, description="Only return members inactive for at least this many minutes"),
+    order: str = Query("desc", pattern="^(asc|desc)$", description="Sort by inactive minutes")
+):
+    """
+    Inactive minutes for every member in the clan's latest snapshot, read from the
+    activity state member_data_fetcher keeps at ingest (no history scan).
+    """
+    logger.info(f"Received inactivity request - clan: {clan_name}, battle_id: {battle_id}, window: {window}, min_minutes: {min_minutes}")
+    client = None
+    try:
+        client = MongoClient(MONGO_CONNECTION_STRING)
+        db = client[DB_NAME]
+
+        state = db["member_activity_state"].find_one(
+            {"clan_name": clan_name, "battle_id": battle_id},
+            {"_id": 0}
+        )
+        if not state:
+            raise HTTPException(status_code=404, detail=f"No activity state found for clan {clan_name}")
+
+        updated_at = state.get("updated_at")
+        members = []
+        for user_id, activity in state.get("members", {}).items():
+            # Only the current roster; members who left keep their state in case they return
+            if activity.get("last_seen") != updated_at:
+                continue
+            minutes = inactive_minutes(activity.get("streak", 0), activity.get("seen", 1), window)
+            if minutes < min_minutes:
+                continue
+            members.append({
+                "UserID": user_id,
+                "inactive_minutes": minutes,
+                "last_change": activity.get("last_change"),
+                "points": activity.get("points")
+            })
+        members.sort(key=lambda m: m["inactive_minutes"], reverse=(order == "desc"))
+
+        return FastJSONResponse({
+            "status": "ok",
+            "clan_name": clan_name,
+            "battle_id": battle_id,
+            "timestamp": updated_at,
+            "window": window,
+            "members": members
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_member_inactivity: {e}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if client:
+            client.close()
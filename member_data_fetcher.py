@@ -8,6 +8,10 @@ import logging
 from dotenv import load_dotenv
 from pymongo import MongoClient
 from pymongo.collection import Collection
+from pymongo.operations import UpdateOne
+from member_stats import rank_members
+import raw_archive
+import orjson
 import traceback
 import urllib3
 import json
@@ -59,6 +63,9 @@ session.mount("https://", adapter)
 
 # Load environment variables
 load_dotenv()
+import mongo_monitoring
+# Latency stats and slow-query logging for every MongoClient this process creates
+mongo_monitoring.install()
 
 # --- MongoDB Atlas Connection ---
 MONGO_CONNECTION_STRING = os.environ.get("MONGO_URI")
@@ -69,12 +76,23 @@ if not MONGO_CONNECTION_STRING:
 DB_NAME = "clan_dashboard_db"
 
 # --- API URLs ---
-CLANS_API_URL = "https://biggamesapi.io/api/clans?page=1&pageSize=250&sort=Points&sortOrder=desc"
-WAR_END_API_URL = "https://ps99.biggamesapi.io/api/activeClanBattle"
-CLAN_DETAILS_URL = "https://ps99.biggamesapi.io/api/clan/{}"
+# Base URLs are configurable so the fetchers can run against benchmarks.upstream_simulator
+BIGGAMES_API_URL = os.environ.get("BIGGAMES_API_URL", "https://biggamesapi.io")
+PS99_API_URL = os.environ.get("PS99_API_URL", "https://ps99.biggamesapi.io")
+CLANS_API_URL = f"{BIGGAMES_API_URL}/api/clans?page=1&pageSize=250&sort=Points&sortOrder=desc"
+WAR_END_API_URL = f"{PS99_API_URL}/api/activeClanBattle"
+CLAN_DETAILS_URL = f"{PS99_API_URL}/api/clan/{{}}"
 
-def make_request(url, timeout=30, method='GET', data=None):
-    """Make a request using the session with retries and better error handling."""
+# Clans whose member contributions are tracked (comma separated)
+TRACKED_CLANS = [name.strip() for name in os.environ.get("TRACKED_CLANS", "NONG,NXNG").split(",") if name.strip()]
+# Raw responses are archived under this stream when RAW_ARCHIVE_DIR is set (see raw_archive)
+ARCHIVE_STREAM = "member_fetcher"
+
+def make_request(url, timeout=30, method='GET', data=None, raw=False):
+    """
+    Make a request using the session with retries and better error handling.
+    With raw=True returns the response body bytes unparsed.
+    """
     try:
         for attempt in range(3):  # Try up to 3 times
             try:
@@ -84,6 +102,8 @@ def make_request(url, timeout=30, method='GET', data=None):
                     response = session.post(url, json=data, timeout=timeout)
                 
                 response.raise_for_status()
+                if raw:
+                    return response.content
                 
                 # Try to parse JSON response
                 try:
@@ -157,8 +177,22 @@ def fetch_member_data(clan_name):
     logger.info(f"Fetching member data for clan: {clan_name}")
     try:
         url = CLAN_DETAILS_URL.format(clan_name)
-        clan_data = make_request(url)
-        
+        # orjson decodes the whole battle history faster than a streaming parse can skip
+        # it (see benchmarks/member_parse_benchmark.py)
+        clan_data = orjson.loads(make_request(url, raw=True))
+        raw_archive.record(ARCHIVE_STREAM, "clan", clan_data, key=clan_name)
+        return parse_member_data(clan_name, clan_data, datetime.datetime.now())
+    except Exception as e:
+        logger.error(f"Error fetching member data for {clan_name}: {str(e)}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        return None
+
+def parse_member_data(clan_name, clan_data, timestamp):
+    """
+    Builds the clan_members document from a raw clan details response: the contributions
+    of the clan's newest battle. Returns None if the response has no usable battle.
+    """
+    try:
         if clan_data["status"] != "ok" or "data" not in clan_data:
             logger.error(f"Invalid API response for clan {clan_name}: {clan_data.get('status', 'unknown status')}")
             return None
@@ -192,14 +226,102 @@ def fetch_member_data(clan_name):
             "is_active": not latest_battle.get("ProcessedAwards", True),
             "total_points": latest_battle.get("Points", 0),
             "members": latest_battle.get("PointContributions", []),
-            "timestamp": datetime.datetime.now()
+            "timestamp": timestamp
         }
         
     except Exception as e:
-        logger.error(f"Error fetching member data for {clan_name}: {str(e)}")
+        logger.error(f"Error parsing member data for {clan_name}: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         return None
 
+def ensure_indexes(mongo_client):
+    """Creates the indexes used by the per-member collections maintained at ingest."""
+    try:
+        db = mongo_client[DB_NAME]
+        db["clan_members"].create_index(
+            [("clan_name", pymongo.ASCENDING), ("battle_id", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)]
+        )
+        db["member_rank_history"].create_index(
+            [("clan_name", pymongo.ASCENDING), ("battle_id", pymongo.ASCENDING), ("user_id", pymongo.ASCENDING)],
+            unique=True
+        )
+        db["member_activity_state"].create_index(
+            [("clan_name", pymongo.ASCENDING), ("battle_id", pymongo.ASCENDING)],
+            unique=True
+        )
+        logger.info("Ensured clan_members, member_rank_history and member_activity_state indexes")
+    except Exception as e:
+        logger.error(f"Error creating member indexes: {e}")
+
+def store_member_ranks(member_data, mongo_client):
+    """
+    Appends this snapshot's intra-clan rank to each member's rank history document,
+    so a member's full rank series is a single indexed read. A snapshot already in the
+    history (a retried cycle) is not appended again.
+    """
+    db = mongo_client[DB_NAME]
+    timestamp = member_data["timestamp"]
+    timestamps = {"$ifNull": ["$timestamps", []]}
+    recorded = {"$in": [timestamp, timestamps]}
+    updates = [
+        UpdateOne(
+            {"clan_name": member_data["clan_name"], "battle_id": member_data["battle_id"], "user_id": user_id},
+            [{"$set": {
+                "timestamps": {"$cond": [recorded, "$timestamps", {"$concatArrays": [timestamps, [timestamp]]}]},
+                "ranks": {"$cond": [recorded, "$ranks", {"$concatArrays": [{"$ifNull": ["$ranks", []]}, [rank]]}]}
+            }}],
+            upsert=True
+        )
+        for user_id, rank in rank_members(member_data.get("members", []))
+    ]
+    if updates:
+        db["member_rank_history"].bulk_write(updates, ordered=False)
+    return len(updates)
+
+def apply_member_activity(members_state, member_data):
+    """
+    Folds a snapshot into a clan's activity state in place: per member, the last points
+    value, when it last changed and how many consecutive snapshots it has stayed flat.
+    """
+    timestamp = member_data["timestamp"]
+    for member in member_data.get("members", []):
+        if not member.get("UserID"):
+            continue
+        user_id = str(member["UserID"])
+        points = member.get("Points", 0)
+        previous = members_state.get(user_id)
+        if previous is None:
+            members_state[user_id] = {
+                "points": points, "last_change": timestamp, "streak": 0, "seen": 1, "last_seen": timestamp
+            }
+        elif timestamp <= previous["last_seen"]:
+            continue  # Snapshot already applied
+        elif points != previous["points"]:
+            previous.update({"points": points, "last_change": timestamp, "streak": 0, "last_seen": timestamp})
+            previous["seen"] += 1
+        else:
+            previous["streak"] += 1
+            previous["seen"] += 1
+            previous["last_seen"] = timestamp
+    return members_state
+
+def update_member_activity(member_data, mongo_client):
+    """Applies a snapshot to the clan's stored activity state (see apply_member_activity)."""
+    db = mongo_client[DB_NAME]
+    state_collection = db["member_activity_state"]
+    query = {"clan_name": member_data["clan_name"], "battle_id": member_data["battle_id"]}
+    timestamp = member_data["timestamp"]
+
+    state = state_collection.find_one(query, {"_id": 0, "members": 1})
+    members_state = apply_member_activity(state.get("members", {}) if state else {}, member_data)
+
+    state_collection.replace_one(
+        query,
+        {**query, "updated_at": timestamp, "members": members_state},
+        upsert=True
+    )
+    return len(members_state)
+
 def store_member_data(member_data, mongo_client):
     """Stores member data in MongoDB."""
     if not member_data:
@@ -217,6 +339,18 @@ def store_member_data(member_data, mongo_client):
             
         result = members_collection.insert_one(member_data)
         logger.info(f"Successfully stored member data for {member_data['clan_name']} (battle: {member_data['battle_id']})")
+
+        # Rank members once here instead of in every browser that opens member details
+        try:
+            ranked_count = store_member_ranks(member_data, mongo_client)
+            logger.info(f"Stored ranks for {ranked_count} members of {member_data['clan_name']}")
+        except Exception as e:
+            logger.error(f"Error storing member ranks: {str(e)}")
+
+        try:
+            update_member_activity(member_data, mongo_client)
+        except Exception as e:
+            logger.error(f"Error updating member activity state: {str(e)}")
         return True
         
     except pymongo.errors.ServerSelectionTimeoutError:
@@ -231,20 +365,21 @@ def store_member_data(member_data, mongo_client):
         return False
 
 def get_specific_clans():
-    """Fetches data for NONG and NXNG clans."""
-    print("Fetching NONG and NXNG clan data..."); sys.stdout.flush()
+    """Fetches data for the tracked clans (TRACKED_CLANS, NONG and NXNG by default)."""
+    print(f"Fetching {', '.join(TRACKED_CLANS)} clan data..."); sys.stdout.flush()
     try:
         api_response = make_request(CLANS_API_URL)
+        raw_archive.record(ARCHIVE_STREAM, "clans", api_response)
         
         if isinstance(api_response, dict) and api_response.get("status") == "ok" and "data" in api_response:
             clan_list = api_response["data"]
             target_clans = []
             
-            # Find NONG and NXNG in the list
+            # Find the tracked clans in the list
             for clan in clan_list:
-                if clan.get("Name") in ["NONG", "NXNG"]:
+                if clan.get("Name") in TRACKED_CLANS:
                     target_clans.append(clan)
-                    if len(target_clans) == 2:  # Found both clans
+                    if len(target_clans) == len(TRACKED_CLANS):  # Found all clans
                         break
             
             print(f"Successfully found {len(target_clans)} target clans."); sys.stdout.flush()
@@ -287,6 +422,7 @@ def get_current_war_info():
     """Fetches current war timing and battle info from activeClanBattle API."""
     try:
         raw_data = make_request(WAR_END_API_URL)
+        raw_archive.record(ARCHIVE_STREAM, "activeClanBattle", raw_data)
         if raw_data and isinstance(raw_data, dict):
             data = raw_data.get("data", {})
             if isinstance(data, dict):
@@ -295,6 +431,7 @@ def get_current_war_info():
                     return {
                         "finish_time": datetime.datetime.fromtimestamp(config_data.get("FinishTime")),
                         "start_time": datetime.datetime.fromtimestamp(config_data.get("StartTime")),
+                        "start_time_unix": config_data.get("StartTime"),
                         "config_name": data.get("configName")  # This is the battle_id
                     }
         logger.error(f"Unexpected data structure from war API: {raw_data}")
@@ -357,8 +494,11 @@ def is_valid_battle_data(member_data, current_war_info, latest_battle_info):
 
     return True
 
-def store_new_battle(mongo_client, battle_id, start_time):
-    """Records a new battle in the battle_id_history collection."""
+def store_new_battle(mongo_client, battle_id, start_time, start_time_unix=None):
+    """
+    Records a new battle in the battle_id_history collection. `start_time` is local time;
+    `start_time_unix` keeps the StartTime epoch for readers working in UTC.
+    """
     try:
         db = mongo_client[DB_NAME]
         battle_collection = db["battle_id_history"]
@@ -370,6 +510,7 @@ def store_new_battle(mongo_client, battle_id, start_time):
                 "$set": {
                     "battle_id": battle_id,
                     "timestamp": start_time,
+                    "start_time_unix": start_time_unix,
                     "is_current": True
                 }
             },
@@ -390,6 +531,55 @@ def store_new_battle(mongo_client, battle_id, start_time):
         logger.error(f"Error storing new battle: {e}")
         return False
 
+def run_fetch_cycle(mongo_client):
+    """
+    One fetch cycle over the tracked clans. Returns the number of clans stored, or None
+    when there is no active war or the clan list could not be fetched.
+    """
+    # Get current war information
+    current_war_info = get_current_war_info()
+    if not current_war_info:
+        logger.warning("No active war information available")
+        return None
+
+    # Get latest known battle
+    latest_battle_info = get_latest_battle_info(mongo_client)
+
+    # Fetch and store member data for the tracked clans
+    target_clans = get_specific_clans()
+    if not target_clans:
+        logger.error("Failed to fetch target clans")
+        return None
+
+    stored = 0
+    for clan in target_clans:
+        clan_name = clan.get("Name")
+        if not clan_name:
+            continue
+
+        member_data = fetch_member_data(clan_name)
+        if not member_data:
+            continue
+
+        # Validate the data
+        if is_valid_battle_data(member_data, current_war_info, latest_battle_info):
+            # If this is a new battle, record it
+            if latest_battle_info is None or member_data["battle_id"] != latest_battle_info.get("battle_id"):
+                store_new_battle(mongo_client,
+                              member_data["battle_id"],
+                              current_war_info["start_time"],
+                              current_war_info["start_time_unix"])
+
+            # Store the member data
+            if store_member_data(member_data, mongo_client):
+                logger.info(f"Successfully stored member data for {clan_name}")
+                stored += 1
+            else:
+                logger.error(f"Failed to store member data for {clan_name}")
+        else:
+            logger.info(f"Skipping invalid or expired data for {clan_name}")
+    return stored
+
 def main(mongo_client=None, is_running=None):
     """Main execution function for the member data fetcher."""
     logger.info("Starting member data fetcher...")
@@ -403,52 +593,12 @@ def main(mongo_client=None, is_running=None):
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
             return
+    ensure_indexes(mongo_client)
     
     try:
         while is_running is None or is_running():
             try:
-                # Get current war information
-                current_war_info = get_current_war_info()
-                if not current_war_info:
-                    logger.warning("No active war information available")
-                    time.sleep(120)
-                    continue
-
-                # Get latest known battle
-                latest_battle_info = get_latest_battle_info(mongo_client)
-                
-                # Fetch and store member data for NONG and NXNG
-                target_clans = get_specific_clans()
-                if not target_clans:
-                    logger.error("Failed to fetch target clans")
-                    time.sleep(120)
-                    continue
-                    
-                for clan in target_clans:
-                    clan_name = clan.get("Name")
-                    if not clan_name:
-                        continue
-                        
-                    member_data = fetch_member_data(clan_name)
-                    if not member_data:
-                        continue
-
-                    # Validate the data
-                    if is_valid_battle_data(member_data, current_war_info, latest_battle_info):
-                        # If this is a new battle, record it
-                        if latest_battle_info is None or member_data["battle_id"] != latest_battle_info.get("battle_id"):
-                            store_new_battle(mongo_client, 
-                                          member_data["battle_id"],
-                                          current_war_info["start_time"])
-                        
-                        # Store the member data
-                        if store_member_data(member_data, mongo_client):
-                            logger.info(f"Successfully stored member data for {clan_name}")
-                        else:
-                            logger.error(f"Failed to store member data for {clan_name}")
-                    else:
-                        logger.info(f"Skipping invalid or expired data for {clan_name}")
-
+                run_fetch_cycle(mongo_client)
                 time.sleep(120)  # 2 minute wait between cycles
 
             except pymongo.errors.ServerSelectionTimeoutError:
@@ -377,10 +377,10 @@ function createActivityTimeline(memberHistory) {
     return chart;
 }
 
-function createRankHistoryChart(historyData) {
+function createRankHistoryChart(rankHistory) {
     const ctx = document.getElementById('rank-history-chart').getContext('2d');
     
-    if (!historyData?.length) {
+    if (!rankHistory?.length) {
         return new Chart(ctx, {
             type: 'line',
             data: { datasets: [{ data: [] }] },
@@ -397,14 +397,10 @@ function createRankHistoryChart(historyData) {
         });
     }
 
-    const data = historyData.map(record => {
-        const members = record.members.sort((a, b) => b.points - a.points);
-        const rank = members.findIndex(m => m.UserID === userId) + 1;
-        return {
-            x: new Date(record.timestamp),
-            y: rank
-        };
-    });
+    const data = rankHistory.map(point => ({
+        x: new Date(point.timestamp),
+        y: point.rank
+    }));
 
     return new Chart(ctx, {
         type: 'line',
@@ -765,6 +761,32 @@ function createPointsHistoryChart(memberHistory) {
 }
 
 // --- Data Fetching Functions ---
+// Expand a dictionary-encoded (format=compact) history response into the per-snapshot shape
+function expandCompactHistory(data) {
+    if (!data || data.format !== 'compact') return data;
+    const history = data.timestamps.map((timestamp, row) => {
+        const members = [];
+        data.points[row].forEach((points, index) => {
+            if (points === null) return; // Member absent from this snapshot
+            const member = data.members[index];
+            members.push({
+                UserID: member.UserID,
+                username: member.username,
+                display_name: member.display_name,
+                points: points
+            });
+        });
+        return {
+            timestamp: timestamp,
+            total_points: data.total_points[row],
+            is_active: data.is_active[row],
+            battle_id: data.battle_id,
+            members: members
+        };
+    });
+    return { ...data, history: history };
+}
+
 async function fetchMemberData() {
     try {
         // Include battle_id query so the tracking API doesn't 422
@@ -791,6 +813,7 @@ async function fetchMemberHistory(userId = null) {
             console.log('Adding battle_id to params:', battle);
             params.append('battle_id', battle);
         }
+        params.append('format', 'compact');
         
         const queryString = params.toString();
         const url = `${API_BASE_URL}/api/member/member-history/${clan}${queryString ? '?' + queryString : ''}`;
@@ -798,7 +821,7 @@ async function fetchMemberHistory(userId = null) {
         
         const response = await fetch(url);
         if (!response.ok) throw new Error('Failed to fetch member history');
-        const data = await response.json();
+        const data = expandCompactHistory(await response.json());
         console.log('Received history data:', {
             totalRecords: data.history.length,
             sampleRecord: data.history[0],
@@ -811,13 +834,30 @@ async function fetchMemberHistory(userId = null) {
     }
 }
 
+async function fetchRankHistory() {
+    try {
+        const response = await fetch(
+            `${API_BASE_URL}/api/member/member-rank-history/${clan}/${userId}?battle_id=${battle}`
+        );
+        if (!response.ok) throw new Error('Failed to fetch rank history');
+        const data = await response.json();
+        return data.timestamps.map((timestamp, i) => ({
+            timestamp: new Date(timestamp),
+            rank: data.ranks[i]
+        }));
+    } catch (error) {
+        console.error('Error fetching rank history:', error);
+        return null;
+    }
+}
+
 async function fetchFullHistory() {
     try {
         const response = await fetch(
-            `${API_BASE_URL}/api/member/member-history/${clan}?battle_id=${battle}`
+            `${API_BASE_URL}/api/member/member-history/${clan}?battle_id=${battle}&format=compact`
         );
         if (!response.ok) throw new Error('Failed to fetch full history');
-        const data = await response.json();
+        const data = expandCompactHistory(await response.json());
         return data;
     } catch (error) {
         console.error('Error fetching full history:', error);
@@ -1077,17 +1117,21 @@ async function loadRankHistory() {
         button.disabled = true;
         button.textContent = 'Loading...';
 
-        // Fetch full history if not cached
-        if (!fullHistoryData) {
-            fullHistoryData = await fetchFullHistory();
+        // Ranks are precomputed server-side; fall back to ranking the full history locally
+        let rankHistory = await fetchRankHistory();
+        if (!rankHistory) {
             if (!fullHistoryData) {
-                throw new Error('Failed to fetch full history');
+                fullHistoryData = await fetchFullHistory();
+                if (!fullHistoryData) {
+                    throw new Error('Failed to fetch full history');
+                }
             }
+            rankHistory = calculateRankHistory(fullHistoryData.history, userId);
         }
 
         // Create or update rank history chart
         if (rankHistoryChart) rankHistoryChart.destroy();
-        rankHistoryChart = createRankHistoryChart(fullHistoryData.history);
+        rankHistoryChart = createRankHistoryChart(rankHistory);
 
         // Change button to refresh button
         button.textContent = 'Refresh Rank History';
@@ -1,5 +1,6 @@
 // --- Constants ---
 const UPDATE_INTERVAL = 120000; // 2 minutes in milliseconds
+const RECENT_HISTORY_HOURS = 24; // Window kept by the incremental recent-history refresh
 const LOADING_PLACEHOLDER = '<span class="loading-spinner"></span>';
 
 // const API_BASE_URL = "http://127.0.0.1:8000"; // Local combined API server
@@ -24,12 +25,14 @@ let currentClan = null;
 let currentBattle = null;
 let cachedMemberData = null;
 let cachedHistoryData = null;
+let recentHistoryCache = null;  // { key: 'clan|battle', data } for incremental /recent fetches
 let selectedUptimeWindow = 2;
 let selectedTimePeriod = 60;  // Default to 60 minutes (1h)
 let uptimeCache = {};
 let isInitialLoad = true;
 let lastFullHistoryFetch = null;
 let lastUptimeValues = new Map();
+let lastInactiveValues = new Map();  // UserID -> inactive minutes from /member-inactivity
 let currentMembers = [];
 let memberHistory = new Map();
 let lastUptimeCalculation = null;  // Track when we last calculated uptimes
@@ -204,6 +207,7 @@ async function handleBattleChange() {
         // Clear all uptime caches when battle changes
         uptimeCache = {};
         lastUptimeValues = new Map();
+        lastInactiveValues = new Map();
         lastUptimeCalculation = null;  // Force recalculation for new battle
         
         // Calculate uptime for each member
@@ -239,6 +243,78 @@ async function handleBattleChange() {
 }
 
 // --- Data Fetching Functions ---
+// Expand a dictionary-encoded (format=compact) history response into the per-snapshot shape
+function expandCompactHistory(data) {
+    if (!data || data.format !== 'compact') return data;
+    const history = data.timestamps.map((timestamp, row) => {
+        const members = [];
+        data.points[row].forEach((points, index) => {
+            if (points === null) return; // Member absent from this snapshot
+            const member = data.members[index];
+            members.push({
+                UserID: member.UserID,
+                username: member.username,
+                display_name: member.display_name,
+                points: points
+            });
+        });
+        return {
+            timestamp: timestamp,
+            total_points: data.total_points[row],
+            is_active: data.is_active[row],
+            battle_id: data.battle_id,
+            members: members
+        };
+    });
+    return { ...data, history: history };
+}
+
+// Server-computed stats, uptime and categories (null on failure so callers can compute locally)
+async function fetchMemberStats(clanName, hours = 24) {
+    try {
+        const response = await fetch(`${API_BASE_URL}/api/member/member-stats/${clanName}?battle_id=${currentBattle}&period=${selectedTimePeriod}&hours=${hours}`);
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+        return await response.json();
+    } catch (error) {
+        console.error(`Error fetching member stats for ${clanName}:`, error);
+        return null;
+    }
+}
+
+// Apply /member-stats results to the stats panel and uptime cache
+function applyServerStats(statsData) {
+    const windowKey = `${selectedUptimeWindow}m`;
+    statsData.members.forEach(member => {
+        lastUptimeValues.set(member.UserID, member.uptime[windowKey]);
+    });
+    updateStatsDisplay({
+        avgPoints: statsData.stats.avg_points,
+        clanPointsHour: statsData.stats.clan_points_period,
+        avgPointsHour: statsData.stats.avg_points_period,
+        avgUptime: statsData.stats.avg_uptime[windowKey],
+        activeCount: statsData.stats.active_count
+    });
+}
+
+async function fetchMemberInactivity(clanName) {
+    try {
+        const response = await fetch(`${API_BASE_URL}/api/member/member-inactivity/${clanName}?battle_id=${currentBattle}&window=${selectedUptimeWindow}`);
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+        return await response.json();
+    } catch (error) {
+        console.error(`Error fetching member inactivity for ${clanName}:`, error);
+        return null;
+    }
+}
+
+// Server-tracked inactivity when available, otherwise scan the cached history
+function getInactiveTime(userId) {
+    if (lastInactiveValues.has(userId)) {
+        return lastInactiveValues.get(userId);
+    }
+    return calculateInactiveTime(cachedHistoryData, userId, selectedUptimeWindow);
+}
+
 async function fetchMemberData(clanName) {
     try {
         console.log(`Fetching member data for clan: ${clanName}`);
@@ -265,18 +341,24 @@ async function fetchRecentHistory(clanName) {
     const startTime = performance.now();
     try {
         console.log(`[Timing] Starting recent history fetch for ${clanName}`);
-        const response = await fetch(`${API_BASE_URL}/api/member/member-history/${clanName}/recent?hours=24&battle_id=${currentBattle}`);
+        // Only ask for snapshots newer than the cached window for this clan and battle
+        const cacheKey = `${clanName}|${currentBattle}`;
+        const cached = recentHistoryCache?.key === cacheKey ? recentHistoryCache.data : null;
+        const since = cached ? `&since=${encodeURIComponent(cached.history[0].timestamp)}` : '';
+        const response = await fetch(`${API_BASE_URL}/api/member/member-history/${clanName}/recent?hours=${RECENT_HISTORY_HOURS}&battle_id=${currentBattle}&format=compact${since}`);
         
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
 
-        const data = await response.json();
-        console.log(`[Timing] Records received: ${data.history?.length || 0}`);
-        
+        const newData = expandCompactHistory(await response.json());
+        console.log(`[Timing] Records received: ${newData.history?.length || 0}`);
+
+        const data = cached ? appendRecentHistory(cached, newData) : newData;
         if (!data || !data.history || data.history.length === 0) {
             throw new Error('No history data received');
         }
+        recentHistoryCache = { key: cacheKey, data: data };
 
         const endTime = performance.now();
         console.log(`[Timing] History data fetch took ${(endTime - startTime).toFixed(1)}ms`);
@@ -287,15 +369,26 @@ async function fetchRecentHistory(clanName) {
     }
 }
 
+// Prepends newer snapshots (both newest first) and drops those outside the recent window
+function appendRecentHistory(cached, newData) {
+    if (!newData?.history?.length) return cached;
+    const newestTime = new Date(newData.history[0].timestamp).getTime();
+    const cutoff = newestTime - RECENT_HISTORY_HOURS * 60 * 60 * 1000;
+    const history = newData.history.concat(
+        cached.history.filter(record => new Date(record.timestamp).getTime() >= cutoff)
+    );
+    return { ...cached, history: history };
+}
+
 async function fetchMemberHistory(clanName, battleId = null) {
     try {
         console.log(`Fetching history for clan: ${clanName}` + (battleId ? ` and battle: ${battleId}` : ''));
-        const url = `${API_BASE_URL}/api/member/member-history/${clanName}` + (battleId ? `?battle_id=${battleId}` : '');
+        const url = `${API_BASE_URL}/api/member/member-history/${clanName}?format=compact` + (battleId ? `&battle_id=${battleId}` : '');
         const response = await fetch(url);
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
-        const data = await response.json();
+        const data = expandCompactHistory(await response.json());
         console.log('History data received:', {
             recordCount: data.history.length,
             battleId: data.battle_id,
@@ -332,8 +425,8 @@ function sortMembers(members, column, pointGains) {
                 comparison = b.points - a.points;
                 break;
             case 'inactive':
-                const inactiveA = calculateInactiveTime(cachedHistoryData, a.UserID, selectedUptimeWindow) || 0;
-                const inactiveB = calculateInactiveTime(cachedHistoryData, b.UserID, selectedUptimeWindow) || 0;
+                const inactiveA = getInactiveTime(a.UserID) || 0;
+                const inactiveB = getInactiveTime(b.UserID) || 0;
                 comparison = inactiveA - inactiveB;
                 break;
             case 'uptime':
@@ -408,7 +501,7 @@ function renderMemberTable(memberData, pointGains = {}) {
     memberTableBody.innerHTML = sortedMembers.map((member, index) => {
         const pointGain = pointGains.get(member.UserID);
         const uptimeValue = lastUptimeValues.get(member.UserID);
-        const inactiveTime = calculateInactiveTime(cachedHistoryData, member.UserID, selectedUptimeWindow);
+        const inactiveTime = getInactiveTime(member.UserID);
         
         // Calculate rank based on points (always show points-based rank)
         const rank = memberData.members
@@ -727,6 +820,8 @@ uptimeWindowInputs.forEach(input => {
     input.addEventListener('change', (e) => {
         selectedUptimeWindow = parseInt(e.target.value);
         console.log(`Uptime window changed to ${selectedUptimeWindow}m`);
+        // Server inactivity depends on the window; scan locally until the next refresh
+        lastInactiveValues = new Map();
         
         if (currentClan && cachedMemberData && cachedHistoryData) {
             // Clear cache only for the previous window size
@@ -784,9 +879,21 @@ document.addEventListener('DOMContentLoaded', async () => {
             cachedHistoryData = recentHistoryData;
             const battleMembers = cachedMemberData.members.filter(m => m.battle_id === currentBattle);
             const pointGains = calculatePointGains({ ...cachedMemberData, members: battleMembers }, recentHistoryData);
+            // Prefer server-side stats (one cached computation per snapshot) over recomputing here
+            const [statsData, inactivityData] = await Promise.all([
+                fetchMemberStats(currentClan),
+                fetchMemberInactivity(currentClan)
+            ]);
+            lastInactiveValues = new Map(
+                (inactivityData?.members || []).map(member => [member.UserID, member.inactive_minutes])
+            );
+            if (statsData?.members) {
+                applyServerStats(statsData);
+            } else {
+                const stats = calculateStats({ ...cachedMemberData, members: battleMembers }, recentHistoryData, selectedUptimeWindow);
+                updateStatsDisplay(stats);
+            }
             renderMemberTable({ ...cachedMemberData, members: battleMembers }, pointGains);
-            const stats = calculateStats({ ...cachedMemberData, members: battleMembers }, recentHistoryData, selectedUptimeWindow);
-            updateStatsDisplay(stats);
             lastUpdatedElement.textContent = `Last updated: ${new Date().toLocaleTimeString()}`;
         } catch (error) {
             console.error('Error during recent-history auto-refresh:', error);
@@ -0,0 +1,154 @@
+"""
+Vectorized clan member statistics.
+
+Ports the browser-side calculations in member_script.js (calculateStats,
+calculatePointGains, calculateMemberUptime, calculatePointStats, getValueCategory and
+getUptimeCategory) to NumPy. Inputs are a snapshots x members points matrix, newest
+snapshot first, with NaN where a member was absent from a snapshot.
+"""
+import numpy as np
+
+UPTIME_WINDOWS = (2, 6, 10)
+SNAPSHOT_MINUTES = 2
+
+
+def compact_columns(points):
+    """
+    Moves each member's present values to the top of their column, keeping order.
+
+    Returns the compacted matrix (NaN tail) and the number of present values per member,
+    which matches the JS code building a member's series only from snapshots they are in.
+    """
+    missing = np.isnan(points)
+    order = np.argsort(missing, axis=0, kind="stable")
+    return np.take_along_axis(points, order, axis=0), (~missing).sum(axis=0)
+
+
+def uptime_percentages(compacted, counts, window_minutes):
+    """Share of consecutive pairs (2m) or complete blocks (6m/10m) in which points changed."""
+    snapshots, members = compacted.shape
+    uptime = np.zeros(members)
+    if snapshots < 2:
+        return uptime
+
+    if window_minutes == SNAPSHOT_MINUTES:
+        changed = compacted[:-1] != compacted[1:]
+        valid = np.arange(snapshots - 1)[:, None] < (counts - 1)[None, :]
+        totals = np.maximum(counts - 1, 0)
+    else:
+        block_size = window_minutes // SNAPSHOT_MINUTES
+        blocks = snapshots // block_size
+        if blocks == 0:
+            return uptime
+        starts = compacted[0:blocks * block_size:block_size]
+        ends = compacted[block_size - 1:blocks * block_size:block_size]
+        changed = starts != ends
+        totals = counts // block_size
+        valid = np.arange(blocks)[:, None] < totals[None, :]
+
+    active = (changed & valid).sum(axis=0)
+    has_series = (counts >= 2) & (totals > 0)
+    np.divide(active * 100.0, totals, out=uptime, where=has_series)
+    return uptime
+
+
+def point_gains(points, period_minutes):
+    """
+    Gain over the period per member present in the newest snapshot.
+
+    Like calculatePointGains, a missing (or zero) starting value counts as no gain.
+    """
+    target_index = min(period_minutes // SNAPSHOT_MINUTES, points.shape[0] - 1)
+    end = points[0]
+    start = points[target_index]
+    start = np.where(np.isnan(start) | (start == 0), end, start)
+    return end - start
+
+
+def value_categories(values):
+    """getValueCategory for every value against the population mean/std dev of the values."""
+    mean = float(values.mean()) if values.size else 0.0
+    std_dev = float(values.std()) if values.size else 0.0
+    if not std_dev:
+        return np.full(values.shape, "", dtype=object), mean, std_dev
+    z_scores = (values - mean) / std_dev
+    categories = np.select(
+        [z_scores > 1, z_scores >= -0.5, z_scores >= -1],
+        ["points-exceptional", "points-acceptable", "points-underperforming"],
+        default="points-unacceptable"
+    ).astype(object)
+    return categories, mean, std_dev
+
+
+def uptime_categories(uptime):
+    return np.select(
+        [uptime >= 98, uptime >= 90, uptime >= 75],
+        ["points-exceptional", "points-acceptable", "points-underperforming"],
+        default="points-unacceptable"
+    ).astype(object)
+
+
+def compute_member_stats(points, period_minutes=60):
+    """
+    Computes clan stats, per-member gains, uptime for every window and category classes.
+
+    Only members present in the newest snapshot are reported (the current roster).
+    Returns (roster column indices, per-member arrays, clan summary).
+    """
+    points = np.asarray(points, dtype=float)
+    if points.ndim != 2 or points.shape[0] == 0:
+        return np.array([], dtype=int), {}, {}
+
+    roster = np.flatnonzero(~np.isnan(points[0]))
+    points = points[:, roster]
+    current = points[0]
+    gains = point_gains(points, period_minutes)
+
+    compacted, counts = compact_columns(points)
+    uptime = {window: uptime_percentages(compacted, counts, window) for window in UPTIME_WINDOWS}
+
+    points_categories, points_mean, points_std = value_categories(current)
+    gain_categories, gain_mean, gain_std = value_categories(gains)
+
+    member_count = len(roster)
+    clan_points_period = float(gains.sum())
+    summary = {
+        "avg_points": float(current.mean()) if member_count else 0.0,
+        "clan_points_period": clan_points_period,
+        "avg_points_period": clan_points_period / member_count if member_count else 0.0,
+        "avg_uptime": {f"{window}m": float(values.mean()) if member_count else 0.0 for window, values in uptime.items()},
+        "active_count": int((gains > 0).sum()),
+        "point_stats": {"mean": points_mean, "std_dev": points_std},
+        "gain_stats": {"mean": gain_mean, "std_dev": gain_std}
+    }
+    per_member = {
+        "points": current,
+        "points_gained": gains,
+        "uptime": uptime,
+        "points_category": points_categories,
+        "gain_category": gain_categories,
+        "uptime_category": {window: uptime_categories(values) for window, values in uptime.items()}
+    }
+    return roster, per_member, summary
+
+
+def rank_members(members):
+    """
+    Returns (user_id, rank) pairs by points, highest first. Ties keep API order, matching
+    the stable sort member_details.js used to rank members in the browser.
+    """
+    valid = [m for m in members if m.get("UserID")]
+    ordered = sorted(valid, key=lambda m: m.get("Points", 0), reverse=True)
+    return [(str(member["UserID"]), rank) for rank, member in enumerate(ordered, 1)]
+
+
+def inactive_minutes(streak, seen, window_minutes=SNAPSHOT_MINUTES):
+    """
+    calculateInactiveTime from a member's activity state: minutes their points have been
+    flat, or 0 if they changed within the newest window. `streak` is the number of
+    consecutive unchanged snapshots and `seen` the number of snapshots recorded.
+    """
+    block_size = max(window_minutes // SNAPSHOT_MINUTES, 1)
+    if streak < min(block_size, seen - 1):
+        return 0
+    return streak * SNAPSHOT_MINUTES
@@ -0,0 +1,227 @@
+"""
+Process-wide MongoDB command monitoring.
+
+install() registers a pymongo CommandListener for every MongoClient the process creates
+afterwards (fetchers, API servers, per-request clients alike). It keeps per
+(collection, operation) latency stats, logs commands slower than SLOW_QUERY_MS with their
+filter shape (values replaced by type names), and for each new slow query shape runs
+explain("executionStats") once on a background thread, so the plan behind a slow shape is
+on hand without reproducing it. combined_api_server exposes report() at /admin/mongo-stats.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+from pymongo import MongoClient, monitoring
+
+logger = logging.getLogger(__name__)
+
+MONGO_MONITORING = os.environ.get("MONGO_MONITORING", "1") not in ("0", "false", "off")
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "200"))
+# How often fetcher processes (which have no admin endpoint) log a stats summary
+MONGO_STATS_LOG_SECONDS = float(os.environ.get("MONGO_STATS_LOG_SECONDS", "900"))
+LATENCY_SAMPLES = 1024  # Recent latencies kept per (collection, operation) for percentiles
+SLOW_LOG_SIZE = 100
+MAX_EXPLAINED_SHAPES = 200
+
+# Commands whose first field names the collection
+COLLECTION_COMMANDS = {
+    "find", "aggregate", "count", "distinct", "insert", "update", "delete", "findAndModify",
+    "createIndexes", "listIndexes"
+}
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct"}
+# Parts of an explainable command that make up its shape
+SHAPE_FIELDS = ("filter", "sort", "projection", "pipeline", "query", "key")
+# Server-added fields an explained command must not carry
+SESSION_FIELDS = {"lsid", "$db", "$clusterTime", "txnNumber", "$readPreference", "readConcern", "cursor"}
+
+
+def query_shape(value):
+    """The value with field names and operators kept and literals replaced by type names."""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = query_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return type(value).__name__
+
+
+def _command_collection(event):
+    if event.command_name == "getMore":
+        return event.command.get("collection")
+    if event.command_name in COLLECTION_COMMANDS:
+        collection = event.command.get(event.command_name)
+        return collection if isinstance(collection, str) else None
+    return None
+
+
+class CommandMonitor(monitoring.CommandListener):
+    def __init__(self, slow_ms=SLOW_QUERY_MS):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._pending = {}  # request_id -> (collection, operation, shape, command)
+        self._stats = {}  # (collection, operation) -> dict
+        self.slow_log = deque(maxlen=SLOW_LOG_SIZE)
+        self.explains = OrderedDict()  # shape key -> explain summary
+        self._explain_queue = queue.Queue(maxsize=50)
+        self._explain_thread = None
+        self._explain_client = None
+        self._last_summary = time.monotonic()
+
+    # --- listener callbacks (called on the thread running the command; must stay cheap) ---
+    def started(self, event):
+        collection = _command_collection(event)
+        if collection is None:
+            return
+        shape, command = None, None
+        if event.command_name in EXPLAINABLE_COMMANDS:
+            # Sort and projection values (directions, inclusion) are part of the shape
+            shape = repr({
+                field: event.command[field] if field in ("sort", "projection") else query_shape(event.command[field])
+                for field in SHAPE_FIELDS if field in event.command
+            })
+            command = event.command
+        with self._lock:
+            self._pending[event.request_id] = (f"{event.database_name}.{collection}", event.command_name, shape, command)
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed):
+        with self._lock:
+            pending = self._pending.pop(event.request_id, None)
+        if pending is None:
+            return
+        namespace, operation, shape, command = pending
+        ms = event.duration_micros / 1000
+        with self._lock:
+            stats = self._stats.setdefault((namespace, operation), {
+                "count": 0, "failures": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0,
+                "samples": deque(maxlen=LATENCY_SAMPLES)
+            })
+            stats["count"] += 1
+            stats["failures"] += failed
+            stats["total_ms"] += ms
+            stats["max_ms"] = max(stats["max_ms"], ms)
+            stats["samples"].append(ms)
+            slow = ms >= self.slow_ms
+            if slow:
+                stats["slow"] += 1
+        if slow:
+            self._record_slow(namespace, operation, shape, command, ms)
+        if MONGO_STATS_LOG_SECONDS and time.monotonic() - self._last_summary >= MONGO_STATS_LOG_SECONDS:
+            self._last_summary = time.monotonic()
+            logger.info(f"MongoDB command stats: {self.summary_line()}")
+
+    def _record_slow(self, namespace, operation, shape, command, ms):
+        logger.warning(f"Slow MongoDB {operation} on {namespace}: {ms:.0f} ms, shape {shape}")
+        self.slow_log.append({
+            "at": time.time(), "namespace": namespace, "operation": operation, "ms": round(ms, 1), "shape": shape
+        })
+        if command is None:
+            return
+        key = f"{namespace} {operation} {shape}"
+        with self._lock:
+            if key in self.explains or len(self.explains) >= MAX_EXPLAINED_SHAPES:
+                return
+            self.explains[key] = None  # Claimed; filled in by the explain thread
+        try:
+            self._explain_queue.put_nowait((key, namespace.split(".", 1)[0], command))
+        except queue.Full:
+            with self._lock:
+                self.explains.pop(key, None)
+            return
+        self._ensure_explain_thread()
+
+    # --- explain capture (never from a listener callback: it would run a command) ---
+    def _ensure_explain_thread(self):
+        with self._lock:
+            if self._explain_thread is None:
+                self._explain_thread = threading.Thread(target=self._explain_loop, name="mongo-explain", daemon=True)
+                self._explain_thread.start()
+
+    def _explain_loop(self):
+        while True:
+            key, db_name, command = self._explain_queue.get()
+            try:
+                if self._explain_client is None:
+                    self._explain_client = MongoClient(os.environ["MONGO_URI"], maxPoolSize=1, serverSelectionTimeoutMS=5000)
+                explained = {field: value for field, value in command.items() if field not in SESSION_FIELDS}
+                if "pipeline" in explained:
+                    explained["cursor"] = {}
+                result = self._explain_client[db_name].command("explain", explained, verbosity="executionStats")
+                summary = summarize_explain(result)
+            except Exception as e:
+                summary = {"error": str(e) or type(e).__name__}
+            with self._lock:
+                self.explains[key] = summary
+            logger.info(f"Explained slow shape {key}: {summary}")
+
+    # --- reporting ---
+    def report(self):
+        with self._lock:
+            stats = {key: dict(value, samples=np.array(value["samples"])) for key, value in self._stats.items()}
+            explains = [{"shape": key, "explain": value} for key, value in self.explains.items()]
+            slow_log = list(self.slow_log)
+        commands = []
+        for (namespace, operation), value in sorted(stats.items(), key=lambda item: -item[1]["total_ms"]):
+            samples = value["samples"]
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99]) if len(samples) else (0, 0, 0)
+            commands.append({
+                "namespace": namespace, "operation": operation, "count": value["count"],
+                "failures": value["failures"], "slow": value["slow"],
+                "mean_ms": round(value["total_ms"] / value["count"], 2), "max_ms": round(value["max_ms"], 1),
+                "p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2)
+            })
+        return {"slow_query_ms": self.slow_ms, "commands": commands, "slow_queries": slow_log[::-1], "explains": explains}
+
+    def summary_line(self, top=5):
+        commands = self.report()["commands"][:top]
+        return ", ".join(
+            f"{c['operation']} {c['namespace']} n={c['count']} p95={c['p95_ms']}ms slow={c['slow']}" for c in commands
+        )
+
+
+def summarize_explain(result):
+    """The parts of an executionStats explain that say why a query is slow."""
+    stats = result.get("executionStats") or {}
+    if not stats and result.get("stages"):
+        # Aggregations nest the query's explain under the first ($cursor) stage
+        stats = (result["stages"][0].get("$cursor") or {}).get("executionStats") or {}
+    planner = result.get("queryPlanner") or ((result.get("stages") or [{}])[0].get("$cursor") or {}).get("queryPlanner") or {}
+    stages = []
+    plan = planner.get("winningPlan") or {}
+    while plan:
+        stages.append(f"{plan.get('stage')} {plan['indexName']}" if plan.get("indexName") else str(plan.get("stage")))
+        plan = plan.get("inputStage") or plan.get("queryPlan") or {}
+    return {
+        "winning_plan": " <- ".join(stages),
+        "n_returned": stats.get("nReturned"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "execution_ms": stats.get("executionTimeMillis")
+    }
+
+
+command_monitor = CommandMonitor()
+_installed = False
+
+
+def install():
+    """Registers the monitor for MongoClients created from now on (once per process)."""
+    global _installed
+    if _installed or not MONGO_MONITORING:
+        return
+    monitoring.register(command_monitor)
+    _installed = True
@@ -0,0 +1,168 @@
+"""
+Append-only archive of raw upstream API responses.
+
+The fetchers only keep the fields they derive (clans, clan_members, snapshots), so past
+battles cannot be recomputed when the derivation changes. With RAW_ARCHIVE_DIR set, every
+raw response is appended here and rebuild_battle.py can replay a battle through the ingest
+code.
+
+Layout: <RAW_ARCHIVE_DIR>/<stream>/<start_ms>.zst plus a <start_ms>.idx time index. Each
+record is its own zstd frame, so a reader can decompress any record alone and a crash
+mid-write only loses the last record. Index lines are tab separated:
+    fetched_at (unix seconds)  byte offset  frame length  source  key
+A new segment is started when the current one passes RAW_ARCHIVE_SEGMENT_BYTES and every
+time a fetcher process starts.
+"""
+import logging
+import os
+import threading
+import time
+
+import orjson
+
+try:
+    import zstandard
+except ImportError:  # Optional: archiving is disabled without it
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Directory holding one sub-directory per stream; archiving is disabled when unset
+RAW_ARCHIVE_DIR = os.environ.get("RAW_ARCHIVE_DIR")
+RAW_ARCHIVE_SEGMENT_BYTES = int(os.environ.get("RAW_ARCHIVE_SEGMENT_BYTES", str(256 * 1024 * 1024)))
+RAW_ARCHIVE_ZSTD_LEVEL = int(os.environ.get("RAW_ARCHIVE_ZSTD_LEVEL", "9"))
+
+
+class RawArchiveWriter:
+    """Appends records to one stream's segment log. Safe to share between threads."""
+
+    def __init__(self, directory, stream, segment_bytes=RAW_ARCHIVE_SEGMENT_BYTES, level=RAW_ARCHIVE_ZSTD_LEVEL):
+        self.path = os.path.join(directory, stream)
+        self.segment_bytes = segment_bytes
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._lock = threading.Lock()
+        self._segment = None
+        self._index = None
+        os.makedirs(self.path, exist_ok=True)
+
+    def _open_segment(self, fetched_at):
+        self.close()
+        name = str(int(fetched_at * 1000))
+        self._segment = open(os.path.join(self.path, f"{name}.zst"), "ab")
+        self._index = open(os.path.join(self.path, f"{name}.idx"), "a", encoding="utf-8")
+
+    def append(self, source, payload, key=None, fetched_at=None):
+        """Compresses and appends one raw response; returns the compressed size."""
+        fetched_at = fetched_at or time.time()
+        frame = self._compressor.compress(orjson.dumps({
+            "fetched_at": fetched_at, "source": source, "key": key, "payload": payload
+        }))
+        with self._lock:
+            if self._segment is None or self._segment.tell() >= self.segment_bytes:
+                self._open_segment(fetched_at)
+            offset = self._segment.tell()
+            self._segment.write(frame)
+            self._segment.flush()
+            # The index line goes last: an indexed record is always complete on disk
+            self._index.write(f"{fetched_at:.3f}\t{offset}\t{len(frame)}\t{source}\t{key or ''}\n")
+            self._index.flush()
+        return len(frame)
+
+    def close(self):
+        for handle in (self._segment, self._index):
+            if handle is not None:
+                handle.close()
+        self._segment = self._index = None
+
+
+class RawArchiveReader:
+    """Reads a stream's records in time order, using the index to skip what is not needed."""
+
+    def __init__(self, directory, stream):
+        if zstandard is None:
+            raise RuntimeError("Reading the raw archive requires the zstandard package")
+        self.path = os.path.join(directory, stream)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def segments(self):
+        """Segment start times (ms) in order."""
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(int(name[:-len(".idx")]) for name in os.listdir(self.path) if name.endswith(".idx"))
+
+    def entries(self, start=None, end=None, sources=None):
+        """
+        Index entries (fetched_at, segment, offset, length, source, key) with start <=
+        fetched_at <= end, oldest first. Segments starting after `end` are not opened.
+        """
+        for segment in self.segments():
+            if end is not None and segment / 1000 > end:
+                break
+            segment_size = os.path.getsize(os.path.join(self.path, f"{segment}.zst"))
+            with open(os.path.join(self.path, f"{segment}.idx"), encoding="utf-8") as index:
+                for line in index:
+                    fields = line.rstrip("\n").split("\t")
+                    if len(fields) != 5:
+                        continue  # Partially written line
+                    fetched_at, offset, length = float(fields[0]), int(fields[1]), int(fields[2])
+                    if offset + length > segment_size:
+                        break
+                    if (start is not None and fetched_at < start) or (end is not None and fetched_at > end):
+                        continue
+                    if sources is not None and fields[3] not in sources:
+                        continue
+                    yield fetched_at, segment, offset, length, fields[3], fields[4] or None
+
+    def read(self, entry):
+        """The full record ({fetched_at, source, key, payload}) for an index entry."""
+        _, segment, offset, length, _, _ = entry
+        with open(os.path.join(self.path, f"{segment}.zst"), "rb") as f:
+            f.seek(offset)
+            return orjson.loads(self._decompressor.decompress(f.read(length)))
+
+    def records(self, start=None, end=None, sources=None):
+        """Records in time order, reading each segment once."""
+        handle, handle_segment = None, None
+        try:
+            for entry in self.entries(start, end, sources):
+                _, segment, offset, length, _, _ = entry
+                if segment != handle_segment:
+                    if handle is not None:
+                        handle.close()
+                    handle, handle_segment = open(os.path.join(self.path, f"{segment}.zst"), "rb"), segment
+                handle.seek(offset)
+                yield orjson.loads(self._decompressor.decompress(handle.read(length)))
+        finally:
+            if handle is not None:
+                handle.close()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+_warned = False
+
+
+def record(stream, source, payload, key=None):
+    """
+    Archives one raw upstream response for `stream` (one per fetcher). A no-op unless
+    RAW_ARCHIVE_DIR is set; errors are logged and swallowed so archiving never stops
+    data collection.
+    """
+    global _warned
+    if not RAW_ARCHIVE_DIR or payload is None:
+        return
+    if zstandard is None:
+        if not _warned:
+            logger.warning("RAW_ARCHIVE_DIR is set but zstandard is not installed; raw responses are not archived")
+            _warned = True
+        return
+    try:
+        writer = _writers.get(stream)
+        if writer is None:
+            with _writers_lock:
+                writer = _writers.get(stream)
+                if writer is None:
+                    writer = _writers[stream] = RawArchiveWriter(RAW_ARCHIVE_DIR, stream)
+        writer.append(source, payload, key)
+    except Exception as e:
+        logger.error(f"Error archiving raw {source} response: {e}")
@@ -0,0 +1,205 @@
+"""
+Rebuilds a battle's stored data from the raw archive (see raw_archive).
+
+Replays the archived upstream responses through the fetchers' ingest code
+(clan_data_fetcher.clan_document / create_leaderboard_snapshot and
+member_data_fetcher.parse_member_data / apply_member_activity / rank_members), so a change
+to how snapshots, gains or member state are derived can be applied to past battles.
+
+The battle's clans, leaderboard_snapshots, leaderboard_events, clan_members,
+member_rank_history and member_activity_state documents are deleted and bulk-loaded again,
+and its battle_trajectories curves and battle_trajectory_index entry are re-indexed from
+the reloaded clans (see battle_trajectories). Every archived
+leaderboard inside the battle's Start/FinishTime is kept; the live fetcher's NONG points
+heuristic for detecting a stale leaderboard is not re-applied.
+
+    python rebuild_battle.py --battle-id <battle_id> [--archive-dir $RAW_ARCHIVE_DIR] [--dry-run]
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from member_stats import rank_members
+from raw_archive import RAW_ARCHIVE_DIR, RawArchiveReader
+
+load_dotenv()
+
+DB_NAME = "clan_dashboard_db"
+CLAN_STREAM = "clan_fetcher"
+MEMBER_STREAM = "member_fetcher"
+INSERT_BATCH_SIZE = 10000
+SNAPSHOT_WORKERS = 8
+REBUILT_COLLECTIONS = (
+    "clans", "leaderboard_snapshots", "leaderboard_events", "clan_members", "member_rank_history", "member_activity_state"
+)
+
+
+def find_battle_window(archive_dir, battle_id):
+    """(StartTime, FinishTime) unix seconds from the archived activeClanBattle responses."""
+    for stream in (CLAN_STREAM, MEMBER_STREAM):
+        for record in RawArchiveReader(archive_dir, stream).records(sources={"activeClanBattle"}):
+            data = (record["payload"] or {}).get("data") or {}
+            config = data.get("configData") or {}
+            if data.get("configName") == battle_id and "StartTime" in config and "FinishTime" in config:
+                return config["StartTime"], config["FinishTime"]
+    return None
+
+
+def replay_clans(archive_dir, battle_id, start, finish):
+    """clans documents and the latest clan_details fields per clan, from archived leaderboards."""
+    # Imported here: the fetcher modules configure logging and HTTP sessions on import
+    from clan_data_fetcher import clan_details_document, clan_document
+
+    clan_docs, details, ticks = [], {}, []
+    for record in RawArchiveReader(archive_dir, CLAN_STREAM).records(start, finish, {"clans"}):
+        payload = record["payload"] or {}
+        if payload.get("status") != "ok" or "data" not in payload:
+            continue
+        # Naive UTC cut to BSON's millisecond precision, like build_cycle_record, so each
+        # snapshot's tick matches its clans documents
+        timestamp = datetime.datetime.utcfromtimestamp(round(record["fetched_at"], 3))
+        docs = [doc for doc in (clan_document(clan, battle_id, timestamp) for clan in payload["data"]) if doc]
+        if not docs:
+            continue
+        clan_docs.extend(docs)
+        ticks.append(timestamp)
+        for clan in payload["data"]:
+            if clan.get("Name") is not None:
+                details[clan["Name"]] = clan_details_document(clan, timestamp)
+    return clan_docs, details, ticks
+
+
+def replay_members(archive_dir, battle_id, start, finish):
+    """clan_members snapshots plus the rank history and activity state derived from them."""
+    from member_data_fetcher import apply_member_activity, parse_member_data
+
+    snapshots = []
+    rank_history = {}
+    activity = defaultdict(dict)
+    for record in RawArchiveReader(archive_dir, MEMBER_STREAM).records(start, finish, {"clan"}):
+        member_data = parse_member_data(record["key"], record["payload"], datetime.datetime.fromtimestamp(record["fetched_at"]))
+        if not member_data or member_data["battle_id"] != battle_id:
+            continue
+        clan_name = member_data["clan_name"]
+        snapshots.append(member_data)
+        for user_id, rank in rank_members(member_data["members"]):
+            history = rank_history.setdefault((clan_name, user_id), {
+                "clan_name": clan_name, "battle_id": battle_id, "user_id": user_id, "timestamps": [], "ranks": []
+            })
+            history["timestamps"].append(member_data["timestamp"])
+            history["ranks"].append(rank)
+        apply_member_activity(activity[clan_name], member_data)
+
+    updated_at = {}
+    for member_data in snapshots:
+        updated_at[member_data["clan_name"]] = member_data["timestamp"]
+    activity_docs = [
+        {"clan_name": clan_name, "battle_id": battle_id, "updated_at": updated_at[clan_name], "members": members}
+        for clan_name, members in activity.items()
+    ]
+    return snapshots, list(rank_history.values()), activity_docs
+
+
+def insert_batches(collection, documents):
+    for i in range(0, len(documents), INSERT_BATCH_SIZE):
+        collection.insert_many(documents[i:i + INSERT_BATCH_SIZE], ordered=False)
+
+
+def rebuild(client, archive_dir, battle_id, dry_run=False, snapshot_workers=SNAPSHOT_WORKERS):
+    """Replays and reloads one battle; returns (counts per collection, battle window)."""
+    window = find_battle_window(archive_dir, battle_id)
+    if window is None:
+        raise SystemExit(f"No archived activeClanBattle response for {battle_id}")
+    start, finish = window
+    war_end_time = datetime.datetime.fromtimestamp(finish)
+
+    clan_docs, details, ticks = replay_clans(archive_dir, battle_id, start, finish)
+    member_docs, rank_docs, activity_docs = replay_members(archive_dir, battle_id, start, finish)
+    counts = {
+        "clans": len(clan_docs),
+        "leaderboard_snapshots": len(ticks),
+        "clan_members": len(member_docs),
+        "member_rank_history": len(rank_docs),
+        "member_activity_state": len(activity_docs)
+    }
+    if dry_run:
+        return counts, window
+
+    from battle_trajectories import update_battle_trajectories
+    from clan_data_fetcher import create_leaderboard_snapshot
+    from leaderboard_events import detect_events
+
+    db = client[DB_NAME]
+    for name in REBUILT_COLLECTIONS:
+        db[name].delete_many({"battle_id": battle_id})
+    insert_batches(db["clans"], clan_docs)
+    insert_batches(db["clan_members"], member_docs)
+    insert_batches(db["member_rank_history"], rank_docs)
+    insert_batches(db["member_activity_state"], activity_docs)
+    for clan_name, details_doc in details.items():
+        db["clan_details"].update_one({"clan_name": clan_name}, {"$set": details_doc}, upsert=True)
+    db["battle_id_history"].update_one(
+        {"battle_id": battle_id},
+        {
+            "$setOnInsert": {"battle_id": battle_id, "timestamp": datetime.datetime.fromtimestamp(start), "is_current": False},
+            "$set": {"start_time_unix": start}
+        },
+        upsert=True
+    )
+
+    # Each snapshot only reads clans documents at or before its tick, so ticks run in parallel
+    with ThreadPoolExecutor(max_workers=snapshot_workers) as pool:
+        snapshots = [doc for doc in pool.map(lambda tick: create_leaderboard_snapshot(client, battle_id, tick, war_end_time), ticks) if doc]
+    # Events compare consecutive snapshots, so they follow once all snapshots exist
+    events = []
+    for previous, snapshot in zip([None] + snapshots, snapshots):
+        events.extend(detect_events(previous, snapshot, war_end_time))
+    insert_batches(db["leaderboard_events"], events)
+    counts["leaderboard_events"] = len(events)
+    # The trajectory index skips complete battles, so its curves are rebuilt here
+    battle = db["battle_id_history"].find_one({"battle_id": battle_id}, {"is_current": 1})
+    counts["battle_trajectories"] = update_battle_trajectories(
+        client, battle_id, rebuild=True, complete=not (battle or {}).get("is_current")
+    )
+    return counts, window
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--battle-id", required=True)
+    parser.add_argument("--archive-dir", default=RAW_ARCHIVE_DIR)
+    parser.add_argument("--mongo-uri", default=os.environ.get("MONGO_URI"))
+    parser.add_argument("--snapshot-workers", type=int, default=SNAPSHOT_WORKERS)
+    parser.add_argument("--dry-run", action="store_true", help="replay and count only, no database writes")
+    args = parser.parse_args()
+    if not args.archive_dir:
+        raise SystemExit("Set --archive-dir or RAW_ARCHIVE_DIR")
+    if not args.mongo_uri:
+        raise SystemExit("Set --mongo-uri or MONGO_URI")
+    # The fetcher modules read MONGO_URI when they are imported
+    os.environ["MONGO_URI"] = args.mongo_uri
+
+    started = time.perf_counter()
+    client = None if args.dry_run else MongoClient(args.mongo_uri, maxPoolSize=args.snapshot_workers + 2)
+    try:
+        counts, window = rebuild(client, args.archive_dir, args.battle_id, args.dry_run, args.snapshot_workers)
+    finally:
+        if client is not None:
+            client.close()
+    elapsed = time.perf_counter() - started
+
+    for name, count in counts.items():
+        print(f"  {name:24s} {count:>10,}")
+    battle_seconds = max(min(window[1], time.time()) - window[0], 0)
+    print(f"Rebuilt {args.battle_id} in {elapsed:.1f}s ({battle_seconds / elapsed:,.0f}x real time)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
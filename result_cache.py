@@ -0,0 +1,53 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "256"))
+
+
+class TickResultCache:
+    """
+    Bounded LRU of endpoint results whose keys include the battle's latest ingest tick.
+
+    A result can only change when the fetcher writes a new tick, and a new tick changes the
+    key, so entries never need invalidation; old ticks simply age out. Concurrent requests
+    for a key that is being computed await the same computation (single flight), so each
+    distinct query costs one computation per tick. Failures are not cached.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._in_flight = {}  # key -> asyncio.Task
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_compute(self, key, compute):
+        """Cached result for key, else the result of compute() (a coroutine function), run once."""
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.hits += 1
+            return self._results[key]
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            # A task of its own, so a requester disconnecting does not cancel it for the others
+            task = asyncio.ensure_future(self._compute(key, compute))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._in_flight[key] = task
+        else:
+            self.hits += 1
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, compute):
+        try:
+            result = await compute()
+        finally:
+            self._in_flight.pop(key, None)
+        self._results[key] = result
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+        return result
@@ -1,5 +1,6 @@
 import requests
 import time
+import threading
 from typing import Dict, Optional, List
 from pymongo import MongoClient
 import os
@@ -9,11 +10,13 @@ import json
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from pymongo.operations import UpdateOne
+from shared_cache import shared_cache
 
 load_dotenv()
 
-ROBLOX_API_BASE = "https://users.roblox.com/v1/users/"
-ROBLOX_BATCH_API = "https://users.roblox.com/v1/users"
+ROBLOX_USERS_API_URL = os.environ.get("ROBLOX_USERS_API_URL", "https://users.roblox.com")
+ROBLOX_API_BASE = f"{ROBLOX_USERS_API_URL}/v1/users/"
+ROBLOX_BATCH_API = f"{ROBLOX_USERS_API_URL}/v1/users"
 MONGO_CONNECTION_STRING = os.environ.get("MONGO_URI")
 DB_NAME = "clan_dashboard_db"
 CACHE_DURATION = 24 * 60 * 60  # 24 hours in seconds
@@ -21,28 +24,39 @@ CACHE_DURATION = 24 * 60 * 60  # 24 hours in seconds
 # Disable SSL verification warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# Create session with specific cipher configuration and longer timeouts
-session = requests.Session()
-session.verify = False
-session.headers.update({
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Accept': 'application/json',
-    'Accept-Encoding': 'gzip, deflate',
-    'Connection': 'keep-alive'
-})
-
-# Configure retry strategy
-retry_strategy = Retry(
-    total=5,
-    backoff_factor=0.5,
-    status_forcelist=[429, 500, 502, 503, 504],
-)
-adapter = HTTPAdapter(max_retries=retry_strategy)
-session.mount("http://", adapter)
-session.mount("https://", adapter)
-
-# In-memory cache
-username_cache: Dict[str, Dict] = {}
+# HTTP session, built on first use so importing this module stays cheap
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Returns the shared session with specific cipher configuration and longer timeouts."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.verify = False
+                session.headers.update({
+                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+                    'Accept': 'application/json',
+                    'Accept-Encoding': 'gzip, deflate',
+                    'Connection': 'keep-alive'
+                })
+
+                # Configure retry strategy
+                retry_strategy = Retry(
+                    total=5,
+                    backoff_factor=0.5,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                )
+                adapter = HTTPAdapter(max_retries=retry_strategy)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+# Username cache shared by all API workers (in-process with a single worker)
+USERNAME_CACHE_NAMESPACE = "roblox_user"
 
 def make_request(url, timeout=30, method='GET', data=None):
     """Make a request using the session with retries and better error handling."""
@@ -50,9 +64,9 @@ def make_request(url, timeout=30, method='GET', data=None):
         for attempt in range(3):  # Try up to 3 times
             try:
                 if method.upper() == 'GET':
-                    response = session.get(url, timeout=timeout)
+                    response = get_session().get(url, timeout=timeout)
                 else:
-                    response = session.post(url, json=data, timeout=timeout)
+                    response = get_session().post(url, json=data, timeout=timeout)
                 
                 response.raise_for_status()
                 
@@ -87,7 +101,7 @@ def make_request(url, timeout=30, method='GET', data=None):
 def get_user_data_batch(user_ids: List[str], mongo_client: Optional[MongoClient] = None) -> Dict[str, Dict]:
     """
     Get Roblox user data in batches with caching. Priority:
-    1. Check in-memory cache
+    1. Check the shared worker cache
     2. Check MongoDB cache
     3. Fetch from Roblox API in batches
     """
@@ -105,13 +119,13 @@ def get_user_data_batch(user_ids: List[str], mongo_client: Optional[MongoClient]
         db = mongo_client[DB_NAME]
         username_cache_collection = db["username_cache"]
 
-        # 1. Check in-memory cache first
+        # 1. Check the shared worker cache first
+        cached_users = shared_cache.get_many(USERNAME_CACHE_NAMESPACE, user_ids)
         for user_id in user_ids:
-            if user_id in username_cache:
-                cached_user = username_cache[user_id]
-                if cached_user["name"] != "Unknown":
-                    result[user_id] = cached_user
-                    continue
+            cached_user = cached_users.get(user_id)
+            if cached_user and cached_user["name"] != "Unknown":
+                result[user_id] = cached_user
+                continue
             uncached_ids.append(user_id)
 
         if not uncached_ids:
@@ -124,6 +138,7 @@ def get_user_data_batch(user_ids: List[str], mongo_client: Optional[MongoClient]
         })
 
         remaining_ids = set(uncached_ids)
+        mongo_hits = {}
         for cached_data in mongo_cached:
             user_id = cached_data["user_id"]
             if cached_data.get("name") != "Unknown":
@@ -132,8 +147,10 @@ def get_user_data_batch(user_ids: List[str], mongo_client: Optional[MongoClient]
                     "display_name": cached_data["display_name"]
                 }
                 result[user_id] = user_info
-                username_cache[user_id] = user_info  # Update in-memory cache
-                remaining_ids.remove(user_id)
+                mongo_hits[user_id] = user_info
+                remaining_ids.discard(user_id)
+        # Update the shared cache, expiring with the MongoDB entry it came from
+        shared_cache.set_many(USERNAME_CACHE_NAMESPACE, mongo_hits, ttl=CACHE_DURATION)
 
         if not remaining_ids:
             return result
@@ -158,6 +175,7 @@ def get_user_data_batch(user_ids: List[str], mongo_client: Optional[MongoClient]
 
                 # Process batch results
                 batch_updates = []
+                fetched_users = {}
                 for user_data in response_data.get("data", []):
                     user_id = str(user_data["id"])
                     user_info = {
@@ -167,7 +185,7 @@ def get_user_data_batch(user_ids: List[str], mongo_client: Optional[MongoClient]
                     
                     if user_info["name"] != "Unknown":
                         result[user_id] = user_info
-                        username_cache[user_id] = user_info
+                        fetched_users[user_id] = user_info
                         
                         # Prepare MongoDB update
                         batch_updates.append(
@@ -185,9 +203,10 @@ def get_user_data_batch(user_ids: List[str], mongo_client: Optional[MongoClient]
                             )
                         )
 
-                # Bulk update MongoDB cache
+                # Bulk update MongoDB and shared caches
                 if batch_updates:
                     username_cache_collection.bulk_write(batch_updates)
+                shared_cache.set_many(USERNAME_CACHE_NAMESPACE, fetched_users, ttl=CACHE_DURATION)
 
             except Exception as e:
                 print(f"Error fetching batch user data: {e}")
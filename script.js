@@ -41,11 +41,50 @@ let pendingBattleId = null;
 let pendingTargetClan = null;
 let pendingTargetRank = null;
 let lastDashboardData = null; // Store the last loaded dashboard data
+let lastDashboardTimestamp = null; // Snapshot timestamp of lastDashboardData, used for ?since= diffs
+let lastDashboardBattleId = null; // Battle the cached snapshot belongs to
 let nextRefreshTime = null; // Track when the next refresh will occur
 
 // --- API Base URL ---
 //const API_BASE_URL = "http://127.0.0.1:8000pi/clan"; // Local server for testing with correct path prefix
 const API_BASE_URL = "https://clan-dashboard-api.onrender.com/api/clan"; // Production Render server
+// Clan icon proxy on the same server (combined_api_server /icons/{image_id})
+const ICON_BASE_URL = API_BASE_URL.replace(/\/api\/clan$/, '') + '/icons';
+// Pre-rendered JSON written by the fetcher (STATIC_EXPORT_DIR); null disables it and uses the API only
+const STATIC_DATA_BASE_URL = null; // e.g. "https://bigtonyx.github.io/clan-dashboard-data"
+
+// --- Static Export Helpers ---
+// Mirrors static_publisher.battle_slug
+function battleSlug(battleId) {
+    return String(battleId).replace(/[^A-Za-z0-9_.-]/g, '_');
+}
+
+// Returns parsed JSON from the static export, or null so callers fall back to the API
+async function fetchStaticJson(path) {
+    if (!STATIC_DATA_BASE_URL) return null;
+    try {
+        const response = await fetch(`${STATIC_DATA_BASE_URL}/${path}`, { cache: 'no-cache' });
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+        return await response.json();
+    } catch (error) {
+        console.warn(`Static export unavailable for ${path}, using API:`, error);
+        return null;
+    }
+}
+
+// Same format as the API's format_timedelta ("Xd Yh Zm")
+function formatCountdown(finishTimeSeconds) {
+    const totalSeconds = finishTimeSeconds - Date.now() / 1000;
+    if (totalSeconds < 0) return "Ended";
+    const days = Math.floor(totalSeconds / 86400);
+    const hours = Math.floor((totalSeconds % 86400) / 3600);
+    const minutes = Math.floor((totalSeconds % 3600) / 60);
+    const parts = [];
+    if (days > 0) parts.push(`${days}d`);
+    if (hours > 0) parts.push(`${hours}h`);
+    if (days > 0 || hours > 0 || minutes > 0) parts.push(`${minutes}m`);
+    return parts.length ? parts.join(' ') : "0m";
+}
 
 // --- Battle Selector Population ---
 async function populateBattleSelector() {
@@ -57,9 +96,12 @@ async function populateBattleSelector() {
 
     try {
         console.log("Fetching battle IDs...");
-        const response = await fetch(`${API_BASE_URL}/api/battle_ids`);
-        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-        const battles = await response.json();
+        let battles = await fetchStaticJson('battle_ids.json');
+        if (!battles) {
+            const response = await fetch(`${API_BASE_URL}/api/battle_ids`);
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            battles = await response.json();
+        }
         
         battleList = battles; // save for custom dropdown
         // Clear existing options
@@ -150,6 +192,11 @@ function renderCustomBattleDropdown(battles) {
 async function fetchCountdown() {
     // console.log("Fetching countdown..."); // Reduce logging
     try {
+        const staticCountdown = await fetchStaticJson('countdown.json');
+        if (staticCountdown && staticCountdown.finish_time) {
+            countdownTimerElement.textContent = formatCountdown(staticCountdown.finish_time);
+            return;
+        }
         const response = await fetch(`${API_BASE_URL}/countdown`);
         if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
         const data = await response.json();
@@ -305,8 +352,25 @@ async function fetchReachTargetData(suppressPlaceholder = false) {
 // --- Fetch Dashboard Data (and update controls/highlighting) ---
 async function fetchDashboardData() {
     console.log(`Fetching dashboard data (snapshot) for battle_id=${currentBattleId}...`);
-    const url = `${API_BASE_URL}/dashboard?battle_id=${encodeURIComponent(currentBattleId)}`;
-    leaderboardBody.innerHTML = '<tr><td colspan="7">Loading...</td></tr>'; // Show loading state
+    const staticSnapshot = await fetchStaticJson(`dashboard/${battleSlug(currentBattleId)}/latest.json`);
+    if (staticSnapshot && Array.isArray(staticSnapshot.top_clans)) {
+        lastDashboardTimestamp = staticSnapshot.timestamp;
+        lastDashboardBattleId = currentBattleId;
+        try {
+            renderDashboardSnapshot(staticSnapshot.top_clans);
+            return;
+        } catch (error) {
+            console.error("Error processing static snapshot:", error);
+        }
+    }
+    // Ask only for changes when we already hold a snapshot of this battle
+    const canDiff = lastDashboardData && lastDashboardTimestamp && lastDashboardBattleId === currentBattleId;
+    let url = `${API_BASE_URL}/dashboard?battle_id=${encodeURIComponent(currentBattleId)}`;
+    if (canDiff) {
+        url += `&since=${encodeURIComponent(lastDashboardTimestamp)}`;
+    } else {
+        leaderboardBody.innerHTML = '<tr><td colspan="7">Loading...</td></tr>'; // Show loading state
+    }
 
     try {
         const response = await fetch(url);
@@ -318,218 +382,299 @@ async function fetchDashboardData() {
             } catch (jsonError) { /* Ignore if response wasn't JSON */ }
             throw new Error(errorDetail);
         }
-        const topClans = await response.json();
-        lastDashboardData = topClans; // Cache the data for re-rendering
-        console.log("Snapshot data received (first few):", topClans.slice(0, 3));
-
-        // Set next refresh time
-        nextRefreshTime = new Date(Date.now() + 120000); // 2 minutes from now
-        const currentTime = new Date().toLocaleTimeString();
-        lastUpdatedElement.setAttribute('data-last-updated', currentTime);
-        updateRefreshCountdown();
-
-        if (topClans && Array.isArray(topClans) && topClans.length > 0) {
-            // Update global clanList with the latest snapshot data
-            clanList = topClans;
-            // --- Populate Target Clan Dropdown (Existing logic) ---
-            const previousSelectedClan = targetClanSelect.value;
-            let wasUnset = !currentTargetClan;
-            targetClanSelect.innerHTML = '<option value="">-- Select Clan --</option>';
-            topClans.forEach(clan => {
-                const option = document.createElement('option');
-                option.value = clan.clan_name; option.textContent = clan.clan_name;
-                if (clan.clan_name === previousSelectedClan) {
-                    option.selected = true;
-                }
-                targetClanSelect.appendChild(option);
-            });
-            const savedClan = localStorage.getItem('selectedClan');
-            let validSavedClan = savedClan && Array.from(targetClanSelect.options).some(opt => opt.value === savedClan);
-
-            if (validSavedClan) {
-                targetClanSelect.value = savedClan;
-                currentTargetClan = savedClan;
-            } else if (!previousSelectedClan) {
-                const nongOption = Array.from(targetClanSelect.options).find(opt => opt.value === "NONG");
-                if (nongOption) {
-                    targetClanSelect.value = "NONG";
-                    currentTargetClan = "NONG";
-                    localStorage.setItem('selectedClan', "NONG");
-                } else if (targetClanSelect.options.length > 1) {
-                    targetClanSelect.selectedIndex = 1;
-                    currentTargetClan = targetClanSelect.value;
-                    localStorage.setItem('selectedClan', currentTargetClan);
-                }
-            } else {
-                targetClanSelect.value = previousSelectedClan;
-                currentTargetClan = previousSelectedClan;
+        const data = await response.json();
+        let topClans;
+        if (canDiff && data && data.type === 'diff') {
+            topClans = applyDashboardPatch(lastDashboardData, data);
+            lastDashboardTimestamp = data.timestamp;
+        } else if (data && data.type === 'full') {
+            topClans = data.top_clans || [];
+            lastDashboardTimestamp = data.timestamp;
+        } else {
+            topClans = data;
+            lastDashboardTimestamp = response.headers.get('X-Snapshot-Timestamp');
+        }
+        lastDashboardBattleId = currentBattleId;
+        renderDashboardSnapshot(topClans);
+    } catch (error) {
+        console.error("Error fetching or processing snapshot data:", error);
+        leaderboardBody.innerHTML = `<tr><td colspan="7">Error loading data. Check console. (${error.message})</td></tr>`;
+        if (comparisonClanListDiv) comparisonClanListDiv.innerHTML = '(Error loading clans)';
+        lastUpdatedElement.textContent = new Date().toLocaleTimeString();
+    }
+}
+
+// --- Apply a /dashboard?since= patch to the cached snapshot ---
+function applyDashboardPatch(baseClans, patch) {
+    const clansByName = new Map(baseClans.map(clan => [clan.clan_name, { ...clan }]));
+    (patch.left || []).forEach(name => clansByName.delete(name));
+    Object.entries(patch.changed || {}).forEach(([name, fields]) => {
+        const clan = clansByName.get(name);
+        if (clan) Object.assign(clan, fields);
+    });
+    (patch.entered || []).forEach(clan => clansByName.set(clan.clan_name, { ...clan }));
+    return Array.from(clansByName.values()).sort((a, b) => a.current_rank - b.current_rank);
+}
+
+// --- Render a leaderboard snapshot (from polling or the live stream) ---
+function renderDashboardSnapshot(topClans) {
+    lastDashboardData = topClans; // Cache the data for re-rendering
+    console.log("Snapshot data received (first few):", topClans.slice(0, 3));
+
+    // Set next refresh time
+    nextRefreshTime = new Date(Date.now() + 120000); // 2 minutes from now
+    const currentTime = new Date().toLocaleTimeString();
+    lastUpdatedElement.setAttribute('data-last-updated', currentTime);
+    updateRefreshCountdown();
+
+    if (topClans && Array.isArray(topClans) && topClans.length > 0) {
+        // Update global clanList with the latest snapshot data
+        clanList = topClans;
+        // --- Populate Target Clan Dropdown (Existing logic) ---
+        const previousSelectedClan = targetClanSelect.value;
+        let wasUnset = !currentTargetClan;
+        targetClanSelect.innerHTML = '<option value="">-- Select Clan --</option>';
+        topClans.forEach(clan => {
+            const option = document.createElement('option');
+            option.value = clan.clan_name; option.textContent = clan.clan_name;
+            if (clan.clan_name === previousSelectedClan) {
+                option.selected = true;
             }
-            // --- End Dropdown Population ---
-
-            // --- Populate All Clan Pills ---
-            if (allClanPillsContainer) {
-                allClanPillsContainer.innerHTML = '';
-                topClans.forEach(clan => {
-                    const pill = document.createElement('span');
-                    pill.classList.add('clan-option-pill');
-                    pill.textContent = clan.clan_name;
-                    pill.dataset.clanName = clan.clan_name;
-                    pill.addEventListener('click', handleClanPillClick);
-                    if (selectedComparisonClans.includes(clan.clan_name)) {
-                        pill.classList.add('selected');
-                    }
-                    allClanPillsContainer.appendChild(pill);
-                });
-            } else {
-                console.error("All clan pills container not found!");
+            targetClanSelect.appendChild(option);
+        });
+        const savedClan = localStorage.getItem('selectedClan');
+        let validSavedClan = savedClan && Array.from(targetClanSelect.options).some(opt => opt.value === savedClan);
+
+        if (validSavedClan) {
+            targetClanSelect.value = savedClan;
+            currentTargetClan = savedClan;
+        } else if (!previousSelectedClan) {
+            const nongOption = Array.from(targetClanSelect.options).find(opt => opt.value === "NONG");
+            if (nongOption) {
+                targetClanSelect.value = "NONG";
+                currentTargetClan = "NONG";
+                localStorage.setItem('selectedClan', "NONG");
+            } else if (targetClanSelect.options.length > 1) {
+                targetClanSelect.selectedIndex = 1;
+                currentTargetClan = targetClanSelect.value;
+                localStorage.setItem('selectedClan', currentTargetClan);
             }
-            // --- End Populate All Clan Pills ---
-
-            // --- Populate table rows (Snapshot logic) ---
-            let trackedClanGain = null;
-            if (topClans && Array.isArray(topClans)) {
-                const trackedClan = topClans.find(clan => clan.clan_name === currentTargetClan);
-                if (trackedClan) {
-                    const gainField = `gain_${currentTimePeriod}m`;
-                    trackedClanGain = trackedClan[gainField];
+        } else {
+            targetClanSelect.value = previousSelectedClan;
+            currentTargetClan = previousSelectedClan;
+        }
+        // --- End Dropdown Population ---
+
+        // --- Populate All Clan Pills ---
+        if (allClanPillsContainer) {
+            allClanPillsContainer.innerHTML = '';
+            topClans.forEach(clan => {
+                const pill = document.createElement('span');
+                pill.classList.add('clan-option-pill');
+                pill.textContent = clan.clan_name;
+                pill.dataset.clanName = clan.clan_name;
+                pill.addEventListener('click', handleClanPillClick);
+                if (selectedComparisonClans.includes(clan.clan_name)) {
+                    pill.classList.add('selected');
                 }
+                allClanPillsContainer.appendChild(pill);
+            });
+        } else {
+            console.error("All clan pills container not found!");
+        }
+        // --- End Populate All Clan Pills ---
+
+        // --- Populate table rows (Snapshot logic) ---
+        let trackedClanGain = null;
+        if (topClans && Array.isArray(topClans)) {
+            const trackedClan = topClans.find(clan => clan.clan_name === currentTargetClan);
+            if (trackedClan) {
+                const gainField = `gain_${currentTimePeriod}m`;
+                trackedClanGain = trackedClan[gainField];
             }
+        }
 
-            // Update the gain header to reflect the selected period
-            updateGainHeader(currentTimePeriod);
-
-            // --- Calculate gap and time to catch for each clan ---
-            const gainField = `gain_${currentTimePeriod}m`;
-            const forecastGainField = `gain_${currentForecastPeriod}m`;
-            for (let i = 0; i < topClans.length; i++) {
-                const clan = topClans[i];
-                let gap = '';
-                let timeToCatch = '';
-                if (i > 0) {
-                    // Calculate gap to the clan above
-                    const aboveClan = topClans[i - 1];
-                    if (aboveClan && typeof aboveClan.current_points === 'number' && typeof clan.current_points === 'number') {
-                        gap = aboveClan.current_points - clan.current_points;
-                        if (gap < 0) gap = 0;
-                    }
-                    // Calculate time to catch using forecast period gains
-                    const currentForecastGain = clan[forecastGainField];
-                    const aboveForecastGain = aboveClan[forecastGainField];
-                    if (
-                        typeof currentForecastGain === 'number' &&
-                        typeof aboveForecastGain === 'number' &&
-                        currentForecastGain > aboveForecastGain &&
-                        gap > 0 &&
-                        currentForecastPeriod > 0
-                    ) {
-                        const gainDifference = currentForecastGain - aboveForecastGain;
-                        const minutesToCatch = (gap * currentForecastPeriod) / gainDifference;
-                        if (isFinite(minutesToCatch) && minutesToCatch > 0) {
-                            // Format as days/hours/minutes if over 24h
-                            const days = Math.floor(minutesToCatch / 1440);
-                            const hours = Math.floor((minutesToCatch % 1440) / 60);
-                            const minutes = Math.round(minutesToCatch % 60);
-                            if (days > 0) {
-                                let str = `${days}d`;
-                                if (hours > 0) str += ` ${hours}h`;
-                                if (minutes > 0) str += ` ${minutes}m`;
-                                timeToCatch = str;
-                            } else if (hours > 0 && minutes > 0) {
-                                timeToCatch = `${hours}h ${minutes}m`;
-                            } else if (hours > 0) {
-                                timeToCatch = `${hours}h`;
-                            } else {
-                                timeToCatch = `${minutes}m`;
-                            }
-                        }
-                    }
-                }
-                // Render the row
-                const row = document.createElement('tr');
-                if (clan.clan_name === currentTargetClan) {
-                    row.classList.add('highlight');
+        // Update the gain header to reflect the selected period
+        updateGainHeader(currentTimePeriod);
+
+        // --- Calculate gap and time to catch for each clan ---
+        const gainField = `gain_${currentTimePeriod}m`;
+        const forecastGainField = `gain_${currentForecastPeriod}m`;
+        for (let i = 0; i < topClans.length; i++) {
+            const clan = topClans[i];
+            let gap = '';
+            let timeToCatch = '';
+            if (i > 0) {
+                // Calculate gap to the clan above
+                const aboveClan = topClans[i - 1];
+                if (aboveClan && typeof aboveClan.current_points === 'number' && typeof clan.current_points === 'number') {
+                    gap = aboveClan.current_points - clan.current_points;
+                    if (gap < 0) gap = 0;
                 }
-                const gainValue = clan[gainField] !== undefined ? clan[gainField] : null;
-                const imageId = getImageId(clan.icon);
-                const imageUrl = imageId ? `https://ps99.biggamesapi.io/image/${imageId}` : '';
-                // --- Add gain-higher-than-tracked class if needed ---
-                let gainClass = '';
+                // Calculate time to catch using forecast period gains
+                const currentForecastGain = clan[forecastGainField];
+                const aboveForecastGain = aboveClan[forecastGainField];
                 if (
-                    trackedClanGain !== null &&
-                    gainValue !== null &&
-                    clan.clan_name !== currentTargetClan &&
-                    gainValue > trackedClanGain
+                    typeof currentForecastGain === 'number' &&
+                    typeof aboveForecastGain === 'number' &&
+                    currentForecastGain > aboveForecastGain &&
+                    gap > 0 &&
+                    currentForecastPeriod > 0
                 ) {
-                    gainClass = 'gain-higher-than-tracked';
+                    const gainDifference = currentForecastGain - aboveForecastGain;
+                    const minutesToCatch = (gap * currentForecastPeriod) / gainDifference;
+                    if (isFinite(minutesToCatch) && minutesToCatch > 0) {
+                        // Format as days/hours/minutes if over 24h
+                        const days = Math.floor(minutesToCatch / 1440);
+                        const hours = Math.floor((minutesToCatch % 1440) / 60);
+                        const minutes = Math.round(minutesToCatch % 60);
+                        if (days > 0) {
+                            let str = `${days}d`;
+                            if (hours > 0) str += ` ${hours}h`;
+                            if (minutes > 0) str += ` ${minutes}m`;
+                            timeToCatch = str;
+                        } else if (hours > 0 && minutes > 0) {
+                            timeToCatch = `${hours}h ${minutes}m`;
+                        } else if (hours > 0) {
+                            timeToCatch = `${hours}h`;
+                        } else {
+                            timeToCatch = `${minutes}m`;
+                        }
+                    }
                 }
-
-
             }
-            // Update Last Updated timestamp
-            lastUpdatedElement.textContent = new Date().toLocaleTimeString();
-
-            // After setting currentTargetClan, if it was previously unset and is now set, call fetchReachTargetData
-            if (wasUnset && currentTargetClan) {
-                fetchReachTargetData();
+            // Render the row
+            const row = document.createElement('tr');
+            if (clan.clan_name === currentTargetClan) {
+                row.classList.add('highlight');
+            }
+            const gainValue = clan[gainField] !== undefined ? clan[gainField] : null;
+            const imageUrl = getIconUrl(clan);
+            // --- Add gain-higher-than-tracked class if needed ---
+            let gainClass = '';
+            if (
+                trackedClanGain !== null &&
+                gainValue !== null &&
+                clan.clan_name !== currentTargetClan &&
+                gainValue > trackedClanGain
+            ) {
+                gainClass = 'gain-higher-than-tracked';
             }
-        } else {
-            // Handle empty data case
-            console.warn("Received empty or invalid topClans list:", topClans);
-            leaderboardBody.innerHTML = '<tr><td colspan="7">No clan data available.</td></tr>';
-            if (comparisonClanListDiv) comparisonClanListDiv.innerHTML = '(No clans to select)';
-            lastUpdatedElement.textContent = new Date().toLocaleTimeString();
-        }
 
-        // --- Restore Custom Dropdown Rendering ---
-        // 1. Hide the old select and add a new div for the custom dropdown
-        console.log('Attempting to hide old select and insert custom dropdown...');
-        if (targetClanSelect) {
-            targetClanSelect.style.display = 'none';
-            console.log('targetClanSelect found and hidden.');
-        } else {
-            console.warn('targetClanSelect not found!');
-        }
-        // Always remove the old custom dropdown before creating a new one
-        let oldDropdown = document.getElementById('custom-clan-dropdown');
-        if (oldDropdown && oldDropdown.parentNode) {
-            oldDropdown.parentNode.removeChild(oldDropdown);
-        }
-        let customDropdown = document.createElement('div');
-        customDropdown.id = 'custom-clan-dropdown';
-        customDropdown.className = 'custom-clan-dropdown';
-        if (targetClanSelect && targetClanSelect.parentNode) {
-            targetClanSelect.parentNode.insertBefore(customDropdown, targetClanSelect);
-            console.log('Inserted custom dropdown into DOM.');
-        } else {
-            console.warn('Could not insert custom dropdown: targetClanSelect or its parentNode is missing.');
+
         }
+        // Update Last Updated timestamp
+        lastUpdatedElement.textContent = new Date().toLocaleTimeString();
 
-        // Helper to render the custom dropdown
-        console.log('Calling renderCustomClanDropdown with topClans:', topClans);
-        renderCustomClanDropdown(topClans);
-
-        // Hide the old number input and add a new div for the custom rank dropdown
-        if (targetRankInput) targetRankInput.style.display = 'none';
-        let customRankDropdown = document.getElementById('custom-rank-dropdown');
-        if (!customRankDropdown) {
-            customRankDropdown = document.createElement('div');
-            customRankDropdown.id = 'custom-rank-dropdown';
-            customRankDropdown.className = 'custom-rank-dropdown';
-            targetRankInput.parentNode.insertBefore(customRankDropdown, targetRankInput);
+        // After setting currentTargetClan, if it was previously unset and is now set, call fetchReachTargetData
+        if (wasUnset && currentTargetClan) {
+            fetchReachTargetData();
         }
+    } else {
+        // Handle empty data case
+        console.warn("Received empty or invalid topClans list:", topClans);
+        leaderboardBody.innerHTML = '<tr><td colspan="7">No clan data available.</td></tr>';
+        if (comparisonClanListDiv) comparisonClanListDiv.innerHTML = '(No clans to select)';
+        lastUpdatedElement.textContent = new Date().toLocaleTimeString();
+    }
 
-        // In fetchDashboardData or initializeApp, after rendering the controls, call:
-        renderCustomRankDropdown(currentTargetRank);
+    // --- Restore Custom Dropdown Rendering ---
+    // 1. Hide the old select and add a new div for the custom dropdown
+    console.log('Attempting to hide old select and insert custom dropdown...');
+    if (targetClanSelect) {
+        targetClanSelect.style.display = 'none';
+        console.log('targetClanSelect found and hidden.');
+    } else {
+        console.warn('targetClanSelect not found!');
+    }
+    // Always remove the old custom dropdown before creating a new one
+    let oldDropdown = document.getElementById('custom-clan-dropdown');
+    if (oldDropdown && oldDropdown.parentNode) {
+        oldDropdown.parentNode.removeChild(oldDropdown);
+    }
+    let customDropdown = document.createElement('div');
+    customDropdown.id = 'custom-clan-dropdown';
+    customDropdown.className = 'custom-clan-dropdown';
+    if (targetClanSelect && targetClanSelect.parentNode) {
+        targetClanSelect.parentNode.insertBefore(customDropdown, targetClanSelect);
+        console.log('Inserted custom dropdown into DOM.');
+    } else {
+        console.warn('Could not insert custom dropdown: targetClanSelect or its parentNode is missing.');
+    }
 
-        renderLeaderboardTable(topClans); // Only call this to render the table
-    } catch (error) {
-        console.error("Error fetching or processing snapshot data:", error);
-        leaderboardBody.innerHTML = `<tr><td colspan="7">Error loading data. Check console. (${error.message})</td></tr>`;
-        if (comparisonClanListDiv) comparisonClanListDiv.innerHTML = '(Error loading clans)';
-        lastUpdatedElement.textContent = new Date().toLocaleTimeString();
+    // Helper to render the custom dropdown
+    console.log('Calling renderCustomClanDropdown with topClans:', topClans);
+    renderCustomClanDropdown(topClans);
+
+    // Hide the old number input and add a new div for the custom rank dropdown
+    if (targetRankInput) targetRankInput.style.display = 'none';
+    let customRankDropdown = document.getElementById('custom-rank-dropdown');
+    if (!customRankDropdown) {
+        customRankDropdown = document.createElement('div');
+        customRankDropdown.id = 'custom-rank-dropdown';
+        customRankDropdown.className = 'custom-rank-dropdown';
+        targetRankInput.parentNode.insertBefore(customRankDropdown, targetRankInput);
+    }
+
+    // In fetchDashboardData or initializeApp, after rendering the controls, call:
+    renderCustomRankDropdown(currentTargetRank);
+
+    renderLeaderboardTable(topClans); // Only call this to render the table
+}
+
+// --- Live Dashboard Stream (Server-Sent Events) ---
+let dashboardStream = null; // EventSource for /dashboard/stream
+let dashboardPollTimer = null; // Fallback polling interval id
+
+function stopDashboardUpdates() {
+    if (dashboardStream) {
+        dashboardStream.close();
+        dashboardStream = null;
+    }
+    if (dashboardPollTimer) {
+        clearInterval(dashboardPollTimer);
+        dashboardPollTimer = null;
     }
 }
 
+function startDashboardPolling() {
+    fetchDashboardData();
+    dashboardPollTimer = setInterval(fetchDashboardData, 120000);
+}
+
+// Subscribe to pushed snapshots for the current battle; fall back to polling without SSE support
+function startDashboardUpdates() {
+    stopDashboardUpdates();
+    // The static export is served by a CDN, so plain polling is cheap there
+    if (!window.EventSource || STATIC_DATA_BASE_URL) {
+        startDashboardPolling();
+        return;
+    }
+    leaderboardBody.innerHTML = '<tr><td colspan="7">Loading...</td></tr>'; // Show loading state
+    const streamBattleId = currentBattleId;
+    const streamUrl = `${API_BASE_URL}/dashboard/stream?battle_id=${encodeURIComponent(streamBattleId)}`;
+    dashboardStream = new EventSource(streamUrl);
+    dashboardStream.addEventListener('snapshot', (event) => {
+        if (streamBattleId !== currentBattleId) return; // Stale stream for a previous battle
+        try {
+            const payload = JSON.parse(event.data);
+            lastDashboardTimestamp = payload.timestamp;
+            lastDashboardBattleId = streamBattleId;
+            renderDashboardSnapshot(payload.top_clans || []);
+        } catch (error) {
+            console.error("Error processing streamed snapshot:", error);
+        }
+    });
+    dashboardStream.onerror = () => {
+        // EventSource retries on its own; only fall back once the browser gives up on the stream
+        if (dashboardStream && dashboardStream.readyState === EventSource.CLOSED) {
+            console.warn("Dashboard stream closed, falling back to polling.");
+            dashboardStream = null;
+            startDashboardPolling();
+        }
+    };
+}
+
 // Helper to render the custom dropdown
 function renderCustomClanDropdown(clanList) {
     console.log('Rendering custom clan dropdown. clanList:', clanList);
@@ -542,8 +687,7 @@ function renderCustomClanDropdown(clanList) {
     // Use pendingTargetClan if set, otherwise currentTargetClan
     const selectedClanName = pendingTargetClan || currentTargetClan;
     let selectedClan = clanList.find(c => c.clan_name === selectedClanName) || clanList[0];
-    const imageId = getImageId(selectedClan.icon);
-    const imageUrl = imageId ? `https://ps99.biggamesapi.io/image/${imageId}` : '';
+    const imageUrl = getIconUrl(selectedClan);
     const selected = document.createElement('div');
     selected.className = 'custom-clan-selected';
     selected.innerHTML = `
@@ -556,8 +700,7 @@ function renderCustomClanDropdown(clanList) {
     const list = document.createElement('ul');
     list.className = 'clan-dropdown-list';
     clanList.forEach(clan => {
-        const imageId = getImageId(clan.icon);
-        const imageUrl = imageId ? `https://ps99.biggamesapi.io/image/${imageId}` : '';
+        const imageUrl = getIconUrl(clan);
         const item = document.createElement('li');
         item.className = 'clan-dropdown-item';
         item.innerHTML = `
@@ -680,6 +823,17 @@ async function updateComparisonChart() {
     ctx.fillText("Loading chart data...", 10, 50);
 
     try {
+        // Static export holds every top clan's series for the longest period; filter locally
+        const staticComparison = await fetchStaticJson(`comparison/${battleSlug(currentBattleId)}/latest.json`);
+        if (staticComparison && Array.isArray(staticComparison.series)) {
+            const cutoff = Date.now() - currentComparisonTimePeriod * 60000;
+            const historyData = staticComparison.series.filter(row =>
+                selectedComparisonClans.includes(row.clan_name) &&
+                new Date(row.timestamp.endsWith('Z') ? row.timestamp : `${row.timestamp}Z`).getTime() >= cutoff
+            );
+            renderComparisonChart(historyData);
+            return;
+        }
         const response = await fetch(comparisonUrl); // Use the correctly built URL
         if (!response.ok) {
              let errorDetail = `HTTP error! status: ${response.status}`;
@@ -843,7 +997,7 @@ async function initializeApp() {
             currentBattleId = event.target.value;
             console.log(`Battle ID changed to: ${currentBattleId}`);
             // Refresh data when battle changes
-            fetchDashboardData();
+            startDashboardUpdates();
             if (currentTargetClan) {
                 fetchReachTargetData();
             }
@@ -946,7 +1100,11 @@ async function initializeApp() {
             currentTargetClan !== prevTargetClan ||
             currentTargetRank !== prevTargetRank
         ) {
-            fetchDashboardData();
+            if (currentBattleId !== prevBattleId) {
+                startDashboardUpdates(); // Re-subscribe for the new battle
+            } else {
+                fetchDashboardData();
+            }
             fetchReachTargetData();
         } else {
             // Just re-render the leaderboard and update gain header
@@ -962,8 +1120,7 @@ async function initializeApp() {
     fetchCountdown();
     setInterval(fetchCountdown, 60000);
 
-    fetchDashboardData(); // Also populates dropdown initially
-    setInterval(fetchDashboardData, 120000);
+    startDashboardUpdates(); // Also populates dropdown initially; pushed updates replace the 2-minute poll
 
     fetchReachTargetData(true); // Fetch initial reach target data, suppress placeholder
 
@@ -991,6 +1148,12 @@ function getImageId(iconString) {
     return match ? match[1] : null;
 }
 
+// Icon URL for a clan; snapshots carry the resolved icon_id, older payloads only the icon string
+function getIconUrl(clan) {
+    const imageId = clan.icon_id || getImageId(clan.icon);
+    return imageId ? `${ICON_BASE_URL}/${imageId}` : '';
+}
+
 // Helper to parse time strings like '1h 30m' to minutes
 function parseTimeToMinutes(timeStr) {
     if (!timeStr || typeof timeStr !== 'string') return null;
@@ -1068,8 +1231,7 @@ function renderLeaderboardTable(topClans) {
                 row.classList.add('highlight');
             }
             const gainValue = clan[gainField] !== undefined ? clan[gainField] : null;
-            const imageId = getImageId(clan.icon);
-            const imageUrl = imageId ? `https://ps99.biggamesapi.io/image/${imageId}` : '';
+            const imageUrl = getIconUrl(clan);
             
             const warTimeStr = countdownTimerElement.textContent;
             const warTimeMinutes = parseTimeToMinutes(warTimeStr);
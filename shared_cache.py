@@ -0,0 +1,272 @@
+"""
+Caches shared by every API worker process.
+
+SHARED_CACHE_URL selects the backend:
+  memory://                per-process dict (the default with a single worker)
+  sqlite:///path/cache.db  SQLite file on local disk, shared by all workers on the host
+  redis://host:6379/0      Redis or any Redis-compatible server
+
+With WEB_CONCURRENCY > 1 and no SHARED_CACHE_URL, a SQLite file in the temp directory
+is used so workers never run with separate cold caches. The same URL backs slowapi's
+rate limit counters (see rate_limit_storage_uri), so limits hold across workers.
+"""
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from limits.storage import Storage
+
+try:
+    import redis
+except ImportError:  # Optional: only needed for redis:// URLs
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+DEFAULT_SQLITE_PATH = os.path.join(tempfile.gettempdir(), "clan_dashboard_cache.db")
+# Seconds a writer waits on a locked SQLite database before giving up
+SQLITE_BUSY_TIMEOUT = 5.0
+# SQLite limits the number of bound parameters per statement
+SQLITE_MAX_PARAMS = 500
+
+
+def resolve_cache_url():
+    url = os.environ.get("SHARED_CACHE_URL")
+    if url:
+        return url
+    if WEB_CONCURRENCY > 1:
+        return f"sqlite:///{DEFAULT_SQLITE_PATH}"
+    return "memory://"
+
+
+def sqlite_path(url):
+    """sqlite:///relative.db or sqlite:////absolute/path.db -> file path."""
+    return url[len("sqlite:///"):] or DEFAULT_SQLITE_PATH
+
+
+def _open_sqlite(path):
+    connection = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+    # WAL lets readers in other workers proceed while one worker writes
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class MemoryCache:
+    """Per-process cache with the shared cache interface."""
+
+    def __init__(self):
+        self._entries = {}  # (namespace, key) -> (value, expires_at or None)
+        self._lock = threading.Lock()
+
+    def get_many(self, namespace, keys):
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get((namespace, key))
+                if entry is None:
+                    continue
+                if entry[1] is not None and entry[1] <= now:
+                    del self._entries[(namespace, key)]
+                    continue
+                found[key] = entry[0]
+        return found
+
+    def set_many(self, namespace, mapping, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            for key, value in mapping.items():
+                self._entries[(namespace, key)] = (value, expires_at)
+
+    def delete_many(self, namespace, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop((namespace, key), None)
+
+
+class SQLiteCache:
+    """Cache in a local SQLite file; every worker on the host opens the same file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = _open_sqlite(self.path)
+        return connection
+
+    def get_many(self, namespace, keys):
+        keys = list(keys)
+        now = time.time()
+        found = {}
+        connection = self._connection()
+        for i in range(0, len(keys), SQLITE_MAX_PARAMS):
+            chunk = keys[i:i + SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            rows = connection.execute(
+                f"SELECT key, value FROM cache WHERE namespace = ? AND key IN ({placeholders})"
+                " AND (expires_at IS NULL OR expires_at > ?)",
+                [namespace, *chunk, now]
+            )
+            for key, value in rows:
+                found[key] = json.loads(value)
+        return found
+
+    def set_many(self, namespace, mapping, ttl=None):
+        if not mapping:
+            return
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                [(namespace, key, json.dumps(value), expires_at) for key, value in mapping.items()]
+            )
+            connection.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def delete_many(self, namespace, keys):
+        keys = list(keys)
+        connection = self._connection()
+        with connection:
+            for i in range(0, len(keys), SQLITE_MAX_PARAMS):
+                chunk = keys[i:i + SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                connection.execute(f"DELETE FROM cache WHERE namespace = ? AND key IN ({placeholders})", [namespace, *chunk])
+
+
+class RedisCache:
+    """Cache in Redis (or a compatible server), shared by workers on any host."""
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("redis:// shared cache requires the redis package")
+        self._client = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _key(namespace, key):
+        return f"clan_dashboard:{namespace}:{key}"
+
+    def get_many(self, namespace, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._client.mget([self._key(namespace, key) for key in keys])
+        return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, namespace, mapping, ttl=None):
+        if not mapping:
+            return
+        pipeline = self._client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipeline.set(self._key(namespace, key), json.dumps(value), ex=int(ttl) if ttl else None)
+        pipeline.execute()
+
+    def delete_many(self, namespace, keys):
+        keys = list(keys)
+        if keys:
+            self._client.delete(*[self._key(namespace, key) for key in keys])
+
+
+def create_cache(url):
+    if url.startswith("sqlite://"):
+        return SQLiteCache(sqlite_path(url))
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(url)
+    return MemoryCache()
+
+
+def rate_limit_storage_uri(url=None):
+    """limits storage URI matching the shared cache, so every worker counts into one store."""
+    url = url or resolve_cache_url()
+    return url if url.startswith(("sqlite://", "redis://", "rediss://")) else "memory://"
+
+
+class SQLiteRateLimitStorage(Storage):
+    """
+    Fixed-window counters for the limits library in the shared SQLite file. Registering
+    the sqlite:// scheme lets slowapi use it through storage_uri like a built-in backend.
+    """
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = sqlite_path(uri or "")
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            " key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = _open_sqlite(self.path)
+        return connection
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        now = time.time()
+        connection = self._connection()
+        with connection:
+            # IMMEDIATE takes the write lock up front, so concurrent workers serialize here
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute("SELECT count, expires_at FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                count, expires_at = amount, now + expiry
+            else:
+                count, expires_at = row[0] + amount, (now + expiry if elastic_expiry else row[1])
+            connection.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, count, expires_at) VALUES (?, ?, ?)",
+                (key, count, expires_at)
+            )
+        return count
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT count FROM rate_limits WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self._connection().execute("SELECT expires_at FROM rate_limits WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self):
+        try:
+            self._connection().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        connection = self._connection()
+        with connection:
+            return connection.execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key):
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+
+SHARED_CACHE_URL = resolve_cache_url()
+shared_cache = create_cache(SHARED_CACHE_URL)
+logger.info(f"Shared cache backend: {type(shared_cache).__name__} ({SHARED_CACHE_URL.split('@')[-1]})")
@@ -0,0 +1,88 @@
+"""
+Startup profiling and time-bounded warm-up for combined_api_server.
+
+StartupProfile records how long each import and warm-up step took, so a slow cold start
+can be traced to the step that regressed (`GET /startup-profile`, and logged once warm-up
+finishes). For a per-module breakdown of imports run `python -X importtime -c "import
+combined_api_server"`.
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the whole warm-up; the API reports ready once it finishes or times out
+WARMUP_TIMEOUT_SECONDS = float(os.environ.get("WARMUP_TIMEOUT_SECONDS", "10"))
+
+
+class StartupProfile:
+    """Named startup phases with their duration (ms) and outcome."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.phases = []
+        self.ready_after_ms = None
+
+    def record(self, name, elapsed_seconds, status="ok", detail=None):
+        phase = {"name": name, "ms": round(elapsed_seconds * 1000, 1), "status": status}
+        if detail:
+            phase["detail"] = detail
+        self.phases.append(phase)
+        return phase
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(name, time.perf_counter() - started, "error", str(e))
+            raise
+        self.record(name, time.perf_counter() - started)
+
+    def mark_ready(self):
+        self.ready_after_ms = round((time.perf_counter() - self._started) * 1000, 1)
+
+    def report(self):
+        return {
+            "started_at": self.started_at,
+            "ready_after_ms": self.ready_after_ms,
+            "phases": list(self.phases)
+        }
+
+
+async def _timed(profile, name, func):
+    started = time.perf_counter()
+    try:
+        result = await asyncio.to_thread(func)
+    except Exception as e:
+        profile.record(name, time.perf_counter() - started, "error", str(e))
+        logger.error(f"Warm-up step {name} failed: {e}")
+        return False, None
+    profile.record(name, time.perf_counter() - started)
+    return True, result
+
+
+async def run_warmup(profile, steps, timeout=WARMUP_TIMEOUT_SECONDS):
+    """
+    Runs blocking warm-up steps ({name: callable}) concurrently in worker threads, bounded
+    by `timeout`. Steps still running at the deadline are recorded as timed out (their
+    threads finish in the background). Returns {name: "ok" | "error" | "timeout"}.
+    """
+    tasks = {name: asyncio.create_task(_timed(profile, name, func)) for name, func in steps.items()}
+    started = time.perf_counter()
+    await asyncio.wait(tasks.values(), timeout=timeout)
+
+    statuses = {}
+    for name, task in tasks.items():
+        if task.done():
+            statuses[name] = "ok" if task.result()[0] else "error"
+        else:
+            task.cancel()
+            statuses[name] = "timeout"
+            profile.record(name, time.perf_counter() - started, "timeout")
+    return statuses
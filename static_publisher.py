@@ -0,0 +1,174 @@
+import datetime
+import gzip
+import json
+import logging
+import os
+import re
+import traceback
+
+import pymongo
+
+from clan_icons import icon_image_id
+
+try:
+    import brotli
+except ImportError:  # Optional: only .json and .json.gz are written without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+DB_NAME = "clan_dashboard_db"
+
+# Directory served by a static host/CDN; publishing is disabled when unset
+STATIC_EXPORT_DIR = os.environ.get("STATIC_EXPORT_DIR")
+# Versioned copies kept per dataset (~1 hour at the 2-minute fetch cadence)
+STATIC_EXPORT_KEEP_VERSIONS = int(os.environ.get("STATIC_EXPORT_KEEP_VERSIONS", "30"))
+# Longest period offered by the comparison chart
+COMPARISON_PERIOD_MINUTES = 1440
+
+
+def battle_slug(battle_id):
+    """File-system and URL safe name for a battle_id (mirrored by script.js)."""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(battle_id))
+
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _atomic_write(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_json_variants(path, payload):
+    """Writes path plus precompressed .gz (and .br when brotli is installed) siblings."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    raw = json.dumps(payload, default=_json_default, separators=(",", ":")).encode("utf-8")
+    _atomic_write(path, raw)
+    # mtime=0 keeps identical payloads byte-identical, so CDN ETags stay stable
+    _atomic_write(f"{path}.gz", gzip.compress(raw, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _atomic_write(f"{path}.br", brotli.compress(raw, quality=11))
+    return len(raw)
+
+
+def publish_versioned(export_dir, dataset_dir, version, payload):
+    """Writes <dataset>/<version>.json and <dataset>/latest.json, pruning old versions."""
+    target_dir = os.path.join(export_dir, dataset_dir)
+    size = write_json_variants(os.path.join(target_dir, f"{version}.json"), payload)
+    write_json_variants(os.path.join(target_dir, "latest.json"), payload)
+
+    versions = sorted(
+        name[:-len(".json")] for name in os.listdir(target_dir)
+        if name.endswith(".json") and name != "latest.json"
+    )
+    for old_version in versions[:-STATIC_EXPORT_KEEP_VERSIONS]:
+        for suffix in (".json", ".json.gz", ".json.br"):
+            try:
+                os.remove(os.path.join(target_dir, old_version + suffix))
+            except FileNotFoundError:
+                pass
+    return f"{dataset_dir}/{version}.json", size
+
+
+def build_dashboard_payload(db, battle_id, snapshot_doc):
+    """Same shape as the streamed /dashboard payload; icons are joined for snapshots that predate them."""
+    top_clans = [dict(clan) for clan in snapshot_doc.get("top_clans", [])]
+    names = [clan["clan_name"] for clan in top_clans if "icon_id" not in clan]
+    if names:
+        icons = {
+            doc["clan_name"]: doc.get("icon")
+            for doc in db["clan_details"].find({"clan_name": {"$in": names}}, {"clan_name": 1, "icon": 1, "_id": 0})
+        }
+        for clan in top_clans:
+            if "icon_id" not in clan:
+                clan["icon"] = icons.get(clan["clan_name"])
+                clan["icon_id"] = icon_image_id(clan["icon"])
+    return {
+        "battle_id": battle_id,
+        "timestamp": snapshot_doc.get("timestamp"),
+        "top_clans": top_clans
+    }
+
+
+def build_comparison_payload(db, battle_id, snapshot_doc):
+    """Point series of every top clan over the longest comparison period; clients filter locally."""
+    latest_ts = snapshot_doc["timestamp"]
+    names = [clan["clan_name"] for clan in snapshot_doc.get("top_clans", [])]
+    cursor = db["clans"].find(
+        {
+            "clan_name": {"$in": names},
+            "timestamp": {"$gte": latest_ts - datetime.timedelta(minutes=COMPARISON_PERIOD_MINUTES)},
+            "battle_id": battle_id
+        },
+        {"_id": 0, "clan_name": 1, "timestamp": 1, "current_points": 1}
+    ).sort([("clan_name", pymongo.ASCENDING), ("timestamp", pymongo.ASCENDING)])
+    return {
+        "battle_id": battle_id,
+        "timestamp": latest_ts,
+        "period_minutes": COMPARISON_PERIOD_MINUTES,
+        "series": list(cursor)
+    }
+
+
+def build_battle_ids_payload(db):
+    """Same shape as /api/battle_ids."""
+    return list(db["battle_id_history"].find(
+        {},
+        {"_id": 0, "battle_id": 1, "timestamp": 1}
+    ).sort("timestamp", pymongo.DESCENDING))
+
+
+def publish_cycle(client, battle_id, snapshot_doc, finish_time=None, export_dir=None):
+    """
+    Writes the static dashboard export for one fetch cycle. Errors are logged and
+    swallowed so a full disk or permission problem never stops data collection.
+    """
+    export_dir = export_dir or STATIC_EXPORT_DIR
+    if not export_dir or not snapshot_doc:
+        return None
+    try:
+        db = client[DB_NAME]
+        latest_ts = snapshot_doc["timestamp"]
+        version = latest_ts.strftime("%Y%m%dT%H%M%S")
+        slug = battle_slug(battle_id)
+
+        dashboard_path, dashboard_size = publish_versioned(
+            export_dir, f"dashboard/{slug}", version, build_dashboard_payload(db, battle_id, snapshot_doc)
+        )
+        comparison_path, comparison_size = publish_versioned(
+            export_dir, f"comparison/{slug}", version, build_comparison_payload(db, battle_id, snapshot_doc)
+        )
+        write_json_variants(os.path.join(export_dir, "battle_ids.json"), build_battle_ids_payload(db))
+        write_json_variants(os.path.join(export_dir, "countdown.json"), {
+            "battle_id": battle_id,
+            # Unix seconds; the browser formats the remaining time itself
+            "finish_time": int(finish_time.timestamp()) if finish_time else None
+        })
+
+        manifest = {
+            "generated_at": datetime.datetime.now(datetime.timezone.utc),
+            "battle_id": battle_id,
+            "version": version,
+            "files": {
+                "dashboard": dashboard_path,
+                "comparison": comparison_path,
+                "battle_ids": "battle_ids.json",
+                "countdown": "countdown.json"
+            }
+        }
+        write_json_variants(os.path.join(export_dir, "manifest.json"), manifest)
+        logger.info(
+            f"Published static export {version} for {battle_id} to {export_dir} "
+            f"(dashboard {dashboard_size} B, comparison {comparison_size} B)"
+        )
+        return manifest
+    except Exception as e:
+        logger.error(f"Error publishing static export: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        return None
@@ -0,0 +1,230 @@
+"""
+Lightweight tracing spans exported as OTLP/JSON.
+
+A span covers one stage (upstream fetch, clans write, snapshot build, an API request).
+Spans nest through a context variable, so children started in the same thread, task or
+asyncio.to_thread call join their parent's trace. Work that crosses a queue or a process
+carries the trace explicitly: the clan fetcher stores the cycle's trace ID in the cycle
+record and in the leaderboard snapshot (`trace_id`), and /dashboard links its request span
+to that ingest trace and returns it in X-Ingest-Trace-Id.
+
+Finished spans are appended to TRACE_EXPORT_PATH, one OTLP/JSON ExportTraceServiceRequest
+per line (the OpenTelemetry collector's file exporter format), which the collector's
+otlpjsonfile receiver or any OTLP/JSON viewer can load. Without TRACE_EXPORT_PATH spans are
+still created (trace IDs are cheap) but not written.
+"""
+import atexit
+import contextvars
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import orjson
+
+TRACE_EXPORT_PATH = os.environ.get("TRACE_EXPORT_PATH")
+SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME") or os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+# Spans buffered before a write; a finished root span always flushes
+EXPORT_BATCH_SIZE = 64
+
+SPAN_KIND_INTERNAL, SPAN_KIND_SERVER, SPAN_KIND_CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def new_trace_id():
+    return secrets.token_hex(16)
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_id=None, kind=SPAN_KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.links = []
+        self.status = STATUS_OK
+        self.status_message = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def add_link(self, trace_id, span_id=None, **attributes):
+        """Relates this span to another trace, e.g. the ingest cycle behind served data."""
+        if trace_id:
+            self.links.append((trace_id, span_id, attributes))
+
+    def set_error(self, error):
+        self.status = STATUS_ERROR
+        self.status_message = str(error) or type(error).__name__
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": self.status, **({"message": self.status_message} if self.status_message else {})}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.links:
+            span["links"] = [
+                {
+                    "traceId": trace_id,
+                    "spanId": span_id or "",
+                    "attributes": [_attribute(key, value) for key, value in attributes.items()]
+                }
+                for trace_id, span_id, attributes in self.links
+            ]
+        return span
+
+
+class SpanExporter:
+    """Buffers finished spans and appends them to a file as OTLP/JSON lines."""
+
+    def __init__(self, path, service_name=SERVICE_NAME):
+        self.path = path
+        self.service_name = service_name
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def export(self, span, flush=False):
+        if not self.path:
+            return
+        with self._lock:
+            self._buffer.append(span.to_otlp())
+            if flush or len(self._buffer) >= EXPORT_BATCH_SIZE:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "clan_dashboard"}, "spans": self._buffer}]
+        }]}
+        self._buffer = []
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "ab") as f:
+                f.write(orjson.dumps(request) + b"\n")
+        except OSError as e:
+            print(f"Error writing trace spans to {self.path}: {e}", file=sys.stderr)
+
+
+exporter = SpanExporter(TRACE_EXPORT_PATH)
+atexit.register(exporter.flush)
+
+
+@contextmanager
+def span(name, trace_id=None, parent_id=None, kind=SPAN_KIND_INTERNAL, **attributes):
+    """
+    Times a stage. Without trace_id the span joins the current span's trace (or starts a
+    new one); pass trace_id/parent_id to continue a trace carried across a queue.
+    """
+    parent = _current_span.get()
+    if trace_id is None and parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    current = Span(name, trace_id or new_trace_id(), parent_id, kind, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        exporter.export(current, flush=current.parent_id is None or kind == SPAN_KIND_SERVER)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def set_attribute(key, value):
+    """Sets an attribute on the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.set_attribute(key, value)
+
+
+def add_link(trace_id, span_id=None, **attributes):
+    current = _current_span.get()
+    if current is not None:
+        current.add_link(trace_id, span_id, **attributes)
+
+
+def _parse_traceparent(value):
+    """(trace_id, parent span_id) from a W3C traceparent header, or (None, None)."""
+    parts = (value or "").split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    return None, None
+
+
+class TracingMiddleware:
+    """
+    One server span per HTTP request, named after the matched route, continuing the
+    caller's trace when it sends a traceparent header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        trace_id, parent_id = _parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                request_span.set_attribute("http.response.status_code", message["status"])
+                if message["status"] >= 500:
+                    request_span.status = STATUS_ERROR
+            await send(message)
+
+        with span(scope["method"], trace_id, parent_id, SPAN_KIND_SERVER, **{
+            "http.request.method": scope["method"],
+            "url.path": scope["path"]
+        }) as request_span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # Routing fills in the matched route (and the mount prefix) on the scope
+                route = scope.get("route")
+                if route is not None and getattr(route, "path", None):
+                    request_span.set_attribute("http.route", f"{scope.get('root_path', '')}{route.path}")
+                    request_span.name = f"{scope['method']} {request_span.attributes['http.route']}"
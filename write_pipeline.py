@@ -0,0 +1,245 @@
+"""
+Bounded write pipeline between a fetcher and MongoDB.
+
+The fetch stage submits one record per cycle; a writer thread takes whatever has queued
+up and hands it to the fetcher's batch handler in one call, so a slow Atlas write no longer
+delays the next fetch. When the queue is full, submit() waits (backpressure) and then
+spills the record rather than dropping it.
+
+While MongoDB is unreachable, records are appended to a local BSON journal (length
+prefixed documents, fsynced). Every WRITE_JOURNAL_RETRY_SECONDS the writer pings the
+server. Once it answers, the journal is replayed through the same handler in batches,
+oldest first, before any newer record is written. Handlers must tolerate a record being
+written twice, because a batch that fails part-way is journaled whole, and a batch failing
+for any other reason is retried one record at a time so only the bad records are dropped.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+import bson
+import pymongo.errors
+
+logger = logging.getLogger(__name__)
+
+WRITE_QUEUE_SIZE = int(os.environ.get("WRITE_QUEUE_SIZE", "10"))
+# Longest a fetch stage waits for queue space before spilling to the journal
+WRITE_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("WRITE_QUEUE_TIMEOUT_SECONDS", "30"))
+WRITE_BATCH_MAX = int(os.environ.get("WRITE_BATCH_MAX", "50"))
+WRITE_JOURNAL_RETRY_SECONDS = float(os.environ.get("WRITE_JOURNAL_RETRY_SECONDS", "30"))
+
+# Errors meaning the server could not be reached, as opposed to a bad write
+CONNECTION_ERRORS = (pymongo.errors.ConnectionFailure, pymongo.errors.ServerSelectionTimeoutError)
+
+
+class BsonJournal:
+    """Append-only file of BSON documents; safe to share between threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, records):
+        if not records:
+            return
+        data = b"".join(bson.encode(record) for record in records)
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def pending(self):
+        return os.path.exists(self.path)
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, "rb") as f:
+            try:
+                for record in bson.decode_file_iter(f):
+                    records.append(record)
+            except bson.errors.InvalidBSON:
+                # A crash mid-append leaves a truncated last document
+                logger.warning(f"Ignoring a truncated record at the end of {self.path}")
+        return records
+
+    def take(self):
+        """Removes and returns every journaled record, oldest first."""
+        with self._lock:
+            records = self._read()
+            if records:
+                os.replace(self.path, f"{self.path}.replaying")
+            elif os.path.exists(self.path):
+                os.remove(self.path)
+            return records
+
+    def finish_replay(self, unwritten):
+        """Puts records a replay could not write back in front of anything spilled since."""
+        with self._lock:
+            replaying = f"{self.path}.replaying"
+            if unwritten:
+                spilled = self._read()
+                with open(replaying, "wb") as f:
+                    f.write(b"".join(bson.encode(record) for record in [*unwritten, *spilled]))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(replaying, self.path)
+            elif os.path.exists(replaying):
+                os.remove(replaying)
+
+    def recover(self):
+        """Folds a replay interrupted by a crash back into the journal."""
+        replaying = f"{self.path}.replaying"
+        if not os.path.exists(replaying):
+            return
+        with self._lock:
+            with open(replaying, "rb") as f:
+                interrupted = list(bson.decode_file_iter(f))
+            spilled = self._read()
+            with open(f"{self.path}.tmp", "wb") as f:
+                f.write(b"".join(bson.encode(record) for record in [*interrupted, *spilled]))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(f"{self.path}.tmp", self.path)
+            os.remove(replaying)
+
+
+class WritePipeline:
+    """
+    Queue plus writer thread for one fetcher. `handler(client, records)` writes a batch of
+    records (plain BSON-encodable dicts) and raises on failure.
+    """
+
+    def __init__(self, client, handler, journal_path, name="writer"):
+        self.client = client
+        self.handler = handler
+        self.name = name
+        self.journal = BsonJournal(journal_path)
+        self.journal.recover()
+        self._queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._stopping = threading.Event()
+        self._last_ping = 0.0
+        self.healthy = not os.path.exists(journal_path)
+        self._thread = threading.Thread(target=self._run, name=f"{name}-pipeline", daemon=True)
+        self._thread.start()
+
+    def submit(self, record):
+        """Queues a record for writing; blocks while the queue is full, then spills it."""
+        try:
+            self._queue.put(record, timeout=WRITE_QUEUE_TIMEOUT_SECONDS)
+        except queue.Full:
+            logger.warning(f"{self.name}: write queue full for {WRITE_QUEUE_TIMEOUT_SECONDS}s, journaling the record")
+            self.journal.append([record])
+
+    def check_mongo(self):
+        """Pings the server; marks the pipeline unhealthy if it does not answer."""
+        try:
+            self.client.admin.command("ping")
+            return True
+        except CONNECTION_ERRORS:
+            self.healthy = False
+            return False
+
+    def close(self, timeout=60):
+        """Stops after writing (or journaling) what is already queued."""
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    def _take_batch(self):
+        try:
+            batch = [self._queue.get(timeout=WRITE_JOURNAL_RETRY_SECONDS if not self.healthy else 1)]
+        except queue.Empty:
+            return []
+        while len(batch) < WRITE_BATCH_MAX:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        """Writes a batch; returns False if MongoDB was unreachable."""
+        try:
+            self.handler(self.client, batch)
+            return True
+        except CONNECTION_ERRORS as e:
+            logger.error(f"{self.name}: MongoDB unreachable ({e}); journaling {len(batch)} records")
+            self.healthy = False
+            return False
+
+    def _write_each(self, batch):
+        """
+        Writes a batch the handler failed on one record at a time, so only records the
+        server rejects on their own are dropped. Returns the records left unwritten because
+        MongoDB became unreachable, for the journal.
+        """
+        for i, record in enumerate(batch):
+            try:
+                if not self._write([record]):
+                    return batch[i:]
+            except Exception as e:
+                # A record the server rejects would fail again on replay; log and move on
+                logger.error(f"{self.name}: dropping a record that cannot be written: {e}")
+        return []
+
+    def _replay_journal(self):
+        records = self.journal.take()
+        if not records:
+            return True
+        logger.info(f"{self.name}: replaying {len(records)} journaled records")
+        started = time.perf_counter()
+        for i in range(0, len(records), WRITE_BATCH_MAX):
+            chunk = records[i:i + WRITE_BATCH_MAX]
+            try:
+                written = self._write(chunk)
+            except Exception as e:
+                logger.error(f"{self.name}: error replaying {len(chunk)} journaled records, retrying them one by one: {e}")
+                unwritten = self._write_each(chunk)
+                if unwritten:
+                    self.journal.finish_replay([*unwritten, *records[i + WRITE_BATCH_MAX:]])
+                    return False
+                continue
+            if not written:
+                self.journal.finish_replay(records[i:])
+                return False
+        self.journal.finish_replay([])
+        logger.info(f"{self.name}: replayed {len(records)} records in {time.perf_counter() - started:.1f}s")
+        return True
+
+    def _recover(self):
+        """After an outage: once the server answers, drain the journal before new writes."""
+        now = time.monotonic()
+        if now - self._last_ping < WRITE_JOURNAL_RETRY_SECONDS:
+            return False
+        self._last_ping = now
+        try:
+            self.client.admin.command("ping")
+        except CONNECTION_ERRORS:
+            return False
+        self.healthy = self._replay_journal()
+        return self.healthy
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._take_batch()
+            if not self.healthy and not self._recover():
+                self.journal.append(batch)
+                continue
+            if self.journal.pending():
+                # Spilled by submit() while the queue was full; keep records in order
+                self.healthy = self._replay_journal()
+                if not self.healthy:
+                    self.journal.append(batch)
+                    continue
+            if not batch:
+                continue
+            try:
+                if not self._write(batch):
+                    self.journal.append(batch)
+            except Exception as e:
+                logger.error(f"{self.name}: error writing {len(batch)} records, retrying them one by one: {e}")
+                self.journal.append(self._write_each(batch))